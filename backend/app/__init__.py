@@ -5,12 +5,12 @@ Creates and configures the Flask application with all necessary extensions.
 
 import os
 import logging
-from flask import Flask
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_cors import CORS
-from flask_session import Session
 from flask_wtf.csrf import CSRFProtect
 
 # Initialize extensions
@@ -44,12 +44,38 @@ def create_app(config_name=None):
     login_manager.init_app(app)
     csrf.init_app(app)
     
+    # Initialize LDAP authenticator
+    from app.auth import ldap_auth
+    ldap_auth.init_app(app)
+    
+    # Initialize full-text search and suggestion indexes
+    from app.services.search_service import search_index, suggestion_index
+    search_index.init_app(app)
+    suggestion_index.init_app(app)
+    
+    # Initialize file service caches
+    from app.services import file_service
+    file_service.init_app(app)
+    
+    # Initialize user cache
+    from app.services import user_service
+    user_service.init_app(app)
+    
+    # Initialize background job pool
+    from app.services.job_service import job_queue
+    job_queue.init_app(app, config_name)
+    
     # Configure CORS
     CORS(app, origins=['http://localhost:3000', 'http://127.0.0.1:3000'], 
          supports_credentials=True)
     
-    # Configure session
-    Session(app)
+    # Configure session store
+    from app.services import session_service
+    session_service.init_app(app)
+    
+    # Schedule automatic backups
+    from app.services import backup_service
+    backup_service.init_app(app)
     
     # Configure login manager
     login_manager.login_view = 'auth.login'
@@ -58,18 +84,23 @@ def create_app(config_name=None):
     
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models.user import User
-        return User.query.get(int(user_id))
+        return user_service.load_user(int(user_id))
     
     # Configure logging
     configure_logging(app)
     
+    # Count SQL queries per request
+    configure_query_counter(app)
+    
     # Register blueprints
     register_blueprints(app)
     
     # Register error handlers
     register_error_handlers(app)
     
+    # Register CLI commands
+    register_commands(app)
+    
     # Health check endpoint
     @app.route('/health')
     def health_check():
@@ -104,6 +135,39 @@ def configure_logging(app):
         logging.basicConfig(level=logging.DEBUG)
         app.logger.setLevel(logging.DEBUG)
 
+def configure_query_counter(app):
+    """
+    Count SQL statements issued per request.
+    
+    When QUERY_BUDGET is set, requests that exceed it are logged and the
+    count is returned in an X-Query-Count header so N+1 regressions show up
+    in development and in tests.
+    """
+    budget = app.config.get('QUERY_BUDGET', 0)
+    if not budget:
+        return
+    
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+    
+    with app.app_context():
+        event.listen(db.engine, 'after_cursor_execute', count_query)
+    
+    @app.before_request
+    def reset_query_count():
+        g.query_count = 0
+    
+    @app.after_request
+    def report_query_count(response):
+        query_count = g.get('query_count', 0)
+        response.headers['X-Query-Count'] = str(query_count)
+        if query_count > budget:
+            app.logger.warning(
+                f'{request.method} {request.path} issued {query_count} queries (budget {budget})'
+            )
+        return response
+
 def register_blueprints(app):
     """Register application blueprints."""
     from app.api import bp as api_bp
@@ -112,6 +176,17 @@ def register_blueprints(app):
     from app.auth import bp as auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
 
+def register_commands(app):
+    """Register application CLI commands."""
+    from app.commands import search_cli, pages_cli, files_cli, schema_cli, ldap_cli, sessions_cli, backup_cli
+    app.cli.add_command(search_cli)
+    app.cli.add_command(pages_cli)
+    app.cli.add_command(files_cli)
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(ldap_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(backup_cli)
+
 def register_error_handlers(app):
     """Register error handlers for the application."""
     
@@ -137,6 +212,10 @@ def create_directories(app):
     directories = [
         app.config['UPLOAD_FOLDER'],
         app.config['BACKUP_FOLDER'],
+        app.config['SEARCH_INDEX_DIR'],
+        app.config['THUMBNAIL_CACHE_DIR'],
+        app.config['RENDER_CACHE_DIR'],
+        app.config['JOB_DIR'],
         'logs'
     ]
     
@@ -146,4 +225,4 @@ def create_directories(app):
             app.logger.info(f'Created directory: {directory}')
 
 # Import models to ensure they are registered with SQLAlchemy
-from app.models import user, page, file
\ No newline at end of file
+from app.models import user, page, file, session
\ No newline at end of file
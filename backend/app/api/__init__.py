@@ -7,4 +7,9 @@ from flask import Blueprint
 
 bp = Blueprint('api', __name__)
 
-from app.api import auth, pages, files, search
+from app.api.conditional import add_content_etag
+
+# Revalidate JSON responses that don't set their own ETag
+bp.after_request(add_content_etag)
+
+from app.api import auth, pages, files, search, jobs, backups
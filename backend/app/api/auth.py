@@ -2,10 +2,10 @@
 Authentication API endpoints for HomelabWiki.
 """
 
-from flask import request, jsonify, session
+from flask import current_app, request, jsonify, session
 from flask_login import login_required, current_user
 from app.api import bp
-from app.auth.ldap_auth import login_user_with_ldap, logout_current_user, test_ldap_connection
+from app.auth.ldap_auth import login_user_with_ldap, logout_current_user, test_ldap_connection, get_ldap_pool_stats
 
 @bp.route('/auth/login', methods=['POST'])
 def login():
@@ -68,6 +68,22 @@ def test_ldap():
     except Exception as e:
         return jsonify({'error': 'LDAP test failed'}), 500
 
+@bp.route('/auth/ldap-stats', methods=['GET'])
+@login_required
+def get_ldap_stats():
+    """Get LDAP connection pool statistics."""
+    try:
+        if not current_user.has_permission('admin'):
+            return jsonify({'error': 'Permission denied'}), 403
+        
+        return jsonify({
+            'backend': current_app.config.get('LDAP_BACKEND'),
+            'pool': get_ldap_pool_stats()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get LDAP statistics'}), 500
+
 @bp.route('/auth/check', methods=['GET'])
 def check_auth():
     """Check authentication status."""
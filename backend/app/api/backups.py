@@ -0,0 +1,45 @@
+"""
+Backup API endpoints for HomelabWiki.
+"""
+
+from flask import jsonify
+from flask_login import login_required, current_user
+from app.api import bp
+from app.services import backup_service
+
+@bp.route('/backups', methods=['GET'])
+@login_required
+def get_backups():
+    """List backups with their duration and size (admin only)."""
+    try:
+        if not current_user.has_permission('admin'):
+            return jsonify({'error': 'Permission denied'}), 403
+        
+        backups = []
+        for snapshot in backup_service.list_snapshots():
+            uploads = {key: value for key, value in snapshot['uploads'].items() if key != 'files'}
+            backups.append(dict(snapshot, uploads=uploads))
+        
+        return jsonify({'backups': backups}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to list backups'}), 500
+
+@bp.route('/backups', methods=['POST'])
+@login_required
+def start_backup():
+    """Start a backup in the background; poll /api/jobs/<id> for the report."""
+    try:
+        if not current_user.has_permission('admin'):
+            return jsonify({'error': 'Permission denied'}), 403
+        
+        job = backup_service.submit_backup(owner_id=current_user.id)
+        
+        return jsonify({
+            'message': 'Backup started',
+            'job': job,
+            'status_url': f"/api/jobs/{job['id']}"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to start backup'}), 500
@@ -0,0 +1,141 @@
+"""
+Conditional request helpers for HomelabWiki API endpoints.
+Lets clients revalidate cached responses with ETags and Last-Modified dates
+instead of refetching them.
+"""
+
+import hashlib
+import json
+from flask import current_app, request
+from sqlalchemy import BigInteger, cast, func
+from sqlalchemy.orm import aliased
+from werkzeug.http import is_resource_modified
+from app import db
+
+# Per-link hash for collection checksums; squares stay within a 64-bit integer
+LINK_HASH_MULTIPLIER = 1000003
+LINK_HASH_MODULUS = 2147483647
+
+def is_not_modified(etag, last_modified=None):
+    """
+    Check whether the client's cached copy is still current.
+    
+    If-None-Match is compared with the ETag; If-Modified-Since is only used
+    when the request carries no If-None-Match.
+    
+    Args:
+        etag (str): Unquoted ETag of the current representation
+        last_modified (datetime): Naive UTC modification time, if known
+    """
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+def not_modified(etag, last_modified=None):
+    """Build an empty 304 Not Modified response carrying the validators."""
+    response = current_app.response_class(status=304)
+    set_validators(response, etag, last_modified)
+    return response
+
+def set_validators(response, etag, last_modified=None):
+    """
+    Attach an ETag (and Last-Modified) and make caches revalidate before reuse.
+    
+    API responses depend on the logged-in user, so they are marked private.
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def add_content_etag(response):
+    """
+    Give successful GET JSON responses without their own validator an ETag of their body.
+    
+    The body is still built, but a matching If-None-Match turns the response
+    into an empty 304. Endpoints that can validate before serializing set
+    their own ETag and are left alone.
+    """
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return response
+    if response.mimetype != 'application/json' or response.is_streamed or 'ETag' in response.headers:
+        return response
+    
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def collection_markers(relationship, item_ids):
+    """
+    Summarize the many-to-many links of the given items in one aggregate query.
+    
+    Each (item, target) link is hashed on its own before summing, so moving
+    or swapping links between items changes the checksum even when the
+    number of links and the targets involved stay the same.
+    
+    Args:
+        relationship: Many-to-many relationship, e.g. Page.tags
+        item_ids: Select of the listed item ids
+    
+    Returns:
+        tuple: (link count, link checksum, newest target update)
+    """
+    prop = relationship.property
+    item_key = prop.synchronize_pairs[0][1]
+    target_id, target_key = prop.secondary_synchronize_pairs[0]
+    target = prop.mapper.class_
+    
+    link = (cast(item_key, BigInteger) * LINK_HASH_MULTIPLIER + target_key) % LINK_HASH_MODULUS
+    return db.session.query(
+        func.count(),
+        func.sum(link * link % LINK_HASH_MODULUS),
+        func.max(target.updated_at)
+    ).select_from(prop.secondary).join(target, target_id == target_key).filter(
+        item_key.in_(item_ids)
+    ).one()
+
+def listing_etag(kind, query, timestamp_column, id_column, related=(), collections=()):
+    """
+    Build an ETag for a filtered listing from aggregate queries.
+    
+    The row count, newest timestamp and highest ID change whenever an item
+    is added, edited or removed, so the listing rows never have to be
+    loaded to answer a revalidation. Items also embed fields of related
+    rows, so the newest update of each many-to-one target is folded in as
+    well. For many-to-many collections, the links of the listed items are
+    counted and checksummed, and their targets' newest update is added.
+    
+    Args:
+        kind (str): Listing name, e.g. 'pages'
+        query: Filtered query without loader options
+        timestamp_column: Column bumped on every update, e.g. updated_at
+        id_column: Primary key column
+        related: Many-to-one relationships serialized with each item, e.g.
+            Page.author; their targets must have an updated_at column
+        collections: Many-to-many relationships serialized with each item,
+            e.g. Page.tags; their targets must have an updated_at column
+    
+    Returns:
+        str: Unquoted ETag
+    """
+    query = query.order_by(None)
+    aggregates = [func.count(id_column), func.max(timestamp_column), func.max(id_column)]
+    
+    # Many-to-one joins keep one row per item, so they share the aggregate query
+    for relationship in related:
+        target = aliased(relationship.property.mapper.class_)
+        query = query.outerjoin(target, relationship.of_type(target))
+        aggregates.append(func.max(target.updated_at))
+    
+    markers = list(query.with_entities(*aggregates).one())
+    
+    item_ids = query.with_entities(id_column).statement
+    for relationship in collections:
+        markers.extend(collection_markers(relationship, item_ids))
+    
+    key = json.dumps(
+        [kind, *markers, request.query_string.decode('utf-8', 'replace')],
+        default=lambda value: value.isoformat()
+    )
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
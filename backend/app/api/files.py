@@ -3,23 +3,24 @@ Files API endpoints for HomelabWiki.
 """
 
 import os
-from flask import request, jsonify, send_file
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, request, jsonify, send_file
 from flask_login import login_required, current_user
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from app.api import bp
+from app.api.conditional import is_not_modified, listing_etag, not_modified, set_validators
+from app.api.pagination import paginate
 from app import db
 from app.models.file import File
 from app.models.page import Page
-from PIL import Image
-import io
+from app.services import file_service
 
 @bp.route('/files', methods=['GET'])
 @login_required
 def get_files():
     """Get all files with pagination and filtering."""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         file_type = request.args.get('type')
         search = request.args.get('search')
         
@@ -27,33 +28,35 @@ def get_files():
         
         # Apply filters
         if file_type:
-            files = File.get_files_by_type(file_type)
-            file_ids = [f.id for f in files]
-            query = query.filter(File.id.in_(file_ids))
+            query = query.filter(File.type_filter(file_type))
         
         if search:
-            files = File.search_files(search)
-            file_ids = [f.id for f in files]
-            query = query.filter(File.id.in_(file_ids))
+            query = query.filter(File.search_filter(search))
         
-        # Pagination
-        pagination = query.order_by(File.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        # Revalidate from one aggregate query before loading any rows
+        etag = listing_etag(
+            'files', query, File.updated_at, File.id,
+            related=[File.uploader, File.page]
         )
+        if is_not_modified(etag):
+            return not_modified(etag)
         
-        files = [file.to_dict() for file in pagination.items]
+        # Eager-load relationships used by to_dict()
+        query = query.options(*File.serialization_options())
         
-        return jsonify({
+        # Pagination
+        try:
+            items, pagination = paginate(query, File.created_at, File.id)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        files = [file.to_dict() for file in items]
+        
+        response = jsonify({
             'files': files,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_prev': pagination.has_prev,
-                'has_next': pagination.has_next
-            }
-        }), 200
+            'pagination': pagination
+        })
+        return set_validators(response, etag), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to get files'}), 500
@@ -63,8 +66,19 @@ def get_files():
 def get_file(file_id):
     """Get file information."""
     try:
-        file = File.query.get_or_404(file_id)
-        return jsonify({'file': file.to_dict()}), 200
+        file = File.query.options(*File.serialization_options()).get_or_404(file_id)
+        
+        # The JSON embeds the uploader's names and the attached page's title and
+        # slug, so their updates count too
+        page_updated = file.page.updated_at.timestamp() if file.page and file.page.updated_at else 0
+        uploader_updated = file.uploader.updated_at.timestamp() if file.uploader and file.uploader.updated_at else 0
+        updated = file.updated_at.timestamp() if file.updated_at else 0
+        etag = f'file-{file.id}-{updated}-{uploader_updated}-{file.page_id}-{page_updated}'
+        if is_not_modified(etag, file.updated_at):
+            return not_modified(etag, file.updated_at)
+        
+        response = jsonify({'file': file.to_dict()})
+        return set_validators(response, etag, file.updated_at), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to get file'}), 500
@@ -82,12 +96,18 @@ def download_file(file_id):
         if not file.file_exists():
             return jsonify({'error': 'File not found on disk'}), 404
         
-        return send_file(
+        # Content-addressed files get a strong ETag from their hash. conditional=True
+        # answers If-None-Match/If-Modified-Since with 304 and Range with 206.
+        response = send_file(
             file.get_absolute_path(),
             mimetype=file.mime_type,
             as_attachment=True,
-            download_name=file.original_filename
+            download_name=file.original_filename,
+            etag=file.file_hash or True,
+            conditional=True
         )
+        response.cache_control.private = True
+        return response
         
     except Exception as e:
         return jsonify({'error': 'Failed to download file'}), 500
@@ -105,27 +125,27 @@ def get_thumbnail(file_id):
         if not file.file_exists():
             return jsonify({'error': 'File not found on disk'}), 404
         
-        # Generate thumbnail
-        size = request.args.get('size', 200, type=int)
-        
-        with Image.open(file.get_absolute_path()) as img:
-            img.thumbnail((size, size), Image.Resampling.LANCZOS)
-            
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Save to memory
-            img_io = io.BytesIO()
-            img.save(img_io, 'JPEG', quality=85)
-            img_io.seek(0)
-            
-            return send_file(
-                img_io,
-                mimetype='image/jpeg',
-                as_attachment=False
-            )
-        
+        # Serve a cached thumbnail from a fixed set of size buckets
+        size = file_service.thumbnail_bucket(request.args.get('size', 200, type=int))
+        thumbnail_path = file_service.get_thumbnail(file, size)
+        
+        response = send_file(
+            thumbnail_path,
+            mimetype='image/jpeg',
+            as_attachment=False,
+            etag=f'{file_service.thumbnail_key(file)}-{size}',
+            max_age=current_app.config.get('THUMBNAIL_MAX_AGE', 0),
+            conditional=True
+        )
+        # send_file marks responses with a max_age public; thumbnails need a login
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+        
+    except TimeoutError:
+        return jsonify({'error': 'Thumbnail generation timed out'}), 504
+    except BrokenProcessPool:
+        return jsonify({'error': 'Thumbnail generation is temporarily unavailable'}), 503
     except Exception as e:
         return jsonify({'error': 'Failed to generate thumbnail'}), 500
 
@@ -173,6 +193,9 @@ def upload_file():
             'file': file_record.to_dict()
         }), 201
         
+    except RequestEntityTooLarge:
+        db.session.rollback()
+        return jsonify({'error': 'File too large'}), 413
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to upload file'}), 500
@@ -220,10 +243,7 @@ def delete_file(file_id):
         if not current_user.can_delete_file(file):
             return jsonify({'error': 'Permission denied'}), 403
         
-        # Delete file from disk
-        file.delete_file()
-        
-        # Delete from database
+        # The blob is removed after commit if no other record references it
         db.session.delete(file)
         db.session.commit()
         
@@ -241,39 +261,7 @@ def get_file_stats():
         if not current_user.has_permission('admin'):
             return jsonify({'error': 'Permission denied'}), 403
         
-        # Get file counts by type
-        image_count = len(File.get_files_by_type('image'))
-        document_count = len(File.get_files_by_type('document'))
-        archive_count = len(File.get_files_by_type('archive'))
-        
-        # Get total file size
-        total_size = db.session.query(db.func.sum(File.file_size)).scalar() or 0
-        
-        # Get file count per user
-        user_stats = db.session.query(
-            File.uploader_id,
-            db.func.count(File.id).label('file_count'),
-            db.func.sum(File.file_size).label('total_size')
-        ).group_by(File.uploader_id).all()
-        
-        return jsonify({
-            'total_files': File.query.count(),
-            'file_types': {
-                'images': image_count,
-                'documents': document_count,
-                'archives': archive_count
-            },
-            'total_size': total_size,
-            'total_size_formatted': File.get_file_size_formatted(total_size) if total_size else '0 B',
-            'user_stats': [
-                {
-                    'uploader_id': stat.uploader_id,
-                    'file_count': stat.file_count,
-                    'total_size': stat.total_size
-                }
-                for stat in user_stats
-            ]
-        }), 200
+        return jsonify(file_service.get_file_stats()), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to get file statistics'}), 500
@@ -0,0 +1,61 @@
+"""
+Jobs API endpoints for HomelabWiki.
+"""
+
+import os
+from flask import jsonify, send_file
+from flask_login import login_required, current_user
+from app.api import bp
+from app.services.job_service import job_queue
+
+def get_visible_job(job_id):
+    """Get a job record if it exists and belongs to the current user (or user is admin)."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return None
+    if job['owner_id'] != current_user.id and not current_user.is_admin:
+        return None
+    return job
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Get background job status."""
+    try:
+        job = get_visible_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        if job['status'] == 'finished':
+            job['download_url'] = f"/api/jobs/{job['id']}/download"
+        
+        return jsonify({'job': job}), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get job'}), 500
+
+@bp.route('/jobs/<job_id>/download', methods=['GET'])
+@login_required
+def download_job_result(job_id):
+    """Download the result of a finished background job."""
+    try:
+        job = get_visible_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        if job['status'] != 'finished':
+            return jsonify({'error': 'Job has not finished'}), 409
+        
+        result_path = job_queue.result_path(job['id'])
+        if not os.path.exists(result_path):
+            return jsonify({'error': 'Job result has expired'}), 410
+        
+        return send_file(
+            result_path,
+            mimetype=job['mimetype'],
+            as_attachment=True,
+            download_name=job['filename']
+        )
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to download job result'}), 500
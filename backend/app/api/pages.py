@@ -2,28 +2,28 @@
 Pages API endpoints for HomelabWiki.
 """
 
-from flask import request, jsonify, send_file
+from flask import current_app, request, jsonify, send_file
 from flask_login import login_required, current_user
 from sqlalchemy import or_
+from sqlalchemy.orm import defer
 from app.api import bp
+from app.api.conditional import is_not_modified, listing_etag, not_modified, set_validators
+from app.api.pagination import paginate
 from app import db
 from app.models.page import Page, Tag
 from app.models.user import User
+from app.services import page_service
+from app.services.job_service import job_queue
+from app.services.search_service import search_index
 import io
-import zipfile
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-import markdown
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
 
 @bp.route('/pages', methods=['GET'])
 @login_required
 def get_pages():
     """Get all pages with pagination and filtering."""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         tag = request.args.get('tag')
         author = request.args.get('author')
         search = request.args.get('search')
@@ -38,32 +38,43 @@ def get_pages():
             query = query.join(Page.author).filter(User.username == author)
         
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Page.title.ilike(search_term),
-                    Page.content.ilike(search_term)
+            search_query = search_index.filter_query(query, search)
+            if search_query is not None:
+                query = search_query
+            else:
+                search_term = f"%{search}%"
+                query = query.filter(
+                    or_(
+                        Page.title.ilike(search_term),
+                        Page.content.ilike(search_term)
+                    )
                 )
-            )
         
-        # Pagination
-        pagination = query.order_by(Page.updated_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        # Revalidate from one aggregate query before loading any rows
+        etag = listing_etag(
+            'pages', query, Page.updated_at, Page.id,
+            related=[Page.author],
+            collections=[Page.tags]
         )
+        if is_not_modified(etag):
+            return not_modified(etag)
         
-        pages = [page.to_dict(include_content=False) for page in pagination.items]
+        # Eager-load relationships used by to_dict()
+        query = query.options(*Page.serialization_options())
         
-        return jsonify({
+        # Pagination
+        try:
+            items, pagination = paginate(query, Page.updated_at, Page.id)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        pages = [page.to_dict(include_content=False) for page in items]
+        
+        response = jsonify({
             'pages': pages,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_prev': pagination.has_prev,
-                'has_next': pagination.has_next
-            }
-        }), 200
+            'pagination': pagination
+        })
+        return set_validators(response, etag), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to get pages'}), 500
@@ -73,12 +84,13 @@ def get_pages():
 def get_page(page_id):
     """Get a specific page."""
     try:
-        page = Page.query.get_or_404(page_id)
+        # Content is only loaded if the client's copy is stale
+        page = Page.query.options(*Page.serialization_options()).get_or_404(page_id)
         
         if not page.is_published and not current_user.can_edit_page(page):
             return jsonify({'error': 'Page not found'}), 404
         
-        return jsonify({'page': page.to_dict()}), 200
+        return page_response(page)
         
     except Exception as e:
         return jsonify({'error': 'Failed to get page'}), 500
@@ -88,12 +100,34 @@ def get_page(page_id):
 def get_page_by_slug(slug):
     """Get a page by slug."""
     try:
-        page = Page.query.filter_by(slug=slug, is_published=True, is_archived=False).first_or_404()
-        return jsonify({'page': page.to_dict()}), 200
+        page = Page.query.filter_by(slug=slug, is_published=True, is_archived=False).options(
+            *Page.serialization_options()
+        ).first_or_404()
+        return page_response(page)
         
     except Exception as e:
         return jsonify({'error': 'Failed to get page'}), 500
 
+def page_etag(page):
+    """Get a strong ETag for a page's JSON, from its version, update time, author and tags."""
+    tags = sorted(page.tags, key=lambda tag: tag.id)
+    tag_ids = ','.join(str(tag.id) for tag in tags)
+    updated = page.updated_at.timestamp() if page.updated_at else 0
+    
+    # The JSON embeds the author's names and the tag names, so their updates count too
+    author_updated = page.author.updated_at.timestamp() if page.author and page.author.updated_at else 0
+    tags_updated = max((tag.updated_at.timestamp() for tag in tags if tag.updated_at), default=0)
+    return f'page-{page.id}-{page.version}-{updated}-{author_updated}-{tag_ids}-{tags_updated}'
+
+def page_response(page):
+    """Answer a page request with 304 while the client's copy is current, else its full JSON."""
+    etag = page_etag(page)
+    if is_not_modified(etag, page.updated_at):
+        return not_modified(etag, page.updated_at)
+    
+    response = jsonify({'page': page.to_dict()})
+    return set_validators(response, etag, page.updated_at), 200
+
 @bp.route('/pages', methods=['POST'])
 @login_required
 def create_page():
@@ -186,12 +220,10 @@ def delete_page(page_id):
         if not current_user.can_delete_page(page):
             return jsonify({'error': 'Permission denied'}), 403
         
-        # Delete associated files
-        for file in page.files:
-            file.delete_file()
-        
+        # Attached files cascade; their blobs are released once the commit succeeds
         db.session.delete(page)
         db.session.commit()
+        page_service.remove_rendered_html(page_id)
         
         return jsonify({'message': 'Page deleted successfully'}), 200
         
@@ -199,6 +231,31 @@ def delete_page(page_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to delete page'}), 500
 
+@bp.route('/pages/<int:page_id>/html', methods=['GET'])
+@login_required
+def get_page_html(page_id):
+    """Get page content rendered to HTML, answering 304 while the client's copy is current."""
+    try:
+        # Content is only loaded if the render isn't cached
+        page = Page.query.options(defer(Page.content)).get_or_404(page_id)
+        
+        if not page.is_published and not current_user.can_edit_page(page):
+            return jsonify({'error': 'Page not found'}), 404
+        
+        etag = page_service.rendered_html_etag(page)
+        if is_not_modified(etag):
+            return not_modified(etag)
+        
+        response = jsonify({
+            'id': page.id,
+            'version': page.version,
+            'html': page_service.get_rendered_html(page)
+        })
+        return set_validators(response, etag)
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to render page'}), 500
+
 @bp.route('/pages/<int:page_id>/export/markdown', methods=['GET'])
 @login_required
 def export_page_markdown(page_id):
@@ -236,35 +293,9 @@ def export_page_pdf(page_id):
         if not page.is_published and not current_user.can_edit_page(page):
             return jsonify({'error': 'Page not found'}), 404
         
-        # Create PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Title
-        title = Paragraph(page.title, styles['Title'])
-        story.append(title)
-        story.append(Spacer(1, 12))
-        
-        # Metadata
-        metadata = f"Author: {page.author.get_display_name()}<br/>"
-        metadata += f"Created: {page.created_at.strftime('%Y-%m-%d %H:%M')}<br/>"
-        metadata += f"Updated: {page.updated_at.strftime('%Y-%m-%d %H:%M')}<br/>"
-        if page.tags:
-            metadata += f"Tags: {', '.join(page.get_tags_list())}<br/>"
-        
-        meta_para = Paragraph(metadata, styles['Normal'])
-        story.append(meta_para)
-        story.append(Spacer(1, 12))
-        
-        # Convert markdown to HTML and then to PDF
-        html_content = markdown.markdown(page.content)
-        content_para = Paragraph(html_content, styles['Normal'])
-        story.append(content_para)
-        
-        doc.build(story)
-        buffer.seek(0)
+        # Render in the job pool so reportlab doesn't block other requests
+        pdf = job_queue.run(page_service.render_page_pdf, page.id)
+        buffer = io.BytesIO(pdf)
         
         return send_file(
             buffer,
@@ -273,6 +304,10 @@ def export_page_pdf(page_id):
             download_name=f"{page.slug}.pdf"
         )
         
+    except TimeoutError:
+        return jsonify({'error': 'PDF export timed out'}), 504
+    except BrokenProcessPool:
+        return jsonify({'error': 'PDF export is temporarily unavailable'}), 503
     except Exception as e:
         return jsonify({'error': 'Failed to export page as PDF'}), 500
 
@@ -284,36 +319,108 @@ def export_all_pages():
         if not current_user.has_permission('admin'):
             return jsonify({'error': 'Permission denied'}), 403
         
-        pages = Page.query.filter_by(is_published=True, is_archived=False).all()
+        try:
+            job = submit_export_job()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        job_id = job['id']
+        job = job_queue.wait(job_id, timeout=current_app.config.get('EXPORT_WAIT_TIMEOUT', 60))
         
-        # Create ZIP file in memory
-        zip_buffer = io.BytesIO()
+        # Hand long exports over to polling rather than holding the worker
+        if job is not None and job['status'] not in ('finished', 'failed'):
+            return jsonify({
+                'message': 'Export is still running',
+                'job': job,
+                'status_url': f"/api/jobs/{job_id}"
+            }), 202
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for page in pages:
-                markdown_content = page.to_markdown()
-                zip_file.writestr(f"{page.slug}.md", markdown_content.encode('utf-8'))
-        
-        zip_buffer.seek(0)
+        if job is None or job['status'] != 'finished':
+            return jsonify({'error': 'Failed to export pages'}), 500
         
         return send_file(
-            zip_buffer,
+            job_queue.result_path(job['id']),
             mimetype='application/zip',
             as_attachment=True,
-            download_name='wiki-export.zip'
+            download_name=job['filename']
         )
         
     except Exception as e:
         return jsonify({'error': 'Failed to export pages'}), 500
 
+@bp.route('/pages/export/all', methods=['POST'])
+@login_required
+def start_export_all_pages():
+    """Start a background export of all pages; poll /api/jobs/<id> for progress."""
+    try:
+        if not current_user.has_permission('admin'):
+            return jsonify({'error': 'Permission denied'}), 403
+        
+        try:
+            job = submit_export_job()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'message': 'Export started',
+            'job': job,
+            'status_url': f"/api/jobs/{job['id']}"
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to start export'}), 500
+
+def parse_since(value):
+    """Parse an ISO 8601 watermark into a naive UTC datetime."""
+    try:
+        since = datetime.fromisoformat(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid since timestamp') from e
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+def submit_export_job():
+    """
+    Queue a ZIP export of published pages for the current user.
+    
+    Reads include_files and since from the query string; a JSON body may
+    also carry since and the manifest of a previous export.
+    
+    Raises:
+        ValueError: If since or the manifest is malformed
+    """
+    body = request.get_json(silent=True) or {}
+    include_files = request.args.get('include_files', 'false').lower() == 'true'
+    
+    since = body.get('since') or request.args.get('since')
+    if since is not None:
+        since = parse_since(since)
+    
+    manifest = body.get('manifest')
+    if manifest is not None and not isinstance(manifest, dict):
+        raise ValueError('Manifest must be a JSON object')
+    
+    incremental = since is not None or manifest is not None
+    return job_queue.submit(
+        'export',
+        page_service.export_pages_zip,
+        include_files,
+        since,
+        manifest,
+        owner_id=current_user.id,
+        filename='wiki-export-incremental.zip' if incremental else 'wiki-export.zip',
+        mimetype='application/zip'
+    )
+
 @bp.route('/tags', methods=['GET'])
 @login_required
 def get_tags():
     """Get all tags."""
     try:
         tags = Tag.query.all()
+        page_counts = Tag.get_page_counts()
         return jsonify({
-            'tags': [tag.to_dict() for tag in tags]
+            'tags': [tag.to_dict(page_count=page_counts.get(tag.id, 0)) for tag in tags]
         }), 200
         
     except Exception as e:
@@ -0,0 +1,94 @@
+"""
+Pagination helpers for HomelabWiki list endpoints.
+Supports classic page/per_page paging and opt-in keyset (cursor) paging.
+"""
+
+import base64
+import json
+from datetime import datetime
+from flask import request, current_app
+from sqlalchemy import tuple_
+
+def get_per_page():
+    """Get the requested page size, capped at PAGINATION_MAX_PER_PAGE."""
+    default = current_app.config.get('PAGINATION_PER_PAGE', 20)
+    maximum = current_app.config.get('PAGINATION_MAX_PER_PAGE', 100)
+    per_page = request.args.get('per_page', default, type=int)
+    return min(max(per_page, 1), maximum)
+
+def encode_cursor(sort_value, item_id):
+    """Encode the sort key of the last item on a page as an opaque cursor."""
+    payload = json.dumps([sort_value.isoformat() if sort_value else None, item_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor into (sort_value, id), raising ValueError if it is malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, item_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(sort_value), int(item_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def paginate(query, sort_column, id_column):
+    """
+    Paginate a query ordered newest first by (sort_column, id_column).
+    
+    Passing ?cursor= (empty for the first page) switches to keyset paging,
+    which seeks past the previous page instead of using OFFSET. Passing
+    ?include_total=false skips the COUNT query in either mode.
+    
+    Args:
+        query: SQLAlchemy query to paginate
+        sort_column: Timestamp column the listing is ordered by
+        id_column: Primary key column used as a tie-breaker
+    
+    Returns:
+        tuple: (items, pagination dict for the JSON response)
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    per_page = get_per_page()
+    include_total = request.args.get('include_total', 'true').lower() != 'false'
+    cursor = request.args.get('cursor')
+    
+    query = query.order_by(sort_column.desc(), id_column.desc())
+    
+    if cursor is None:
+        page = request.args.get('page', 1, type=int)
+        pagination = query.paginate(
+            page=page, per_page=per_page, error_out=False, count=include_total
+        )
+        return pagination.items, {
+            'page': page,
+            'per_page': per_page,
+            'total': pagination.total,
+            'pages': pagination.pages if include_total else None,
+            'has_prev': pagination.has_prev,
+            'has_next': pagination.has_next if include_total else len(pagination.items) == per_page
+        }
+    
+    total = query.order_by(None).count() if include_total else None
+    
+    if cursor:
+        sort_value, item_id = decode_cursor(cursor)
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, item_id))
+    
+    # Fetch one extra row to learn whether another page follows
+    items = query.limit(per_page + 1).all()
+    has_next = len(items) > per_page
+    items = items[:per_page]
+    
+    next_cursor = None
+    if has_next:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    
+    return items, {
+        'per_page': per_page,
+        'total': total,
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+        'has_next': has_next
+    }
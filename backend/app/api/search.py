@@ -6,9 +6,11 @@ from flask import request, jsonify
 from flask_login import login_required, current_user
 from sqlalchemy import or_
 from app.api import bp
+from app import db
 from app.models.page import Page, Tag
 from app.models.file import File
 from app.models.user import User
+from app.services.search_service import search_index, suggestion_index
 
 @bp.route('/search', methods=['GET'])
 @login_required
@@ -42,7 +44,7 @@ def search():
         # Search tags
         if search_type in ['all', 'tags']:
             tags = search_tags(query, limit)
-            results['tags'] = [tag.to_dict() for tag in tags]
+            results['tags'] = serialize_tags(tags)
         
         return jsonify(results), 200
         
@@ -106,7 +108,7 @@ def search_tags_endpoint():
         
         return jsonify({
             'query': query,
-            'tags': [tag.to_dict() for tag in tags]
+            'tags': serialize_tags(tags)
         }), 200
         
     except Exception as e:
@@ -123,33 +125,9 @@ def search_suggestions():
         if not query or len(query) < 2:
             return jsonify({'suggestions': []}), 200
         
-        suggestions = []
-        
-        # Get page title suggestions
-        page_titles = Page.query.filter(
-            Page.title.ilike(f"%{query}%"),
-            Page.is_published == True,
-            Page.is_archived == False
-        ).limit(limit // 2).all()
-        
-        for page in page_titles:
-            suggestions.append({
-                'text': page.title,
-                'type': 'page',
-                'url': f'/pages/{page.slug}'
-            })
-        
-        # Get tag suggestions
-        tag_names = Tag.query.filter(
-            Tag.name.ilike(f"%{query}%")
-        ).limit(limit // 2).all()
-        
-        for tag in tag_names:
-            suggestions.append({
-                'text': tag.name,
-                'type': 'tag',
-                'url': f'/pages?tag={tag.name}'
-            })
+        suggestions = suggestion_index.suggest(query, limit)
+        if suggestions is None:
+            suggestions = query_suggestions(query, limit)
         
         return jsonify({'suggestions': suggestions}), 200
         
@@ -168,11 +146,48 @@ def recent_searches():
     except Exception as e:
         return jsonify({'error': 'Failed to get recent searches'}), 500
 
+def query_suggestions(query, limit=10):
+    """Get suggestions from the database, reading only the needed columns."""
+    search_term = f"%{query}%"
+    suggestions = []
+    
+    # Get page title suggestions
+    page_titles = db.session.query(Page.title, Page.slug).filter(
+        Page.title.ilike(search_term),
+        Page.is_published == True,
+        Page.is_archived == False
+    ).limit(limit // 2).all()
+    
+    for title, slug in page_titles:
+        suggestions.append({
+            'text': title,
+            'type': 'page',
+            'url': f'/pages/{slug}'
+        })
+    
+    # Get tag suggestions
+    tag_names = db.session.query(Tag.name).filter(
+        Tag.name.ilike(search_term)
+    ).limit(limit // 2).all()
+    
+    for (name,) in tag_names:
+        suggestions.append({
+            'text': name,
+            'type': 'tag',
+            'url': f'/pages?tag={name}'
+        })
+    
+    return suggestions
+
 def search_pages(query, limit=20):
     """Search pages by title and content."""
+    page_ids = search_index.search(query, limit)
+    if page_ids is not None:
+        return load_pages_in_order(page_ids)
+    
     search_term = f"%{query}%"
     
-    # Search in title and content
+    # Fall back to scanning title and content when the index is unavailable
     pages = Page.query.filter(
         or_(
             Page.title.ilike(search_term),
@@ -180,7 +195,7 @@ def search_pages(query, limit=20):
         ),
         Page.is_published == True,
         Page.is_archived == False
-    ).order_by(
+    ).options(*Page.serialization_options()).order_by(
         # Prioritize title matches
         Page.title.ilike(search_term).desc(),
         Page.updated_at.desc()
@@ -188,6 +203,20 @@ def search_pages(query, limit=20):
     
     return pages
 
+def load_pages_in_order(page_ids):
+    """Load published pages for the given ids, preserving relevance order."""
+    if not page_ids:
+        return []
+    
+    pages = Page.query.filter(
+        Page.id.in_(page_ids),
+        Page.is_published == True,
+        Page.is_archived == False
+    ).options(*Page.serialization_options()).all()
+    
+    pages_by_id = {page.id: page for page in pages}
+    return [pages_by_id[page_id] for page_id in page_ids if page_id in pages_by_id]
+
 def search_tags(query, limit=20):
     """Search tags by name."""
     search_term = f"%{query}%"
@@ -198,6 +227,11 @@ def search_tags(query, limit=20):
     
     return tags
 
+def serialize_tags(tags):
+    """Serialize tags with their page counts fetched in one query."""
+    page_counts = Tag.get_page_counts([tag.id for tag in tags])
+    return [tag.to_dict(page_count=page_counts.get(tag.id, 0)) for tag in tags]
+
 @bp.route('/search/advanced', methods=['POST'])
 @login_required
 def advanced_search():
@@ -223,10 +257,18 @@ def advanced_search():
         
         # Apply filters
         if title_query:
-            query = query.filter(Page.title.ilike(f"%{title_query}%"))
+            title_search = search_index.filter_query(query, title_query, fields=['title'])
+            if title_search is not None:
+                query = title_search
+            else:
+                query = query.filter(Page.title.ilike(f"%{title_query}%"))
         
         if content_query:
-            query = query.filter(Page.content.ilike(f"%{content_query}%"))
+            content_search = search_index.filter_query(query, content_query, fields=['content'])
+            if content_search is not None:
+                query = content_search
+            else:
+                query = query.filter(Page.content.ilike(f"%{content_query}%"))
         
         if author_query:
             query = query.join(Page.author).filter(
@@ -247,7 +289,9 @@ def advanced_search():
             query = query.filter(Page.created_at <= date_to)
         
         # Execute query
-        pages = query.order_by(Page.updated_at.desc()).limit(50).all()
+        pages = query.options(*Page.serialization_options()).order_by(
+            Page.updated_at.desc()
+        ).limit(50).all()
         
         return jsonify({
             'pages': [page.to_dict(include_content=False) for page in pages],
@@ -3,18 +3,168 @@ LDAP/Active Directory authentication for HomelabWiki.
 Handles user authentication and group membership validation.
 """
 
-import ldap
-import ldap.filter
+import threading
+import time
+import ldap3
+from ldap3.core.exceptions import (
+    LDAPBindError, LDAPCommunicationError, LDAPException, LDAPInvalidCredentialsResult,
+    LDAPOperationResult
+)
+from ldap3.utils.conv import escape_filter_chars
+from ldap3.utils.dn import parse_dn
 from flask import current_app, session
 from flask_login import login_user, logout_user
 from app import db
 from app.models.user import User
+from app.services.cache_service import TTLCache
 import logging
 
+# python-ldap is only needed when LDAP_BACKEND is 'python-ldap'
+try:
+    import ldap
+except ImportError:
+    ldap = None
+
 logger = logging.getLogger(__name__)
 
+# Active Directory matching rule that follows nested group membership
+LDAP_MATCHING_RULE_IN_CHAIN = '1.2.840.113556.1.4.1941'
+
+class LDAPConnectionPool:
+    """
+    Bounded pool of connections bound as the service account.
+    
+    Connections are reused across logins instead of paying for a connect,
+    StartTLS and bind every time. Idle connections are health-checked before
+    reuse, with a round trip to the server once they have been idle for
+    probe_after seconds, and dropped after max_idle seconds. A connection
+    that fails because the server went away is replaced and the operation
+    retried once.
+    """
+    
+    def __init__(self, authenticator, maxsize=4, max_idle=300, acquire_timeout=10, probe_after=30):
+        """
+        Args:
+            authenticator (LDAPAuthenticator): Creates, binds, checks and closes connections
+            maxsize (int): Maximum number of open connections
+            max_idle (float): Seconds an idle connection may be kept
+            acquire_timeout (float): Seconds to wait for a free connection
+            probe_after (float): Seconds idle before reuse is checked with the server
+        """
+        self.authenticator = authenticator
+        self.maxsize = maxsize
+        self.max_idle = max_idle
+        self.probe_after = probe_after
+        self.acquire_timeout = acquire_timeout
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+        self.discarded = 0
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(maxsize)
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Get a service-account connection, reusing an idle one when it is still healthy."""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise RuntimeError('Timed out waiting for an LDAP connection')
+        
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        self.misses += 1
+                        break
+                    connection, released_at = self._idle.pop()
+                
+                idle = time.monotonic() - released_at
+                if idle <= self.max_idle and self.authenticator._is_alive(connection, probe=idle >= self.probe_after):
+                    with self._lock:
+                        self.hits += 1
+                    return connection
+                self._close(connection)
+            
+            connection = self.authenticator._get_ldap_connection()
+            try:
+                self.authenticator._bind_service_account(connection)
+            except Exception:
+                self._close(connection)
+                raise
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+    
+    def release(self, connection):
+        """Return a healthy connection to the pool."""
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+        self._slots.release()
+    
+    def discard(self, connection):
+        """Close a connection that may be broken instead of returning it."""
+        self._close(connection)
+        self._slots.release()
+    
+    def _close(self, connection):
+        with self._lock:
+            self.discarded += 1
+        try:
+            self.authenticator._close(connection)
+        except Exception:
+            pass
+    
+    def run(self, func):
+        """
+        Call func(connection) with a pooled connection.
+        
+        Returns:
+            The function's return value
+        """
+        for attempt in range(2):
+            connection = self.acquire()
+            try:
+                result = func(connection)
+            except self.authenticator.server_down_errors:
+                self.discard(connection)
+                if attempt:
+                    raise
+                with self._lock:
+                    self.reconnects += 1
+                continue
+            except BaseException:
+                self.discard(connection)
+                raise
+            
+            self.release(connection)
+            return result
+    
+    def clear(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+    
+    def stats(self):
+        """Get pool hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'reconnects': self.reconnects,
+                'discarded': self.discarded,
+                'idle': len(self._idle),
+                'maxsize': self.maxsize
+            }
+
 class LDAPAuthenticator:
-    """LDAP authentication handler."""
+    """
+    LDAP authentication handler built on python-ldap.
+    
+    python-ldap blocks in C, so under gevent a slow domain controller stalls
+    the whole worker; prefer Ldap3Authenticator unless it is unavailable.
+    """
     
     def __init__(self, app=None):
         self.app = app
@@ -36,6 +186,33 @@ class LDAPAuthenticator:
         self.email_attribute = app.config.get('LDAP_EMAIL_ATTRIBUTE', 'mail')
         self.firstname_attribute = app.config.get('LDAP_FIRSTNAME_ATTRIBUTE', 'givenName')
         self.lastname_attribute = app.config.get('LDAP_LASTNAME_ATTRIBUTE', 'sn')
+        self.user_object_class = app.config.get('LDAP_USER_OBJECT_CLASS', 'user')
+        self.connect_timeout = app.config.get('LDAP_CONNECT_TIMEOUT', 5)
+        self.operation_timeout = app.config.get('LDAP_OPERATION_TIMEOUT', 10)
+        self.pool = LDAPConnectionPool(
+            self,
+            maxsize=app.config.get('LDAP_POOL_SIZE', 4),
+            max_idle=app.config.get('LDAP_POOL_MAX_IDLE', 300),
+            acquire_timeout=app.config.get('LDAP_POOL_TIMEOUT', 10),
+            probe_after=app.config.get('LDAP_POOL_PROBE_AFTER', 30)
+        )
+        
+        # Directory lookups cached by username and by user DN
+        self.nested_groups = app.config.get('LDAP_NESTED_GROUPS', False)
+        cache_ttl = app.config.get('LDAP_CACHE_TTL', 300)
+        cache_size = app.config.get('LDAP_CACHE_SIZE', 1024)
+        self.user_cache = TTLCache(ttl=cache_ttl, maxsize=cache_size)
+        self.group_cache = TTLCache(ttl=cache_ttl, maxsize=cache_size)
+    
+    @property
+    def errors(self):
+        """Exception type raised by this backend for LDAP failures."""
+        return ldap.LDAPError
+    
+    @property
+    def server_down_errors(self):
+        """Exception types meaning the connection is gone and should be replaced."""
+        return (ldap.SERVER_DOWN, ldap.CONNECT_ERROR)
     
     def _get_ldap_connection(self):
         """Create LDAP connection."""
@@ -46,6 +223,8 @@ class LDAPAuthenticator:
             connection = ldap.initialize(ldap_url)
             connection.set_option(ldap.OPT_PROTOCOL_VERSION, 3)
             connection.set_option(ldap.OPT_REFERRALS, 0)
+            connection.set_option(ldap.OPT_NETWORK_TIMEOUT, self.connect_timeout)
+            connection.set_option(ldap.OPT_TIMEOUT, self.operation_timeout)
             
             if self.use_tls and not self.use_ssl:
                 connection.start_tls_s()
@@ -69,48 +248,190 @@ class LDAPAuthenticator:
             logger.error(f"Failed to bind service account: {e}")
             raise
     
+    def _search(self, connection, search_base, search_filter, attributes):
+        """Run a subtree search and return (dn, attributes) pairs."""
+        return connection.search_s(search_base, ldap.SCOPE_SUBTREE, search_filter, attributes)
+    
+    def _paged_search(self, connection, search_base, search_filter, attributes, page_size):
+        """Yield (dn, attributes) pairs from a subtree search fetched in pages."""
+        from ldap.controls import SimplePagedResultsControl
+        
+        control = SimplePagedResultsControl(True, size=page_size, cookie='')
+        while True:
+            msgid = connection.search_ext(
+                search_base, ldap.SCOPE_SUBTREE, search_filter, attributes, serverctrls=[control]
+            )
+            _, results, _, response_controls = connection.result3(msgid)
+            
+            for dn, attrs in results:
+                if dn:  # Skip referrals
+                    yield dn, attrs
+            
+            cookies = [
+                response_control.cookie for response_control in response_controls
+                if response_control.controlType == SimplePagedResultsControl.controlType
+            ]
+            if not cookies or not cookies[0]:
+                break
+            control.cookie = cookies[0]
+    
+    @property
+    def user_attributes(self):
+        """Attributes requested for user entries."""
+        return [self.username_attribute, self.email_attribute,
+                self.firstname_attribute, self.lastname_attribute, 'memberOf']
+    
     def _search_user(self, connection, username):
-        """Search for user in LDAP."""
-        search_filter = f"({self.username_attribute}={ldap.filter.escape_filter_chars(username)})"
+        """Search for user in LDAP, returning a cached (dn, attributes) pair when fresh."""
+        cache_key = username.lower()
+        cached = self.user_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        search_filter = f"({self.username_attribute}={escape_filter_chars(username)})"
         
         try:
-            result = connection.search_s(
-                self.user_search_base,
-                ldap.SCOPE_SUBTREE,
-                search_filter,
-                [self.username_attribute, self.email_attribute, 
-                 self.firstname_attribute, self.lastname_attribute, 'memberOf']
-            )
+            result = self._search(connection, self.user_search_base, search_filter, self.user_attributes)
             
             if result:
+                self.user_cache.set(cache_key, result[0])
                 return result[0]  # Return first match
             return None
-        except ldap.LDAPError as e:
+        except self.errors as e:
             logger.error(f"Failed to search user {username}: {e}")
             raise
     
-    def _get_user_groups(self, connection, user_dn):
-        """Get user's group memberships."""
+    def _get_user_groups(self, connection, user_dn, user_attrs=None):
+        """
+        Get user's group memberships, cached by user DN.
+        
+        Direct memberships come from the user's memberOf attribute when the
+        directory returned it, avoiding a second search. With
+        LDAP_NESTED_GROUPS, one search using the AD in-chain matching rule
+        resolves nested groups instead.
+        """
+        groups = self.group_cache.get(user_dn)
+        if groups is not None:
+            return groups
+        
+        member_of = (user_attrs or {}).get('memberOf')
+        if member_of and not self.nested_groups:
+            groups = self._groups_from_member_of(member_of)
+        else:
+            groups = self._search_groups(connection, user_dn)
+            if groups is None:
+                return []
+        
+        self.group_cache.set(user_dn, groups)
+        return groups
+    
+    def _groups_from_member_of(self, member_of):
+        """Get group names under the group search base from memberOf DNs."""
+        suffix = ',' + self.group_search_base.lower()
+        groups = []
+        for value in member_of:
+            group_dn = value.decode('utf-8') if isinstance(value, bytes) else value
+            if not group_dn.lower().endswith(suffix):
+                continue
+            try:
+                attribute, name, _ = parse_dn(group_dn)[0]
+            except Exception:
+                continue
+            if attribute.lower() == 'cn':
+                groups.append(name)
+        return groups
+    
+    def _search_groups(self, connection, user_dn):
+        """Search the group base for groups containing the user, or None on failure."""
         try:
             # Search for groups where user is a member
-            search_filter = f"(member={ldap.filter.escape_filter_chars(user_dn)})"
+            if self.nested_groups:
+                search_filter = f"(member:{LDAP_MATCHING_RULE_IN_CHAIN}:={escape_filter_chars(user_dn)})"
+            else:
+                search_filter = f"(member={escape_filter_chars(user_dn)})"
             
-            result = connection.search_s(
-                self.group_search_base,
-                ldap.SCOPE_SUBTREE,
-                search_filter,
-                ['cn', 'description']
-            )
+            result = self._search(connection, self.group_search_base, search_filter, ['cn', 'description'])
             
             groups = []
             for group_dn, group_attrs in result:
-                if 'cn' in group_attrs:
+                if group_attrs.get('cn'):
                     groups.append(group_attrs['cn'][0].decode('utf-8'))
             
             return groups
-        except ldap.LDAPError as e:
+        except self.errors as e:
             logger.error(f"Failed to get user groups: {e}")
-            return []
+            return None
+    
+    def iter_directory_users(self, page_size=500):
+        """
+        Yield user data with groups for every user under the user search base.
+        
+        Users are streamed with paged results, and memberships come from
+        memberOf in the same responses. Users that need a group search
+        (no memberOf, or LDAP_NESTED_GROUPS) are resolved after paging ends.
+        The group cache is refreshed along the way.
+        
+        Args:
+            page_size (int): Entries requested per page
+        
+        Yields:
+            dict: User data as returned by authenticate()
+        """
+        search_filter = f"(&(objectClass={self.user_object_class})({self.username_attribute}=*))"
+        connection = self.pool.acquire()
+        try:
+            pending = []
+            for user_dn, user_attrs in self._paged_search(
+                connection, self.user_search_base, search_filter, self.user_attributes, page_size
+            ):
+                user_data = self._extract_user_data(user_dn, user_attrs)
+                member_of = user_attrs.get('memberOf')
+                if member_of and not self.nested_groups:
+                    user_data['groups'] = self._groups_from_member_of(member_of)
+                    self.group_cache.set(user_dn, user_data['groups'])
+                    yield user_data
+                else:
+                    pending.append(user_data)
+            
+            for user_data in pending:
+                user_data['groups'] = self._search_groups(connection, user_data['dn']) or []
+                self.group_cache.set(user_data['dn'], user_data['groups'])
+                yield user_data
+        except BaseException:
+            self.pool.discard(connection)
+            raise
+        else:
+            self.pool.release(connection)
+    
+    def invalidate_user(self, username):
+        """Drop cached directory data for a user so the next lookup is fresh."""
+        cache_key = username.lower()
+        cached = self.user_cache.get(cache_key)
+        self.user_cache.invalidate(cache_key)
+        if cached is not None:
+            self.group_cache.invalidate(cached[0])
+    
+    def _bind_user(self, connection, user_dn, password):
+        """Check user credentials by binding as the user on the given connection."""
+        try:
+            connection.simple_bind_s(user_dn, password)
+            return True
+        except ldap.INVALID_CREDENTIALS:
+            return False
+    
+    def _is_alive(self, connection, probe=True):
+        """Check that a pooled connection still answers; without probe it is assumed to."""
+        if not probe:
+            return True
+        try:
+            connection.whoami_s()
+            return True
+        except ldap.LDAPError:
+            return False
+    
+    def _close(self, connection):
+        """Unbind and close a connection."""
+        connection.unbind_s()
     
     def _extract_user_data(self, user_dn, user_attrs):
         """Extract user data from LDAP attributes."""
@@ -147,12 +468,7 @@ class LDAPAuthenticator:
         if not username or not password:
             return None
         
-        connection = None
-        try:
-            # Create connection and bind service account
-            connection = self._get_ldap_connection()
-            self._bind_service_account(connection)
-            
+        def check_credentials(connection):
             # Search for user
             user_result = self._search_user(connection, username)
             if not user_result:
@@ -161,46 +477,204 @@ class LDAPAuthenticator:
             
             user_dn, user_attrs = user_result
             
-            # Try to bind with user credentials
-            user_connection = self._get_ldap_connection()
-            try:
-                user_connection.simple_bind_s(user_dn, password)
-            except ldap.INVALID_CREDENTIALS:
-                logger.warning(f"Invalid credentials for user {username}")
-                return None
-            finally:
-                user_connection.unbind_s()
-            
             # Extract user data
             user_data = self._extract_user_data(user_dn, user_attrs)
             
-            # Get user groups
-            groups = self._get_user_groups(connection, user_dn)
+            # Get user groups while still bound as the service account
+            groups = self._get_user_groups(connection, user_dn, user_attrs)
             user_data['groups'] = groups
             
+            # Try to bind with user credentials, then restore the service bind for reuse
+            try:
+                valid = self._bind_user(connection, user_dn, password)
+            finally:
+                self._bind_service_account(connection)
+            
+            if not valid:
+                logger.warning(f"Invalid credentials for user {username}")
+                return None
+            
             logger.info(f"User {username} authenticated successfully")
             return user_data
-            
-        except ldap.LDAPError as e:
+        
+        try:
+            return self.pool.run(check_credentials)
+        except self.errors as e:
             logger.error(f"LDAP authentication failed for {username}: {e}")
             return None
-        finally:
-            if connection:
-                connection.unbind_s()
+    
+    def get_user_info(self, username):
+        """Get user information and groups without authenticating the user."""
+        def lookup(connection):
+            user_result = self._search_user(connection, username)
+            if not user_result:
+                return None
+            
+            user_dn, user_attrs = user_result
+            user_data = self._extract_user_data(user_dn, user_attrs)
+            user_data['groups'] = self._get_user_groups(connection, user_dn, user_attrs)
+            return user_data
+        
+        return self.pool.run(lookup)
     
     def test_connection(self):
         """Test LDAP connection."""
         try:
             connection = self._get_ldap_connection()
             self._bind_service_account(connection)
-            connection.unbind_s()
+            self._close(connection)
             return True
         except Exception as e:
             logger.error(f"LDAP connection test failed: {e}")
             return False
 
-# Global authenticator instance
-ldap_auth = LDAPAuthenticator()
+class Ldap3Authenticator(LDAPAuthenticator):
+    """
+    LDAP authentication handler built on ldap3.
+    
+    ldap3 is pure Python, so its socket I/O yields to other greenlets under
+    gevent instead of blocking the worker while a domain controller responds.
+    """
+    
+    def init_app(self, app):
+        """Initialize LDAP configuration and the server definition."""
+        super().init_app(app)
+        self.ldap_server = ldap3.Server(
+            self.server,
+            port=self.port,
+            use_ssl=self.use_ssl,
+            get_info=ldap3.NONE,
+            connect_timeout=self.connect_timeout
+        )
+    
+    @property
+    def errors(self):
+        """Exception type raised by this backend for LDAP failures."""
+        return LDAPException
+    
+    @property
+    def server_down_errors(self):
+        """Exception types meaning the connection is gone and should be replaced."""
+        return (LDAPCommunicationError,)
+    
+    def _get_ldap_connection(self):
+        """Create and open LDAP connection."""
+        try:
+            connection = ldap3.Connection(
+                self.ldap_server,
+                auto_bind=ldap3.AUTO_BIND_NONE,
+                auto_referrals=False,
+                read_only=True,
+                receive_timeout=self.operation_timeout,
+                raise_exceptions=True
+            )
+            connection.open()
+            
+            if self.use_tls and not self.use_ssl:
+                connection.start_tls()
+            
+            return connection
+        except LDAPException as e:
+            logger.error(f"Failed to create LDAP connection: {e}")
+            raise
+    
+    def _bind_service_account(self, connection):
+        """Bind with service account."""
+        try:
+            if self.bind_dn and self.bind_password:
+                connection.rebind(user=self.bind_dn, password=self.bind_password)
+            else:
+                # rebind() keeps the last user's credentials, so drop them to go back to anonymous
+                connection.user = None
+                connection.password = None
+                connection.rebind(authentication=ldap3.ANONYMOUS)
+        except (LDAPBindError, LDAPInvalidCredentialsResult):
+            logger.error("Invalid service account credentials")
+            raise
+        except LDAPException as e:
+            logger.error(f"Failed to bind service account: {e}")
+            raise
+    
+    def _search(self, connection, search_base, search_filter, attributes):
+        """Run a subtree search and return (dn, raw attributes) pairs like python-ldap."""
+        connection.search(search_base, search_filter, ldap3.SUBTREE, attributes=attributes)
+        return [
+            (entry['dn'], entry['raw_attributes'])
+            for entry in connection.response
+            if entry.get('type') == 'searchResEntry'
+        ]
+    
+    def _paged_search(self, connection, search_base, search_filter, attributes, page_size):
+        """Yield (dn, raw attributes) pairs from a subtree search fetched in pages."""
+        entries = connection.extend.standard.paged_search(
+            search_base,
+            search_filter,
+            ldap3.SUBTREE,
+            attributes=attributes,
+            paged_size=page_size,
+            generator=True
+        )
+        for entry in entries:
+            if entry.get('type') == 'searchResEntry':
+                yield entry['dn'], entry['raw_attributes']
+    
+    def _bind_user(self, connection, user_dn, password):
+        """Check user credentials by binding as the user on the given connection."""
+        try:
+            connection.rebind(user=user_dn, password=password)
+            return True
+        except (LDAPBindError, LDAPInvalidCredentialsResult):
+            return False
+    
+    def _is_alive(self, connection, probe=True):
+        """
+        Check that a pooled connection is still open and bound.
+        
+        The local flags don't notice a server that dropped an idle connection,
+        so with probe set a base-scope search of the base DN asks the server.
+        Any LDAP result, even an error, shows it is still answering.
+        """
+        if not connection.bound or connection.closed:
+            return False
+        if not probe:
+            return True
+        
+        try:
+            connection.search(self.base_dn, '(objectClass=*)', ldap3.BASE, attributes=ldap3.NO_ATTRIBUTES)
+        except LDAPOperationResult:
+            pass
+        except LDAPException:
+            return False
+        return True
+    
+    def _close(self, connection):
+        """Unbind and close a connection."""
+        try:
+            connection.unbind()
+        except LDAPException:
+            pass
+
+# Authenticator classes selectable with LDAP_BACKEND
+LDAP_BACKENDS = {
+    'ldap3': Ldap3Authenticator,
+    'python-ldap': LDAPAuthenticator
+}
+
+# Global authenticator instance, replaced by init_app() with the configured backend
+ldap_auth = Ldap3Authenticator()
+
+def init_app(app):
+    """Create the authenticator selected by LDAP_BACKEND."""
+    global ldap_auth
+    
+    backend = app.config.get('LDAP_BACKEND', 'ldap3')
+    if backend not in LDAP_BACKENDS:
+        raise ValueError(f"Unknown LDAP_BACKEND: {backend}")
+    if backend == 'python-ldap' and ldap is None:
+        raise RuntimeError("LDAP_BACKEND is 'python-ldap' but python-ldap is not installed")
+    
+    ldap_auth = LDAP_BACKENDS[backend](app)
+    return ldap_auth
 
 def login_user_with_ldap(username, password):
     """Login user with LDAP authentication."""
@@ -253,36 +727,24 @@ def test_ldap_connection():
         logger.error(f"LDAP connection test failed: {e}")
         return False
 
+def get_ldap_pool_stats():
+    """Get service-account connection pool statistics."""
+    return ldap_auth.pool.stats()
+
 def get_ldap_user_info(username):
     """Get user information from LDAP without authentication."""
-    connection = None
     try:
-        connection = ldap_auth._get_ldap_connection()
-        ldap_auth._bind_service_account(connection)
-        
-        user_result = ldap_auth._search_user(connection, username)
-        if not user_result:
-            return None
-        
-        user_dn, user_attrs = user_result
-        user_data = ldap_auth._extract_user_data(user_dn, user_attrs)
-        
-        # Get user groups
-        groups = ldap_auth._get_user_groups(connection, user_dn)
-        user_data['groups'] = groups
-        
-        return user_data
-        
+        return ldap_auth.get_user_info(username)
     except Exception as e:
         logger.error(f"Failed to get LDAP user info for {username}: {e}")
         return None
-    finally:
-        if connection:
-            connection.unbind_s()
 
 def sync_user_from_ldap(username):
     """Sync user data from LDAP."""
     try:
+        # Always read fresh directory data when syncing
+        ldap_auth.invalidate_user(username)
+        
         ldap_user_data = get_ldap_user_info(username)
         if not ldap_user_data:
             return False, "User not found in LDAP"
@@ -0,0 +1,412 @@
+"""
+CLI commands for HomelabWiki.
+Maintenance tasks run via the Flask CLI (e.g. `flask search rebuild`).
+"""
+
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import selectinload
+
+search_cli = AppGroup('search', help='Full-text search index maintenance.')
+pages_cli = AppGroup('pages', help='Wiki page maintenance.')
+files_cli = AppGroup('files', help='Uploaded file maintenance.')
+schema_cli = AppGroup('schema', help='Database schema maintenance.')
+ldap_cli = AppGroup('ldap', help='LDAP directory synchronization.')
+sessions_cli = AppGroup('sessions', help='Server-side session maintenance.')
+backup_cli = AppGroup('backup', help='Database and upload backups.')
+
+def add_missing_columns(table):
+    """Add model columns missing from an existing table and return their names."""
+    from app import db
+    
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    added = []
+    
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            added.append(column.name)
+    
+    db.session.commit()
+    return added
+
+def add_missing_indexes(table):
+    """Create model indexes missing from an existing table and return their names."""
+    from app import db
+    
+    existing = {index['name'] for index in inspect(db.engine).get_indexes(table.name)}
+    added = []
+    
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(bind=db.engine)
+            added.append(index.name)
+    
+    return added
+
+@schema_cli.command('upgrade')
+def upgrade_schema():
+    """Add tables, columns and indexes missing from a database created by an older version."""
+    from app import db
+    
+    db.create_all()
+    
+    for table in db.metadata.sorted_tables:
+        for name in add_missing_columns(table):
+            click.echo(f'Added column {table.name}.{name}')
+        for name in add_missing_indexes(table):
+            click.echo(f'Added index {name}')
+    
+    click.echo('Schema is up to date')
+
+@search_cli.command('rebuild')
+@click.option('--batch-size', type=int, default=None,
+              help='Pages loaded and bulk-indexed per chunk (default: SEARCH_BULK_CHUNK_SIZE).')
+def rebuild_search_index(batch_size):
+    """Rebuild the full-text search index from the database."""
+    from app.models.page import Page
+    from app.services.search_service import search_index
+    
+    batch_size = batch_size or current_app.config.get('SEARCH_BULK_CHUNK_SIZE', 500)
+    
+    started = time.perf_counter()
+    # Stream pages in chunks rather than loading the whole table
+    pages = Page.query.options(selectinload(Page.tags)).order_by(Page.id).yield_per(batch_size)
+    count = search_index.rebuild(pages, chunk_size=batch_size)
+    elapsed = time.perf_counter() - started
+    
+    click.echo(f'Indexed {count} pages into {search_index.backend.name} in {elapsed:.2f}s')
+
+@pages_cli.command('backfill')
+@click.option('--batch-size', default=500, show_default=True, help='Pages updated per transaction.')
+def backfill_page_fields(batch_size):
+    """Add and populate the stored fields derived from page content."""
+    from app import db
+    from app.models.page import Page
+    
+    added = add_missing_columns(Page.__table__)
+    if added:
+        click.echo(f'Added columns: {", ".join(added)}')
+    
+    started = time.perf_counter()
+    count = 0
+    last_id = 0
+    
+    # Core executemany skips the ORM flush; updated_at is set to itself so the
+    # column's onupdate doesn't stamp every page as just edited
+    table = Page.__table__
+    statement = table.update().where(table.c.id == db.bindparam('page_id')).values(
+        updated_at=table.c.updated_at
+    )
+    
+    while True:
+        rows = db.session.query(Page.id, Page.content).filter(
+            Page.id > last_id
+        ).order_by(Page.id).limit(batch_size).all()
+        if not rows:
+            break
+        
+        params = []
+        for row in rows:
+            page = Page(content=row.content)
+            page.update_derived_fields()
+            params.append({
+                'page_id': row.id,
+                'word_count': page.word_count,
+                'reading_time': page.reading_time,
+                'summary': page.summary,
+                'headings': page.headings
+            })
+        db.session.execute(statement, params)
+        db.session.commit()
+        
+        count += len(rows)
+        last_id = rows[-1].id
+    
+    elapsed = time.perf_counter() - started
+    click.echo(f'Backfilled {count} pages in {elapsed:.2f}s')
+
+@files_cli.command('backfill')
+@click.option('--batch-size', default=1000, show_default=True, help='Files updated per transaction.')
+def backfill_file_fields(batch_size):
+    """Add and populate the file_type category column."""
+    from app import db
+    from app.models.file import File
+    
+    added = add_missing_columns(File.__table__)
+    if added:
+        click.echo(f'Added columns: {", ".join(added)}')
+    add_missing_indexes(File.__table__)
+    
+    started = time.perf_counter()
+    count = 0
+    last_id = 0
+    
+    # As in the page backfill, keep onupdate from stamping every file as just edited
+    table = File.__table__
+    statement = table.update().where(table.c.id == db.bindparam('file_id')).values(
+        updated_at=table.c.updated_at
+    )
+    
+    while True:
+        rows = db.session.query(File.id, File.original_filename).filter(
+            File.id > last_id
+        ).order_by(File.id).limit(batch_size).all()
+        if not rows:
+            break
+        
+        db.session.execute(
+            statement,
+            [{'file_id': row.id, 'file_type': File.categorize(row.original_filename)} for row in rows]
+        )
+        db.session.commit()
+        
+        count += len(rows)
+        last_id = rows[-1].id
+    
+    elapsed = time.perf_counter() - started
+    click.echo(f'Backfilled {count} files in {elapsed:.2f}s')
+
+@files_cli.command('dedupe')
+@click.option('--batch-size', default=500, show_default=True, help='Files migrated per transaction.')
+@click.option('--dry-run', is_flag=True, help='Report what would change without touching anything.')
+def dedupe_files(batch_size, dry_run):
+    """Move uploads into the content-addressed store, merging identical files."""
+    import os
+    import shutil
+    from app import db
+    from app.models.file import File
+    from app.services.file_service import blob_path, hash_file
+    
+    if not dry_run:
+        add_missing_indexes(File.__table__)
+    
+    upload_dir = current_app.config['UPLOAD_FOLDER']
+    started = time.perf_counter()
+    migrated = 0
+    missing = 0
+    duplicates = 0
+    reclaimed = 0
+    last_id = 0
+    stored = set()
+    
+    while True:
+        rows = db.session.query(File.id, File.file_path, File.file_hash).filter(
+            File.id > last_id
+        ).order_by(File.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        updates = []
+        old_paths = set()
+        
+        for row in rows:
+            if not os.path.exists(row.file_path):
+                missing += 1
+                continue
+            
+            file_hash = row.file_hash or hash_file(row.file_path)
+            target = blob_path(upload_dir, file_hash)
+            if os.path.abspath(row.file_path) == os.path.abspath(target):
+                continue
+            
+            if target in stored or os.path.exists(target):
+                duplicates += 1
+                reclaimed += os.path.getsize(row.file_path)
+            elif not dry_run:
+                # Link (or copy) rather than move so the row stays valid until commit
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                try:
+                    os.link(row.file_path, target)
+                except OSError:
+                    partial = f'{target}.part'
+                    shutil.copy2(row.file_path, partial)
+                    os.replace(partial, target)
+            stored.add(target)
+            
+            updates.append({
+                'file_id': row.id,
+                'file_path': target,
+                'filename': file_hash,
+                'file_hash': file_hash
+            })
+            old_paths.add(row.file_path)
+        
+        migrated += len(updates)
+        if dry_run or not updates:
+            continue
+        
+        db.session.execute(
+            File.__table__.update().where(File.__table__.c.id == db.bindparam('file_id')),
+            updates
+        )
+        db.session.commit()
+        
+        # Remove the old copies once no record points at them any more
+        for path in old_paths:
+            if not db.session.query(File.id).filter(File.file_path == path).first():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    elapsed = time.perf_counter() - started
+    prefix = 'Would migrate' if dry_run else 'Migrated'
+    click.echo(
+        f'{prefix} {migrated} files in {elapsed:.2f}s: {duplicates} duplicates, '
+        f'{File.format_file_size(reclaimed)} reclaimed, {missing} missing on disk'
+    )
+
+@ldap_cli.command('sync')
+@click.option('--page-size', default=500, show_default=True, help='LDAP entries requested per page.')
+@click.option('--batch-size', default=500, show_default=True, help='Users updated per transaction.')
+@click.option('--dry-run', is_flag=True, help='Report changes without writing them.')
+def sync_ldap_users(page_size, batch_size, dry_run):
+    """Sync all known users from the directory with paged searches and batched updates."""
+    from datetime import datetime
+    from app import db
+    from app.auth import ldap_auth
+    from app.models.user import User
+    
+    fields = list(User.LDAP_FIELDS) + list(User.permissions_from_groups([]))
+    columns = [getattr(User, field) for field in fields]
+    
+    # Current values for every user, keyed by lower-cased username
+    current = {
+        row.username.lower(): row
+        for row in db.session.query(User.id, User.username, *columns)
+    }
+    
+    started = time.perf_counter()
+    ldap_seconds = 0.0
+    db_seconds = 0.0
+    scanned = 0
+    not_in_db = 0
+    unchanged = 0
+    updated = 0
+    seen = set()
+    updates = []
+    changed_fields = {}
+    
+    def flush():
+        nonlocal db_seconds
+        if not updates:
+            return
+        db_started = time.perf_counter()
+        if not dry_run:
+            db.session.execute(
+                User.__table__.update().where(User.__table__.c.id == db.bindparam('user_id')),
+                updates
+            )
+            db.session.commit()
+        db_seconds += time.perf_counter() - db_started
+        updates.clear()
+    
+    users = ldap_auth.ldap_auth.iter_directory_users(page_size=page_size)
+    while True:
+        ldap_started = time.perf_counter()
+        user_data = next(users, None)
+        ldap_seconds += time.perf_counter() - ldap_started
+        if user_data is None:
+            break
+        
+        scanned += 1
+        row = current.get((user_data.get('username') or '').lower())
+        if row is None:
+            not_in_db += 1
+            continue
+        seen.add(row.id)
+        
+        values = User.ldap_values(user_data, {field: getattr(row, field) for field in fields})
+        changes = {field: value for field, value in values.items() if getattr(row, field) != value}
+        if not changes:
+            unchanged += 1
+            continue
+        
+        updated += 1
+        for field in changes:
+            changed_fields[field] = changed_fields.get(field, 0) + 1
+        updates.append(dict(values, user_id=row.id, updated_at=datetime.utcnow()))
+        if len(updates) >= batch_size:
+            flush()
+    
+    flush()
+    
+    # Users with an LDAP DN that the directory no longer returned
+    missing = sorted(
+        row.username for row in current.values()
+        if row.id not in seen and row.ldap_dn
+    )
+    
+    elapsed = time.perf_counter() - started
+    prefix = 'Would update' if dry_run else 'Updated'
+    click.echo(f'Scanned {scanned} directory users in {ldap_seconds:.2f}s')
+    click.echo(f'{prefix} {updated} users, {unchanged} unchanged, {not_in_db} not in the database')
+    if changed_fields:
+        click.echo('Changed fields: ' + ', '.join(
+            f'{field}={count}' for field, count in sorted(changed_fields.items())
+        ))
+    if missing:
+        click.echo(f'{len(missing)} users not found in the directory: {", ".join(missing)}')
+    click.echo(f'Database updates took {db_seconds:.2f}s, {elapsed:.2f}s total')
+
+@sessions_cli.command('purge')
+@click.option('--batch-size', default=1000, show_default=True, help='Sessions deleted per statement.')
+def purge_sessions(batch_size):
+    """Delete expired sessions from the sessions table."""
+    from app.services.session_service import purge_expired_sessions
+    
+    started = time.perf_counter()
+    deleted = purge_expired_sessions(batch_size)
+    elapsed = time.perf_counter() - started
+    click.echo(f'Purged {deleted} expired sessions in {elapsed:.2f}s')
+
+@backup_cli.command('create')
+def create_backup():
+    """Back up the database and uploads now."""
+    from app.services.backup_service import create_backup
+    
+    summary = create_backup()
+    if summary is None:
+        click.echo('Another backup is already running')
+        return
+    
+    uploads = summary['uploads']
+    click.echo(f"Created backup {summary['name']} in {summary['duration']:.2f}s")
+    click.echo(f"Database: {summary['database']['bytes']} bytes ({summary['database']['file']})")
+    click.echo(
+        f"Uploads: {uploads['file_count']} files, {uploads['bytes']} bytes; "
+        f"{uploads['new_objects']} new ({uploads['new_bytes']} bytes, {uploads['compressed_bytes']} compressed)"
+    )
+    click.echo(f"Wrote {summary['bytes_written']} bytes; pruned {summary['pruned']['snapshots']} old backups")
+
+@backup_cli.command('list')
+def list_backups():
+    """List backups with their duration and size."""
+    from app.services.backup_service import list_snapshots
+    
+    for snapshot in list_snapshots():
+        click.echo(
+            f"{snapshot['name']}  {snapshot['duration']:8.2f}s  "
+            f"{snapshot['bytes_written']:>12} bytes written  "
+            f"{snapshot['uploads']['file_count']} uploads"
+        )
+
+@backup_cli.command('prune')
+@click.option('--retention-days', type=int, default=None,
+              help='Keep backups this many days (default: BACKUP_RETENTION_DAYS).')
+def prune_backups(retention_days):
+    """Delete expired backups and upload objects no backup references."""
+    from app.services.backup_service import prune_backups
+    
+    removed = prune_backups(retention_days=retention_days)
+    if removed is None:
+        click.echo('A backup is running; try again later')
+        return
+    
+    click.echo(f"Removed {removed['snapshots']} backups and {removed['objects']} upload objects")
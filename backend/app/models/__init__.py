@@ -5,5 +5,6 @@ Database models for HomelabWiki application.
 from app.models.user import User
 from app.models.page import Page
 from app.models.file import File
+from app.models.session import SessionRecord
 
-__all__ = ['User', 'Page', 'File']
\ No newline at end of file
+__all__ = ['User', 'Page', 'File', 'SessionRecord']
\ No newline at end of file
@@ -5,6 +5,8 @@ Handles file uploads and attachments.
 
 import os
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
 from app import db
 
@@ -12,6 +14,15 @@ class File(db.Model):
     """File model for uploaded files and attachments."""
     
     __tablename__ = 'files'
+    __table_args__ = (
+        # Supports keyset pagination ordered by most recently uploaded
+        db.Index('ix_files_created_at_id', 'created_at', 'id'),
+    )
+    
+    # Type filters that cover several categories
+    FILE_TYPE_GROUPS = {
+        'document': ['document', 'spreadsheet', 'pdf', 'text']
+    }
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
@@ -19,7 +30,8 @@ class File(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)  # Size in bytes
     mime_type = db.Column(db.String(100), nullable=True)
-    file_hash = db.Column(db.String(64), nullable=True)  # SHA-256 hash
+    file_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 hash, names the stored blob
+    file_type = db.Column(db.String(20), nullable=True, index=True)  # General category, see categorize()
     
     # File metadata
     description = db.Column(db.Text, nullable=True)
@@ -45,10 +57,10 @@ class File(db.Model):
         """Get file extension."""
         return os.path.splitext(self.original_filename)[1].lower()
     
-    @property
-    def file_type(self):
-        """Get general file type category."""
-        ext = self.file_extension
+    @staticmethod
+    def categorize(filename):
+        """Get general file type category from a filename."""
+        ext = os.path.splitext(filename or '')[1].lower()
         
         if ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg']:
             return 'image'
@@ -77,11 +89,16 @@ class File(db.Model):
     @property
     def is_document(self):
         """Check if file is a document."""
-        return self.file_type in ['document', 'spreadsheet', 'pdf', 'text']
+        return self.file_type in File.FILE_TYPE_GROUPS['document']
     
     def get_file_size_formatted(self):
         """Get formatted file size."""
-        size = self.file_size
+        return File.format_file_size(self.file_size)
+    
+    @staticmethod
+    def format_file_size(size):
+        """Format a size in bytes for display."""
+        size = size or 0
         
         if size < 1024:
             return f"{size} B"
@@ -110,16 +127,43 @@ class File(db.Model):
         """Check if file exists on disk."""
         return os.path.exists(self.get_absolute_path())
     
+    def count_references(self, connection):
+        """Count other file records that share this file's stored blob."""
+        query = db.select(db.func.count(File.id)).where(
+            File.file_path == self.file_path, File.id != self.id
+        )
+        if self.file_hash:
+            query = query.where(File.file_hash == self.file_hash)
+        return connection.execute(query).scalar()
+    
     def delete_file(self):
-        """Delete file from disk."""
+        """
+        Delete file from disk unless another file record still references it.
+        
+        Runs once the record's deletion has been committed (see
+        file_service.register_session_hooks), so rows deleted in the same
+        transaction are not counted and a rollback never loses a shared blob.
+        """
+        with db.engine.connect() as connection:
+            if self.count_references(connection):
+                return True
+        
         if self.file_exists():
             try:
                 os.remove(self.get_absolute_path())
+                
+                from app.services.file_service import remove_thumbnails
+                remove_thumbnails(self)
                 return True
             except OSError:
                 return False
         return False
     
+    @staticmethod
+    def serialization_options():
+        """Eager-loading options for serializing many files without per-row queries."""
+        return (joinedload(File.uploader), joinedload(File.page))
+    
     def to_dict(self):
         """Convert file to dictionary for JSON serialization."""
         return {
@@ -155,44 +199,30 @@ class File(db.Model):
     
     @staticmethod
     def create_from_upload(file_obj, uploader_id, page_id=None, description=None):
-        """Create file record from uploaded file."""
-        import hashlib
-        import uuid
+        """Create file record from uploaded file, hashing it while it is stored."""
         from flask import current_app
+        from app.services.file_service import store_upload
         
         # Generate secure filename
         original_filename = secure_filename(file_obj.filename)
-        file_extension = os.path.splitext(original_filename)[1]
-        unique_filename = f"{uuid.uuid4().hex}{file_extension}"
         
         # Create upload directory if it doesn't exist
         upload_dir = current_app.config['UPLOAD_FOLDER']
         if not os.path.exists(upload_dir):
             os.makedirs(upload_dir, exist_ok=True)
         
-        # Save file
-        file_path = os.path.join(upload_dir, unique_filename)
-        file_obj.save(file_path)
-        
-        # Calculate file hash
-        file_hash = None
-        try:
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
-        except Exception:
-            pass
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
+        # Save file under its content hash, reusing an identical stored blob
+        file_path, file_size, file_hash = store_upload(file_obj, upload_dir)
         
         # Create file record
         file_record = File(
-            filename=unique_filename,
+            filename=file_hash,
             original_filename=original_filename,
             file_path=file_path,
             file_size=file_size,
             mime_type=file_obj.content_type,
             file_hash=file_hash,
+            file_type=File.categorize(original_filename),
             uploader_id=uploader_id,
             page_id=page_id,
             description=description
@@ -212,32 +242,28 @@ class File(db.Model):
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in allowed_extensions
     
+    @staticmethod
+    def type_filter(file_type):
+        """Build a filter clause for a file type category or category group."""
+        return File.file_type.in_(File.FILE_TYPE_GROUPS.get(file_type, [file_type]))
+    
+    @staticmethod
+    def search_filter(query_string):
+        """Build a filter clause matching filename or description."""
+        search_term = f"%{query_string}%"
+        return db.or_(
+            File.original_filename.ilike(search_term),
+            File.description.ilike(search_term)
+        )
+    
     @staticmethod
     def get_files_by_type(file_type, limit=None):
         """Get files by type."""
-        query = File.query
-        
-        if file_type == 'image':
-            query = query.filter(File.mime_type.like('image/%'))
-        elif file_type == 'document':
-            query = query.filter(File.mime_type.in_([
-                'application/pdf',
-                'application/msword',
-                'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                'application/vnd.ms-excel',
-                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                'text/plain',
-                'text/markdown'
-            ]))
-        elif file_type == 'archive':
-            query = query.filter(File.mime_type.in_([
-                'application/zip',
-                'application/x-tar',
-                'application/gzip',
-                'application/x-7z-compressed'
-            ]))
+        query = File.query.filter(File.type_filter(file_type))
         
-        query = query.filter_by(is_archived=False).order_by(File.created_at.desc())
+        query = query.filter_by(is_archived=False).options(
+            *File.serialization_options()
+        ).order_by(File.created_at.desc())
         
         if limit:
             query = query.limit(limit)
@@ -247,13 +273,17 @@ class File(db.Model):
     @staticmethod
     def search_files(query_string, limit=20):
         """Search files by filename or description."""
-        search_term = f"%{query_string}%"
-        
         results = File.query.filter(
-            db.or_(
-                File.original_filename.ilike(search_term),
-                File.description.ilike(search_term)
-            )
-        ).filter_by(is_archived=False).order_by(File.created_at.desc()).limit(limit).all()
+            File.search_filter(query_string)
+        ).filter_by(is_archived=False).options(
+            *File.serialization_options()
+        ).order_by(File.created_at.desc()).limit(limit).all()
         
         return results
+
+# Event listeners
+@event.listens_for(File, 'before_insert')
+def set_file_type_on_insert(mapper, connection, target):
+    """Categorize the file before inserting it."""
+    if not target.file_type:
+        target.file_type = File.categorize(target.original_filename)
@@ -4,11 +4,34 @@ Stores wiki pages with Markdown content and metadata.
 """
 
 from datetime import datetime
-from sqlalchemy import event
-from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy import event, inspect, DDL
+from sqlalchemy.orm import defer, joinedload, selectinload
 import re
 from app import db
 
+# Text search configuration used for the PostgreSQL search vector
+SEARCH_TS_CONFIG = 'english'
+
+# PostgreSQL full-text search column (title weighted above content) and its GIN index
+SEARCH_VECTOR_DDL = [
+    f"""ALTER TABLE pages ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(content, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_pages_search_vector ON pages USING GIN (search_vector)"
+]
+
+# PostgreSQL trigram indexes so substring matches on titles and tag names avoid table scans
+PAGE_TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_pages_title_trgm ON pages USING GIN (title gin_trgm_ops)"
+]
+TAG_TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_tags_name_trgm ON tags USING GIN (name gin_trgm_ops)"
+]
+
 # Association table for page tags
 page_tags = db.Table('page_tags',
     db.Column('page_id', db.Integer, db.ForeignKey('pages.id'), primary_key=True),
@@ -19,6 +42,10 @@ class Page(db.Model):
     """Page model for wiki pages."""
     
     __tablename__ = 'pages'
+    __table_args__ = (
+        # Supports keyset pagination ordered by most recently updated
+        db.Index('ix_pages_updated_at_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False, index=True)
@@ -26,6 +53,11 @@ class Page(db.Model):
     content = db.Column(db.Text, nullable=False)
     summary = db.Column(db.String(500), nullable=True)
     
+    # Derived from content at write time (see update_derived_fields)
+    word_count = db.Column(db.Integer, default=0)
+    reading_time = db.Column(db.Integer, default=1)
+    headings = db.Column(db.JSON, nullable=True)
+    
     # Versioning
     version = db.Column(db.Integer, default=1)
     
@@ -45,15 +77,14 @@ class Page(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     # Relationships
-    tags = db.relationship('Tag', secondary=page_tags, lazy='subquery',
+    tags = db.relationship('Tag', secondary=page_tags, lazy='selectin',
                           backref=db.backref('pages', lazy=True))
     files = db.relationship('File', backref='page', lazy='dynamic', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Page {self.title}>'
     
-    @hybrid_property
-    def word_count(self):
+    def calculate_word_count(self):
         """Calculate word count of the content."""
         if not self.content:
             return 0
@@ -62,10 +93,18 @@ class Page(db.Model):
         words = text.split()
         return len(words)
     
-    @hybrid_property
-    def reading_time(self):
+    def calculate_reading_time(self, word_count=None):
         """Estimate reading time in minutes (assuming 200 words per minute)."""
-        return max(1, self.word_count // 200)
+        if word_count is None:
+            word_count = self.calculate_word_count()
+        return max(1, word_count // 200)
+    
+    def update_derived_fields(self):
+        """Recompute the stored fields derived from content."""
+        self.word_count = self.calculate_word_count()
+        self.reading_time = self.calculate_reading_time(self.word_count)
+        self.summary = self.extract_summary()
+        self.headings = self.get_headings()
     
     def generate_slug(self):
         """Generate URL-friendly slug from title."""
@@ -151,20 +190,33 @@ class Page(db.Model):
         if tag and tag in self.tags:
             self.tags.remove(tag)
     
+    @staticmethod
+    def serialization_options(include_content=False):
+        """
+        Loader options for serializing many pages without per-row queries.
+        
+        Args:
+            include_content (bool): Load the content column; listings leave it deferred
+        """
+        options = [joinedload(Page.author), selectinload(Page.tags)]
+        if not include_content:
+            options.append(defer(Page.content))
+        return options
+    
     def to_dict(self, include_content=True):
         """Convert page to dictionary for JSON serialization."""
         data = {
             'id': self.id,
             'title': self.title,
             'slug': self.slug,
-            'summary': self.summary or self.extract_summary(),
+            'summary': self.summary or '',
             'version': self.version,
             'is_published': self.is_published,
             'is_archived': self.is_archived,
-            'word_count': self.word_count,
-            'reading_time': self.reading_time,
+            'word_count': self.word_count or 0,
+            'reading_time': self.reading_time or 1,
             'tags': self.get_tags_list(),
-            'headings': self.get_headings(),
+            'headings': self.headings or [],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'author': {
@@ -243,30 +295,101 @@ class Tag(db.Model):
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
         return f'<Tag {self.name}>'
     
-    def to_dict(self):
+    @staticmethod
+    def get_page_counts(tag_ids=None):
+        """Get page counts per tag id with a single grouped COUNT."""
+        query = db.session.query(
+            page_tags.c.tag_id,
+            db.func.count(page_tags.c.page_id)
+        ).group_by(page_tags.c.tag_id)
+        
+        if tag_ids is not None:
+            query = query.filter(page_tags.c.tag_id.in_(tag_ids))
+        
+        return dict(query.all())
+    
+    def to_dict(self, page_count=None):
         """Convert tag to dictionary for JSON serialization."""
+        if page_count is None:
+            page_count = Tag.get_page_counts([self.id]).get(self.id, 0)
+        
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'color': self.color,
-            'page_count': len(self.pages),
+            'page_count': page_count,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class PageTombstone(db.Model):
+    """Record of a page slug that stopped existing, used by incremental exports."""
+    
+    __tablename__ = 'page_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    page_id = db.Column(db.Integer, nullable=False)  # No foreign key; the page is gone
+    slug = db.Column(db.String(200), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    @staticmethod
+    def record(connection, page_id, slug):
+        """Insert a tombstone on the flushing connection."""
+        connection.execute(PageTombstone.__table__.insert().values(
+            page_id=page_id, slug=slug, deleted_at=datetime.utcnow()
+        ))
+    
+    @staticmethod
+    def purge(before):
+        """Delete tombstones recorded before a cutoff and return how many were removed."""
+        count = PageTombstone.query.filter(PageTombstone.deleted_at < before).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        return count
+    
+    def __repr__(self):
+        return f'<PageTombstone {self.slug}>'
+
 # Event listeners
 @event.listens_for(Page, 'before_insert')
 def generate_slug_on_insert(mapper, connection, target):
-    """Generate slug before inserting a new page."""
+    """Generate slug and derived fields before inserting a new page."""
     if not target.slug:
         target.slug = target.generate_slug()
+    target.update_derived_fields()
+
+@event.listens_for(Page, 'before_update')
+def update_derived_fields_on_update(mapper, connection, target):
+    """Recompute derived fields when content changes."""
+    if inspect(target).attrs.content.history.has_changes() or target.word_count is None:
+        target.update_derived_fields()
 
 @event.listens_for(Page, 'before_update')
-def update_summary_on_update(mapper, connection, target):
-    """Update summary when content changes."""
-    if not target.summary:
-        target.summary = target.extract_summary()
+def record_renamed_slug(mapper, connection, target):
+    """Tombstone the old slug when a page is renamed."""
+    if not inspect(target).attrs.slug.history.has_changes():
+        return
+    
+    # The old value is usually expired, so read it from the row about to be updated
+    slug = connection.execute(
+        db.select(Page.__table__.c.slug).where(Page.__table__.c.id == target.id)
+    ).scalar()
+    if slug and slug != target.slug:
+        PageTombstone.record(connection, target.id, slug)
+
+@event.listens_for(Page, 'after_delete')
+def record_deleted_page(mapper, connection, target):
+    """Tombstone the slug of a deleted page."""
+    PageTombstone.record(connection, target.id, target.slug)
+
+# Maintain the search vector and trigram indexes on PostgreSQL; other databases use the search index
+for statement in SEARCH_VECTOR_DDL + PAGE_TRIGRAM_DDL:
+    event.listen(Page.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in TAG_TRIGRAM_DDL:
+    event.listen(Tag.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
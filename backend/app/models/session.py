@@ -0,0 +1,18 @@
+"""
+Session model for HomelabWiki application.
+Server-side session storage used when SESSION_TYPE is 'sqlalchemy'.
+"""
+
+from app import db
+
+class SessionRecord(db.Model):
+    """Serialized server-side session keyed by its session ID."""
+    
+    __tablename__ = 'sessions'
+    
+    session_id = db.Column(db.String(255), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    expiry = db.Column(db.DateTime, nullable=False, index=True)  # Indexed for batch purges
+    
+    def __repr__(self):
+        return f'<SessionRecord {self.session_id}>'
@@ -3,10 +3,22 @@ User model for HomelabWiki application.
 Integrates with LDAP/Active Directory for authentication.
 """
 
+import copy
+from dataclasses import dataclass
 from datetime import datetime
 from flask_login import UserMixin
 from app import db
 
+# Bits used for precomputed permission masks, see User.permission_mask()
+PERMISSION_BITS = {
+    'read': 1,
+    'create': 2,
+    'edit': 4,
+    'delete': 8,
+    'upload': 16,
+    'admin': 32
+}
+
 class User(UserMixin, db.Model):
     """User model for LDAP-authenticated users."""
     
@@ -77,6 +89,25 @@ class User(UserMixin, db.Model):
         }
         return permission_mapping.get(permission, False)
     
+    def permission_mask(self):
+        """Get all permissions from has_permission() as a PERMISSION_BITS mask."""
+        mask = 0
+        for permission, bit in PERMISSION_BITS.items():
+            if self.has_permission(permission):
+                mask |= bit
+        return mask
+    
+    def snapshot(self):
+        """Get an immutable copy of this user for caching between requests."""
+        return UserSnapshot(
+            id=self.id,
+            username=self.username,
+            is_admin=bool(self.is_admin),
+            active=bool(self.is_active),
+            permissions=self.permission_mask(),
+            data=self.to_dict()
+        )
+    
     def can_edit_page(self, page):
         """Check if user can edit a specific page."""
         if self.is_admin:
@@ -124,55 +155,117 @@ class User(UserMixin, db.Model):
             'last_login': self.last_login.isoformat() if self.last_login else None
         }
     
+    # Columns populated from LDAP attributes, mapped to their LDAP user data keys
+    LDAP_FIELDS = {
+        'email': 'email',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'ldap_dn': 'dn',
+        'domain': 'domain'
+    }
+    
     @staticmethod
-    def create_from_ldap(ldap_user_data):
-        """Create user from LDAP data."""
-        user = User(
-            username=ldap_user_data.get('username'),
-            email=ldap_user_data.get('email'),
-            first_name=ldap_user_data.get('first_name'),
-            last_name=ldap_user_data.get('last_name'),
-            ldap_dn=ldap_user_data.get('dn'),
-            domain=ldap_user_data.get('domain')
-        )
-        
-        # Set permissions based on LDAP groups
-        groups = ldap_user_data.get('groups', [])
-        user.is_admin = any('WikiAdmins' in group for group in groups)
-        user.can_edit = any('WikiUsers' in group or 'WikiAdmins' in group for group in groups)
-        user.can_create = any('WikiUsers' in group or 'WikiAdmins' in group for group in groups)
-        user.can_delete = any('WikiAdmins' in group for group in groups)
-        user.can_upload = any('WikiUsers' in group or 'WikiAdmins' in group for group in groups)
+    def permissions_from_groups(groups):
+        """Get permission flags granted by LDAP group memberships."""
+        permissions = {
+            'is_admin': any('WikiAdmins' in group for group in groups),
+            'can_edit': any('WikiUsers' in group or 'WikiAdmins' in group for group in groups),
+            'can_create': any('WikiUsers' in group or 'WikiAdmins' in group for group in groups),
+            'can_delete': any('WikiAdmins' in group for group in groups),
+            'can_upload': any('WikiUsers' in group or 'WikiAdmins' in group for group in groups)
+        }
         
         # Read-only users
         if any('WikiReadOnly' in group for group in groups):
-            user.can_edit = False
-            user.can_create = False
-            user.can_delete = False
-            user.can_upload = False
+            permissions.update(can_edit=False, can_create=False, can_delete=False, can_upload=False)
         
-        return user
+        return permissions
+    
+    @staticmethod
+    def ldap_values(ldap_user_data, current=None):
+        """
+        Get column values for a user from LDAP data.
+        
+        Args:
+            ldap_user_data (dict): User data from the LDAP authenticator
+            current (dict): Current column values, kept where LDAP has no value
+        
+        Returns:
+            dict: Column name to value, including permission flags
+        """
+        current = current or {}
+        values = {
+            field: ldap_user_data.get(key) or current.get(field)
+            for field, key in User.LDAP_FIELDS.items()
+        }
+        values.update(User.permissions_from_groups(ldap_user_data.get('groups', [])))
+        return values
+    
+    @staticmethod
+    def create_from_ldap(ldap_user_data):
+        """Create user from LDAP data."""
+        return User(username=ldap_user_data.get('username'), **User.ldap_values(ldap_user_data))
     
     def update_from_ldap(self, ldap_user_data):
         """Update user from LDAP data."""
-        self.email = ldap_user_data.get('email') or self.email
-        self.first_name = ldap_user_data.get('first_name') or self.first_name
-        self.last_name = ldap_user_data.get('last_name') or self.last_name
-        self.ldap_dn = ldap_user_data.get('dn') or self.ldap_dn
-        self.domain = ldap_user_data.get('domain') or self.domain
+        current = {field: getattr(self, field) for field in User.LDAP_FIELDS}
+        for field, value in User.ldap_values(ldap_user_data, current).items():
+            setattr(self, field, value)
         self.updated_at = datetime.utcnow()
-        
-        # Update permissions based on LDAP groups
-        groups = ldap_user_data.get('groups', [])
-        self.is_admin = any('WikiAdmins' in group for group in groups)
-        self.can_edit = any('WikiUsers' in group or 'WikiAdmins' in group for group in groups)
-        self.can_create = any('WikiUsers' in group or 'WikiAdmins' in group for group in groups)
-        self.can_delete = any('WikiAdmins' in group for group in groups)
-        self.can_upload = any('WikiUsers' in group or 'WikiAdmins' in group for group in groups)
-        
-        # Read-only users
-        if any('WikiReadOnly' in group for group in groups):
-            self.can_edit = False
-            self.can_create = False
-            self.can_delete = False
-            self.can_upload = False
+
+@dataclass(frozen=True, eq=False)
+class UserSnapshot(UserMixin):
+    """
+    Immutable user loaded from the per-process user cache.
+    
+    Provides what request handlers use from current_user without a
+    database round-trip. Permission checks read the precomputed bitmask.
+    """
+    
+    id: int
+    username: str
+    is_admin: bool
+    active: bool
+    permissions: int
+    data: dict
+    
+    @property
+    def is_active(self):
+        return self.active
+    
+    def has_permission(self, permission):
+        """Check if user has specific permission."""
+        return bool(self.permissions & PERMISSION_BITS.get(permission, 0))
+    
+    def can_edit_page(self, page):
+        """Check if user can edit a specific page."""
+        if self.is_admin:
+            return True
+        if not self.has_permission('edit'):
+            return False
+        # Users can edit their own pages
+        return page.author_id == self.id
+    
+    def can_delete_page(self, page):
+        """Check if user can delete a specific page."""
+        if self.is_admin:
+            return True
+        if not self.has_permission('delete'):
+            return False
+        # Users can delete their own pages
+        return page.author_id == self.id
+    
+    def can_delete_file(self, file):
+        """Check if user can delete a specific file."""
+        if self.is_admin:
+            return True
+        # Users can delete their own files
+        return file.uploader_id == self.id
+    
+    def get_display_name(self):
+        """Get display name for UI."""
+        return self.data['display_name']
+    
+    def to_dict(self):
+        """Convert user to dictionary for JSON serialization."""
+        return copy.deepcopy(self.data)
@@ -0,0 +1,373 @@
+"""
+Backup service for HomelabWiki.
+Takes consistent database snapshots plus a deduplicated copy of the upload
+folder, enforces BACKUP_RETENTION_DAYS and schedules automatic backups.
+
+Layout of BACKUP_FOLDER:
+    objects/ab/<sha256>.gz        Compressed upload contents, stored once
+    snapshots/<timestamp>/        One directory per backup with the database
+                                  dump and a manifest.json of upload paths
+"""
+
+import fcntl
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import schedule
+from flask import current_app
+from app import db
+from app.services.file_service import hash_file
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read when streaming into compressed files
+BACKUP_CHUNK_SIZE = 1024 * 1024
+
+# SQLite pages copied per backup step; the database is only locked during a step
+SQLITE_BACKUP_PAGES = 1024
+
+# Scheduled runs are skipped if another server worker already took a backup this recently
+SCHEDULED_SKIP_SECONDS = 3600
+
+SNAPSHOT_NAME_FORMAT = '%Y%m%d-%H%M%S'
+
+_scheduler_started = False
+_scheduler_lock = threading.Lock()
+
+def _snapshot_dir(backup_folder):
+    return os.path.join(backup_folder, 'snapshots')
+
+def _object_path(backup_folder, digest):
+    return os.path.join(backup_folder, 'objects', digest[:2], f'{digest}.gz')
+
+def _compress_stream(source, path, level):
+    """Gzip a readable binary stream into path atomically and return the bytes written."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=level) as target:
+            shutil.copyfileobj(source, target, BACKUP_CHUNK_SIZE)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return os.path.getsize(path)
+
+def list_snapshots(backup_folder=None):
+    """
+    List completed backups, newest first.
+    
+    Returns:
+        list: Manifest dicts of each snapshot
+    """
+    folder = _snapshot_dir(backup_folder or current_app.config['BACKUP_FOLDER'])
+    try:
+        names = sorted(os.listdir(folder), reverse=True)
+    except OSError:
+        return []
+    
+    snapshots = []
+    for name in names:
+        try:
+            with open(os.path.join(folder, name, 'manifest.json')) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # Partial or damaged snapshot
+    return snapshots
+
+def backup_database(target_dir, level):
+    """
+    Write a consistent snapshot of the application database into target_dir.
+    
+    SQLite is copied with the online backup API and compressed; PostgreSQL is
+    streamed from pg_dump in its compressed custom format.
+    
+    Returns:
+        dict: File name, dialect and size in bytes
+    """
+    url = db.engine.url
+    dialect = url.get_backend_name()
+    
+    if dialect == 'sqlite':
+        if not url.database or url.database == ':memory:':
+            raise ValueError('In-memory SQLite databases cannot be backed up')
+        
+        copy_path = os.path.join(target_dir, 'database.sqlite3')
+        source = sqlite3.connect(f'file:{url.database}?mode=ro', uri=True)
+        copy = sqlite3.connect(copy_path)
+        try:
+            source.backup(copy, pages=SQLITE_BACKUP_PAGES)
+        finally:
+            copy.close()
+            source.close()
+        
+        filename = 'database.sqlite3.gz'
+        with open(copy_path, 'rb') as f:
+            size = _compress_stream(f, os.path.join(target_dir, filename), level)
+        os.remove(copy_path)
+    
+    elif dialect == 'postgresql':
+        filename = 'database.dump'
+        command = ['pg_dump', '--format=custom', '--no-owner', '--dbname', url.database]
+        if url.host:
+            command += ['--host', url.host]
+        if url.port:
+            command += ['--port', str(url.port)]
+        if url.username:
+            command += ['--username', url.username]
+        env = dict(os.environ, PGPASSWORD=url.password or '')
+        
+        with open(os.path.join(target_dir, filename), 'wb') as target:
+            result = subprocess.run(command, stdout=target, stderr=subprocess.PIPE, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(f'pg_dump failed: {result.stderr.decode(errors="replace").strip()}')
+        size = os.path.getsize(os.path.join(target_dir, filename))
+    
+    else:
+        raise ValueError(f'Backups are not supported for {dialect} databases')
+    
+    return {'file': filename, 'dialect': dialect, 'bytes': size}
+
+def backup_uploads(upload_dir, backup_folder, previous, level):
+    """
+    Copy new upload contents into the object store.
+    
+    Files whose size and mtime match the previous snapshot reuse its hash, so
+    unchanged uploads are neither re-read nor re-copied.
+    
+    Args:
+        upload_dir (str): UPLOAD_FOLDER
+        backup_folder (str): BACKUP_FOLDER
+        previous (dict): Upload entries from the newest existing snapshot
+        level (int): Gzip compression level
+    
+    Returns:
+        tuple: (upload entries keyed by relative path, copy statistics)
+    """
+    files = {}
+    stats = {'file_count': 0, 'bytes': 0, 'new_objects': 0, 'new_bytes': 0, 'compressed_bytes': 0}
+    
+    for root, dirs, names in os.walk(upload_dir):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, upload_dir)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue  # Removed while walking
+            
+            entry = previous.get(relative)
+            if entry and entry['size'] == info.st_size and entry['mtime_ns'] == info.st_mtime_ns:
+                digest = entry['sha256']
+            else:
+                digest = hash_file(path)
+            
+            object_path = _object_path(backup_folder, digest)
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                with open(path, 'rb') as f:
+                    stats['compressed_bytes'] += _compress_stream(f, object_path, level)
+                stats['new_objects'] += 1
+                stats['new_bytes'] += info.st_size
+            
+            files[relative] = {'sha256': digest, 'size': info.st_size, 'mtime_ns': info.st_mtime_ns}
+            stats['file_count'] += 1
+            stats['bytes'] += info.st_size
+    
+    return files, stats
+
+@contextmanager
+def _backup_lock(backup_folder):
+    """Hold the BACKUP_FOLDER lock, yielding False if another process has it."""
+    os.makedirs(_snapshot_dir(backup_folder), exist_ok=True)
+    with open(os.path.join(backup_folder, '.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+def prune_backups(retention_days=None):
+    """
+    Delete snapshots older than the retention period and unreferenced objects.
+    
+    The newest snapshot is always kept.
+    
+    Returns:
+        dict: Number of snapshots and objects removed, or None if a backup is running
+    """
+    backup_folder = current_app.config['BACKUP_FOLDER']
+    if retention_days is None:
+        retention_days = current_app.config.get('BACKUP_RETENTION_DAYS', 30)
+    
+    with _backup_lock(backup_folder) as locked:
+        if not locked:
+            return None
+        return _prune(backup_folder, retention_days)
+
+def _prune(backup_folder, retention_days):
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime(SNAPSHOT_NAME_FORMAT)
+    
+    folder = _snapshot_dir(backup_folder)
+    try:
+        names = sorted(os.listdir(folder), reverse=True)
+    except OSError:
+        names = []
+    
+    # Partial directories are left by interrupted runs; the lock rules out a running one
+    partial = [name for name in names if name.endswith('.partial')]
+    expired = [name for name in names if not name.endswith('.partial')][1:]
+    expired = [name for name in expired if name < cutoff]
+    
+    for name in partial + expired:
+        shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+    removed_snapshots = len(expired)
+    
+    referenced = set()
+    for snapshot in list_snapshots(backup_folder):
+        referenced.update(entry['sha256'] for entry in snapshot['uploads']['files'].values())
+    
+    removed_objects = 0
+    for root, dirs, names in os.walk(os.path.join(backup_folder, 'objects')):
+        for name in names:
+            if name.split('.')[0] not in referenced:
+                os.remove(os.path.join(root, name))
+                removed_objects += 1
+    
+    return {'snapshots': removed_snapshots, 'objects': removed_objects}
+
+def create_backup(scheduled=False):
+    """
+    Take a backup of the database and uploads, then apply retention.
+    
+    Only one backup runs at a time across all processes sharing
+    BACKUP_FOLDER; a scheduled run is skipped if another worker already took
+    one within the last hour.
+    
+    Args:
+        scheduled (bool): Whether this is an automatic run
+    
+    Returns:
+        dict: The snapshot manifest without per-file entries, or None if skipped
+    """
+    backup_folder = current_app.config['BACKUP_FOLDER']
+    level = current_app.config.get('BACKUP_COMPRESS_LEVEL', 6)
+    
+    with _backup_lock(backup_folder) as locked:
+        if not locked:
+            logger.info('Backup skipped: another backup is running')
+            return None
+        
+        snapshots = list_snapshots(backup_folder)
+        latest = snapshots[0] if snapshots else None
+        if scheduled and latest and time.time() - latest['finished_at'] < SCHEDULED_SKIP_SECONDS:
+            return None
+        
+        started = time.perf_counter()
+        created_at = datetime.utcnow()
+        name = created_at.strftime(SNAPSHOT_NAME_FORMAT)
+        final_dir = os.path.join(_snapshot_dir(backup_folder), name)
+        work_dir = final_dir + '.partial'
+        os.makedirs(work_dir)
+        
+        try:
+            database = backup_database(work_dir, level)
+            previous = latest['uploads']['files'] if latest else {}
+            files, upload_stats = backup_uploads(
+                current_app.config['UPLOAD_FOLDER'], backup_folder, previous, level
+            )
+            
+            manifest = {
+                'name': name,
+                'created_at': created_at.isoformat(),
+                'finished_at': time.time(),
+                'duration': round(time.perf_counter() - started, 3),
+                'scheduled': scheduled,
+                'database': database,
+                'uploads': dict(upload_stats, files=files),
+                'bytes_written': database['bytes'] + upload_stats['compressed_bytes']
+            }
+            with open(os.path.join(work_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+            os.replace(work_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        
+        pruned = _prune(backup_folder, current_app.config.get('BACKUP_RETENTION_DAYS', 30))
+    
+    summary = dict(manifest, uploads=upload_stats, pruned=pruned)
+    logger.info(
+        f"Backup {name} finished in {summary['duration']}s: "
+        f"database {database['bytes']} bytes, {upload_stats['new_objects']} new upload objects "
+        f"({upload_stats['new_bytes']} bytes, {upload_stats['compressed_bytes']} compressed), "
+        f"{summary['bytes_written']} bytes written"
+    )
+    return summary
+
+def run_backup_job(scheduled, result_path):
+    """Job pool entry point; writes the backup summary to result_path."""
+    summary = create_backup(scheduled=scheduled)
+    with open(result_path, 'w') as f:
+        json.dump(summary, f)
+    return summary
+
+def submit_backup(scheduled=False, owner_id=None):
+    """Run a backup in the job pool and return its job record."""
+    from app.services.job_service import job_queue
+    
+    return job_queue.submit(
+        'backup',
+        run_backup_job,
+        scheduled,
+        owner_id=owner_id,
+        filename='backup-report.json',
+        mimetype='application/json'
+    )
+
+def _run_scheduler(app):
+    scheduler = schedule.Scheduler()
+    scheduler.every().day.at(app.config.get('BACKUP_TIME', '02:00')).do(submit_backup, scheduled=True)
+    
+    while True:
+        try:
+            scheduler.run_pending()
+        except Exception as e:
+            logger.error(f'Failed to start scheduled backup: {e}')
+        time.sleep(60)
+
+def start_scheduler(app):
+    """Start the daily backup scheduler thread once per process."""
+    global _scheduler_started
+    with _scheduler_lock:
+        if _scheduler_started:
+            return
+        _scheduler_started = True
+    
+    thread = threading.Thread(target=_run_scheduler, args=(app,), name='backup-scheduler', daemon=True)
+    thread.start()
+
+def init_app(app):
+    """
+    Schedule automatic backups when AUTO_BACKUP_ENABLED is set.
+    
+    The scheduler starts with the first request, so CLI commands and job
+    pool processes, which never serve requests, don't run it.
+    """
+    if not app.config.get('AUTO_BACKUP_ENABLED') or app.testing:
+        return
+    
+    @app.before_request
+    def ensure_backup_scheduler():
+        if not _scheduler_started:
+            start_scheduler(app)
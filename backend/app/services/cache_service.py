@@ -0,0 +1,139 @@
+"""
+Cache service for HomelabWiki.
+Small in-process caches with per-entry expiry and LRU eviction, plus size
+limits for on-disk caches.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel distinguishing a cached None from a missing entry
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe in-process cache with per-entry expiry and LRU eviction."""
+    
+    def __init__(self, ttl=60, maxsize=1024):
+        """
+        Args:
+            ttl (float): Default seconds an entry stays valid
+            maxsize (int): Maximum number of entries before the least recently used is evicted
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def configure(self, ttl=None, maxsize=None):
+        """Update limits from application configuration and drop existing entries."""
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if maxsize is not None:
+                self.maxsize = maxsize
+            self._data.clear()
+    
+    def get(self, key, default=None):
+        """Get a cached value, or default if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+    
+    def set(self, key, value, ttl=None):
+        """Cache a value, evicting the least recently used entry when full."""
+        if self.maxsize <= 0:
+            return
+        
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def get_or_set(self, key, factory, ttl=None):
+        """Get a cached value, computing and caching it with factory() on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+    
+    def invalidate(self, key):
+        """Remove a single entry."""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self):
+        """Get hit/miss counters and current size."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+def prune_directory(cache_dir, max_bytes, lock):
+    """
+    Evict least recently used files until a cache directory fits max_bytes.
+    
+    Entries are ordered by mtime, so readers should touch files on a hit.
+    
+    Args:
+        cache_dir (str): Directory to prune
+        max_bytes (int): Size cap in bytes; 0 disables pruning
+        lock (threading.Lock): Lock that skips the prune if one is already running
+    
+    Returns:
+        int: Number of files removed
+    """
+    if not max_bytes or not lock.acquire(blocking=False):
+        return 0
+    
+    try:
+        entries = []
+        total = 0
+        for root, _, names in os.walk(cache_dir):
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+                total += stat.st_size
+        
+        if total <= max_bytes:
+            return 0
+        
+        # Trim to 90% of the cap so pruning doesn't run on every new entry
+        removed = 0
+        target = max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+    finally:
+        lock.release()
@@ -1 +1,373 @@
-# File service
+"""
+File service for HomelabWiki.
+Storage statistics, streaming upload ingest and other file operations shared by the API.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from flask import Request, current_app, g, has_app_context
+from sqlalchemy import event
+from werkzeug.exceptions import RequestEntityTooLarge
+from app import db
+from app.models.file import File
+from app.services.cache_service import TTLCache, prune_directory
+
+# Cached storage statistics, dropped whenever a file row changes
+file_stats_cache = TTLCache(ttl=60, maxsize=1)
+
+# Bytes copied per read when an upload has to be spooled from another stream
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Session.info key used to carry deleted files from flush to commit
+DELETED_FILES_KEY = 'deleted_files_pending'
+
+class UploadSpool:
+    """
+    Temporary upload file that hashes and counts bytes as they are written.
+    
+    The file is created inside the upload folder so that committing it is a
+    rename on the same filesystem rather than a second copy.
+    """
+    
+    def __init__(self, directory, max_size=None):
+        """
+        Args:
+            directory (str): Directory for the temporary file, normally UPLOAD_FOLDER
+            max_size (int): Largest accepted upload in bytes, or None for no limit
+        """
+        os.makedirs(directory, exist_ok=True)
+        fd, self.name = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.max_size = max_size
+        self.size = 0
+        self.committed = False
+    
+    def write(self, data):
+        """Write a chunk, updating the hash and enforcing the size limit."""
+        self.size += len(data)
+        if self.max_size and self.size > self.max_size:
+            raise RequestEntityTooLarge()
+        self._hash.update(data)
+        return self._file.write(data)
+    
+    def __getattr__(self, name):
+        # read, seek, tell, flush and friends go straight to the file
+        return getattr(self._file, name)
+    
+    def __iter__(self):
+        return iter(self._file)
+    
+    @property
+    def hexdigest(self):
+        """SHA-256 of everything written so far."""
+        return self._hash.hexdigest()
+    
+    def commit(self, final_path):
+        """Flush and fsync the data, then atomically move it to final_path."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.name, final_path)
+        self.committed = True
+        
+        # Persist the rename itself
+        try:
+            dir_fd = os.open(os.path.dirname(final_path) or '.', os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(dir_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(dir_fd)
+    
+    def discard(self):
+        """Close and remove the temporary file if it was never committed."""
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed:
+            try:
+                os.remove(self.name)
+            except OSError:
+                pass
+
+class UploadRequest(Request):
+    """Request that parses multipart file parts straight into upload spools."""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not has_app_context():
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        
+        spool = UploadSpool(
+            current_app.config['UPLOAD_FOLDER'],
+            max_size=current_app.config.get('MAX_CONTENT_LENGTH')
+        )
+        g.setdefault('upload_spools', []).append(spool)
+        return spool
+
+def init_app(app):
+    """Configure file service caches and streaming uploads from application settings."""
+    file_stats_cache.configure(ttl=app.config.get('FILE_STATS_CACHE_TTL', 60))
+    
+    app.request_class = UploadRequest
+    
+    register_session_hooks()
+    
+    @app.teardown_request
+    def discard_upload_spools(exc):
+        # Remove temp files for uploads that were rejected or never stored
+        for spool in g.pop('upload_spools', []):
+            spool.discard()
+
+def blob_path(upload_dir, file_hash):
+    """Get the content-addressed path for a blob, sharded as ab/cd/<sha256>."""
+    return os.path.join(upload_dir, file_hash[:2], file_hash[2:4], file_hash)
+
+def hash_file(path):
+    """Compute the SHA-256 of a file on disk in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_upload(file_obj, upload_dir):
+    """
+    Store an uploaded file in the content-addressed store in a single streaming pass.
+    
+    Uploads parsed by UploadRequest are already on disk and hashed, so they are
+    only fsynced and renamed into place. Any other stream is copied in chunks.
+    If a blob with the same hash already exists the new copy is dropped.
+    
+    Args:
+        file_obj: Uploaded FileStorage
+        upload_dir (str): Root of the upload folder
+    
+    Returns:
+        tuple: (blob path, size in bytes, SHA-256 hex digest)
+    
+    Raises:
+        RequestEntityTooLarge: If the upload exceeds MAX_CONTENT_LENGTH
+    """
+    spool = file_obj.stream
+    if not isinstance(spool, UploadSpool):
+        spool = UploadSpool(upload_dir, max_size=current_app.config.get('MAX_CONTENT_LENGTH'))
+        try:
+            while True:
+                chunk = file_obj.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.write(chunk)
+        except Exception:
+            spool.discard()
+            raise
+    
+    file_path = blob_path(upload_dir, spool.hexdigest)
+    try:
+        if not os.path.exists(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            spool.commit(file_path)
+    finally:
+        spool.discard()
+    
+    return file_path, spool.size, spool.hexdigest
+
+# Serializes thumbnail cache pruning within a process
+_thumbnail_prune_lock = threading.Lock()
+
+def thumbnail_bucket(size):
+    """Round a requested thumbnail size up to the nearest configured bucket."""
+    sizes = sorted(current_app.config.get('THUMBNAIL_SIZES', (200,)))
+    for bucket in sizes:
+        if size <= bucket:
+            return bucket
+    return sizes[-1]
+
+def thumbnail_key(file):
+    """Get the cache key identifying a file's image content."""
+    return file.file_hash or f'file-{file.id}'
+
+def thumbnail_path(file, size):
+    """Get the cache path for a file's thumbnail at a bucketed size."""
+    key = thumbnail_key(file)
+    return os.path.join(current_app.config['THUMBNAIL_CACHE_DIR'], key[:2], f'{key}-{size}.jpg')
+
+def get_thumbnail(file, size):
+    """
+    Get the path of a cached JPEG thumbnail, generating it on first use.
+    
+    Args:
+        file (File): Image file record
+        size (int): Bucketed thumbnail size, see thumbnail_bucket()
+    
+    Returns:
+        str: Path to the cached thumbnail
+    """
+    path = thumbnail_path(file, size)
+    
+    try:
+        # Touch the entry so pruning evicts least recently used thumbnails first
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+    
+    # Decode and resample in the job pool so PIL doesn't block other requests
+    from app.services.job_service import job_queue
+    job_queue.run(render_thumbnail, file.get_absolute_path(), path, size)
+    return path
+
+def render_thumbnail(source_path, path, size):
+    """Render a JPEG thumbnail of source_path into the cache at path."""
+    from PIL import Image
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(source_path) as img:
+        # Let the JPEG decoder downscale while decoding instead of loading full resolution
+        img.draft('RGB', (size, size))
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        
+        # Convert to RGB if necessary
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                img.save(f, 'JPEG', quality=85)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+    
+    prune_thumbnail_cache()
+
+def prune_thumbnail_cache():
+    """Evict least recently used thumbnails until the cache fits THUMBNAIL_CACHE_MAX_BYTES."""
+    return prune_directory(
+        current_app.config['THUMBNAIL_CACHE_DIR'],
+        current_app.config.get('THUMBNAIL_CACHE_MAX_BYTES', 0),
+        _thumbnail_prune_lock
+    )
+
+def remove_thumbnails(file):
+    """Remove every cached thumbnail size for a file."""
+    for size in current_app.config.get('THUMBNAIL_SIZES', ()):
+        try:
+            os.remove(thumbnail_path(file, size))
+        except OSError:
+            pass
+
+def get_file_stats():
+    """
+    Get storage statistics computed with grouped aggregate queries.
+    
+    Returns:
+        dict: Totals plus counts and byte sums per file type, uploader and page
+    """
+    return file_stats_cache.get_or_set('file_stats', _compute_file_stats)
+
+def _compute_file_stats():
+    """Aggregate file counts and sizes without loading any File rows."""
+    type_rows = db.session.query(
+        File.file_type,
+        File.is_archived,
+        db.func.count(File.id),
+        db.func.coalesce(db.func.sum(File.file_size), 0)
+    ).group_by(File.file_type, File.is_archived).all()
+    
+    uploader_rows = db.session.query(
+        File.uploader_id,
+        db.func.count(File.id),
+        db.func.coalesce(db.func.sum(File.file_size), 0)
+    ).group_by(File.uploader_id).all()
+    
+    page_rows = db.session.query(
+        File.page_id,
+        db.func.count(File.id),
+        db.func.coalesce(db.func.sum(File.file_size), 0)
+    ).filter(File.page_id.isnot(None)).group_by(File.page_id).all()
+    
+    total_files = 0
+    total_size = 0
+    type_stats = {}
+    
+    for file_type, is_archived, file_count, size in type_rows:
+        total_files += file_count
+        total_size += size
+        
+        # Type breakdown covers active files only
+        if is_archived:
+            continue
+        stats = type_stats.setdefault(file_type or 'other', {'file_count': 0, 'total_size': 0})
+        stats['file_count'] += file_count
+        stats['total_size'] += size
+    
+    def count_types(file_types):
+        return sum(type_stats.get(file_type, {}).get('file_count', 0) for file_type in file_types)
+    
+    return {
+        'total_files': total_files,
+        'file_types': {
+            'images': count_types(['image']),
+            'documents': count_types(File.FILE_TYPE_GROUPS['document']),
+            'archives': count_types(['archive'])
+        },
+        'type_stats': type_stats,
+        'total_size': total_size,
+        'total_size_formatted': File.format_file_size(total_size),
+        'user_stats': [
+            {
+                'uploader_id': uploader_id,
+                'file_count': file_count,
+                'total_size': size
+            }
+            for uploader_id, file_count, size in uploader_rows
+        ],
+        'page_stats': [
+            {
+                'page_id': page_id,
+                'file_count': file_count,
+                'total_size': size
+            }
+            for page_id, file_count, size in page_rows
+        ]
+    }
+
+@event.listens_for(File, 'after_insert')
+@event.listens_for(File, 'after_update')
+@event.listens_for(File, 'after_delete')
+def invalidate_file_stats(mapper, connection, target):
+    """Drop cached statistics when files are added, changed or removed."""
+    file_stats_cache.clear()
+
+def _collect_deleted_files(session, flush_context):
+    """Record files deleted by a flush so their blobs can be released on commit."""
+    for obj in session.deleted:
+        if isinstance(obj, File):
+            session.info.setdefault(DELETED_FILES_KEY, {})[obj.id] = obj
+
+def _remove_deleted_blobs(session):
+    """Delete the blobs of committed file deletions that nothing references any more."""
+    for file in session.info.pop(DELETED_FILES_KEY, {}).values():
+        try:
+            file.delete_file()
+        except Exception as e:
+            current_app.logger.error(f'Failed to remove stored file {file.file_path}: {e}')
+
+def _discard_deleted_files(session):
+    """Keep the blobs of file deletions that were rolled back."""
+    session.info.pop(DELETED_FILES_KEY, None)
+
+def register_session_hooks():
+    """Remove stored blobs only after the deletion of their last file record commits."""
+    if event.contains(db.session, 'after_flush', _collect_deleted_files):
+        return
+    
+    event.listen(db.session, 'after_flush', _collect_deleted_files)
+    event.listen(db.session, 'after_commit', _remove_deleted_blobs)
+    event.listen(db.session, 'after_rollback', _discard_deleted_files)
@@ -0,0 +1,278 @@
+"""
+Job service for HomelabWiki.
+Runs CPU-bound work (thumbnails, PDF and ZIP exports) in a worker pool so it
+does not stall the gevent hub that serves every other request in a worker.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Application created once in each pool process by _init_worker()
+_worker_app = None
+
+def _init_worker(config_name):
+    """Create an application in a fresh pool process."""
+    global _worker_app
+    from app import create_app
+    
+    _worker_app = create_app(config_name)
+    
+    # Jobs already run off the request path here, so never nest another pool
+    job_queue.executor_type = 'inline'
+
+def _run_in_worker(func, args):
+    """Run a job function inside the pool process application context."""
+    with _worker_app.app_context():
+        return func(*args)
+
+class InlineExecutor:
+    """Executor that runs work immediately in the calling thread."""
+    
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def shutdown(self, wait=True):
+        pass
+
+class JobQueue:
+    """
+    Worker pool plus on-disk job records.
+    
+    Job status and results are stored as files in JOB_DIR, so any gunicorn
+    worker can answer a status request for a job submitted by another one.
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.config_name = None
+        self.executor_type = 'inline'
+        self.workers = 2
+        self.job_dir = None
+        self.result_ttl = 3600
+        self.run_timeout = None
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app, config_name):
+        """
+        Configure the pool from application settings.
+        
+        Args:
+            app: Flask application
+            config_name (str): Configuration name used to create the app in pool processes
+        """
+        self.app = app
+        self.config_name = config_name
+        self.executor_type = app.config.get('JOB_EXECUTOR', 'process')
+        self.workers = app.config.get('JOB_WORKERS', 2)
+        self.job_dir = app.config['JOB_DIR']
+        self.result_ttl = app.config.get('JOB_RESULT_TTL', 3600)
+        self.run_timeout = app.config.get('JOB_RUN_TIMEOUT', 30)
+        os.makedirs(self.job_dir, exist_ok=True)
+    
+    @property
+    def executor(self):
+        """Get the executor, creating it on first use so each server worker gets its own pool."""
+        with self._lock:
+            if self._executor is None:
+                if self.executor_type == 'process':
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker,
+                        initargs=(self.config_name,)
+                    )
+                elif self.executor_type == 'thread':
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='job'
+                    )
+                else:
+                    self._executor = InlineExecutor()
+            return self._executor
+    
+    def shutdown(self):
+        """Stop the pool, waiting for running jobs."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+    
+    def _run_with_context(self, func, args):
+        with self.app.app_context():
+            return func(*args)
+    
+    def _discard_executor(self, executor):
+        """Drop a broken pool so the next call starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+    
+    def _call(self, func, args):
+        executor = self.executor
+        try:
+            if self.executor_type == 'process':
+                return executor.submit(_run_in_worker, func, args)
+            return executor.submit(self._run_with_context, func, args)
+        except BrokenProcessPool:
+            # A worker died and took the pool down with it; retry once on a new pool
+            logger.warning('Job pool is broken, starting a new one')
+            self._discard_executor(executor)
+            if self.executor_type == 'process':
+                return self.executor.submit(_run_in_worker, func, args)
+            return self.executor.submit(self._run_with_context, func, args)
+    
+    def run(self, func, *args, timeout=None):
+        """
+        Run a function in the pool and wait for its result.
+        
+        The wait yields to other greenlets, so the calling request is the
+        only one that waits.
+        
+        Args:
+            func: Module-level function, called as func(*args) in an app context
+            timeout (float): Seconds to wait before giving up (default: JOB_RUN_TIMEOUT)
+        
+        Returns:
+            The function's return value
+        
+        Raises:
+            TimeoutError: If the result isn't ready within the timeout
+            BrokenProcessPool: If a pool process died while running the function
+        """
+        future = self._call(func, args)
+        try:
+            return future.result(timeout=timeout if timeout is not None else self.run_timeout)
+        except TimeoutError:
+            # Drop the work if it hasn't started; a running call is left to finish
+            future.cancel()
+            raise
+    
+    def submit(self, kind, func, *args, owner_id=None, filename=None, mimetype=None):
+        """
+        Submit a background job that writes its result to a file.
+        
+        The function is called as func(*args, result_path) and may return a
+        JSON-serializable summary that is stored with the job.
+        
+        Args:
+            kind (str): Job type shown in the status API, e.g. 'export'
+            func: Module-level function that writes result_path
+            owner_id (int): ID of the user allowed to see the job
+            filename (str): Download name for the result
+            mimetype (str): Content type of the result
+        
+        Returns:
+            dict: The pending job record
+        """
+        self.cleanup()
+        
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'status': 'pending',
+            'owner_id': owner_id,
+            'filename': filename,
+            'mimetype': mimetype,
+            'result': None,
+            'error': None,
+            'created_at': time.time(),
+            'finished_at': None
+        }
+        self._write(job)
+        
+        try:
+            future = self._call(func, args + (self.result_path(job_id),))
+        except Exception as e:
+            # Record the failure rather than leave the job pending forever
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+    
+    def _finish(self, job, future):
+        job = dict(job, finished_at=time.time())
+        try:
+            job['result'] = future.result()
+            job['status'] = 'finished'
+        except BrokenProcessPool:
+            logger.error(f'Job {job["id"]} ({job["kind"]}) failed: its pool process exited')
+            job['status'] = 'failed'
+            job['error'] = 'The worker process running the job exited unexpectedly'
+        except Exception as e:
+            logger.error(f'Job {job["id"]} ({job["kind"]}) failed: {e}')
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        self._write(job)
+    
+    def _record_path(self, job_id):
+        return os.path.join(self.job_dir, f'{job_id}.json')
+    
+    def result_path(self, job_id):
+        """Get the path a job writes its result to."""
+        return os.path.join(self.job_dir, f'{job_id}.result')
+    
+    def _write(self, job):
+        fd, temp_path = tempfile.mkstemp(dir=self.job_dir, suffix='.part')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(job, f)
+        os.replace(temp_path, self._record_path(job['id']))
+    
+    def get(self, job_id):
+        """Get a job record by ID, or None if it is unknown or expired."""
+        if not JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        try:
+            with open(self._record_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def wait(self, job_id, timeout=None, interval=0.25):
+        """Poll until a job finishes or fails and return its record."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in ('finished', 'failed'):
+                return job
+            if deadline is not None and time.monotonic() > deadline:
+                return job
+            time.sleep(interval)
+    
+    def cleanup(self):
+        """Remove job records and results older than JOB_RESULT_TTL."""
+        cutoff = time.time() - self.result_ttl
+        try:
+            names = os.listdir(self.job_dir)
+        except OSError:
+            return
+        
+        for name in names:
+            path = os.path.join(self.job_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+# Global job queue
+job_queue = JobQueue()
@@ -1 +1,344 @@
-# Page service
+"""
+Page service for HomelabWiki.
+Server-side Markdown rendering with an on-disk HTML cache, plus page
+rendering and export work that runs in the job pool.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+import markdown
+from flask import current_app
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models.file import File
+from app.models.page import Page, PageTombstone
+from app.services import file_service
+from app.services.cache_service import prune_directory
+
+# File categories that are already compressed and are stored in exports as-is
+PRECOMPRESSED_FILE_TYPES = {'image', 'archive', 'video', 'audio', 'pdf'}
+
+# Bytes copied per read when streaming file blobs into an export
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+# Format version written to manifest.json in page exports
+MANIFEST_VERSION = 1
+
+# Markdown instance shared by every request in this process, with its config hash
+_markdown = None
+_markdown_config_hash = None
+_markdown_lock = threading.Lock()
+
+# Serializes render cache pruning within a process
+_render_prune_lock = threading.Lock()
+
+def _get_markdown():
+    """Get the shared Markdown instance, creating it from configuration on first use."""
+    global _markdown, _markdown_config_hash
+    if _markdown is None:
+        extensions = list(current_app.config.get('RENDER_MARKDOWN_EXTENSIONS', []))
+        extension_configs = current_app.config.get('RENDER_MARKDOWN_EXTENSION_CONFIGS', {})
+        config = json.dumps({
+            'markdown': markdown.__version__,
+            'extensions': extensions,
+            'extension_configs': extension_configs
+        }, sort_keys=True, default=str)
+        
+        _markdown_config_hash = hashlib.sha256(config.encode('utf-8')).hexdigest()[:16]
+        _markdown = markdown.Markdown(extensions=extensions, extension_configs=extension_configs)
+    return _markdown
+
+def renderer_config_hash():
+    """Get a hash of the renderer configuration, so config changes invalidate cached HTML."""
+    with _markdown_lock:
+        _get_markdown()
+        return _markdown_config_hash
+
+def render_markdown(text):
+    """
+    Convert Markdown to HTML with the shared renderer.
+    
+    Markdown instances keep state between calls, so conversions are
+    serialized and the instance is reset before each one.
+    """
+    with _markdown_lock:
+        return _get_markdown().reset().convert(text)
+
+def rendered_html_etag(page):
+    """Get the ETag of a page's rendered HTML, which changes with its version or the renderer config."""
+    return f'{page.id}-{page.version}-{renderer_config_hash()}'
+
+def rendered_html_path(page_id, version):
+    """Get the render cache path for a page version under the current renderer config."""
+    return os.path.join(
+        current_app.config['RENDER_CACHE_DIR'],
+        f'{page_id % 256:02x}',
+        f'{page_id}-{version}-{renderer_config_hash()}.html'
+    )
+
+def get_rendered_html(page):
+    """
+    Get a page's content as HTML, rendering and caching it on a miss.
+    
+    Args:
+        page (Page): Page to render; content is only loaded on a cache miss
+    
+    Returns:
+        str: Rendered HTML
+    """
+    path = rendered_html_path(page.id, page.version)
+    
+    try:
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        # Touch the entry so pruning evicts least recently used renders first
+        os.utime(path)
+        return html
+    except FileNotFoundError:
+        pass
+    
+    html = render_markdown(page.content or '')
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(html)
+        os.replace(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    
+    prune_render_cache()
+    return html
+
+def prune_render_cache():
+    """Evict least recently used renders until the cache fits RENDER_CACHE_MAX_BYTES."""
+    return prune_directory(
+        current_app.config['RENDER_CACHE_DIR'],
+        current_app.config.get('RENDER_CACHE_MAX_BYTES', 0),
+        _render_prune_lock
+    )
+
+def remove_rendered_html(page_id):
+    """Remove every cached render of a page, so a reused ID never serves stale HTML."""
+    directory = os.path.dirname(rendered_html_path(page_id, 0))
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    
+    for name in names:
+        if name.startswith(f'{page_id}-'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+def render_page_pdf(page_id):
+    """
+    Render a page as a PDF document.
+    
+    Args:
+        page_id (int): ID of the page to render
+    
+    Returns:
+        bytes: PDF file contents
+    """
+    page = Page.query.options(*Page.serialization_options(include_content=True)).get(page_id)
+    if page is None:
+        raise LookupError(f'Page {page_id} not found')
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    story = []
+    
+    # Title
+    title = Paragraph(page.title, styles['Title'])
+    story.append(title)
+    story.append(Spacer(1, 12))
+    
+    # Metadata
+    metadata = f"Author: {page.author.get_display_name()}<br/>"
+    metadata += f"Created: {page.created_at.strftime('%Y-%m-%d %H:%M')}<br/>"
+    metadata += f"Updated: {page.updated_at.strftime('%Y-%m-%d %H:%M')}<br/>"
+    if page.tags:
+        metadata += f"Tags: {', '.join(page.get_tags_list())}<br/>"
+    
+    meta_para = Paragraph(metadata, styles['Normal'])
+    story.append(meta_para)
+    story.append(Spacer(1, 12))
+    
+    # Convert markdown to HTML and then to PDF
+    html_content = markdown.markdown(page.content)
+    content_para = Paragraph(html_content, styles['Normal'])
+    story.append(content_para)
+    
+    doc.build(story)
+    return buffer.getvalue()
+
+def export_pages_zip(include_files, since, previous_manifest, result_path):
+    """
+    Write published pages as Markdown files into a ZIP archive.
+    
+    Pages are fetched in EXPORT_BATCH_SIZE batches and each entry is written
+    to the archive on disk as it is produced, so memory use does not grow
+    with the size of the wiki.
+    
+    Every archive ends with manifest.json, which lists all exported pages and
+    files with SHA-256 hashes. Passing a since watermark (normally the
+    generated_at of the previous manifest) or the previous manifest itself
+    makes the export incremental: only added and changed entries are written
+    and the manifest's deleted list names the slugs that went away. A since
+    watermark older than EXPORT_TOMBSTONE_DAYS falls back to a full export.
+    
+    Args:
+        include_files (bool): Also add files attached to exported pages under files/<slug>/
+        since (datetime): Only export pages updated after this time
+        previous_manifest (dict): manifest.json from an earlier export to diff against
+        result_path (str): Path the archive is written to
+    
+    Returns:
+        dict: Summary with mode, counts, archive size and duration
+    """
+    started = time.perf_counter()
+    generated_at = datetime.utcnow()
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 500)
+    
+    # Deletions before the cutoff are forgotten, so older watermarks can't be trusted
+    tombstone_cutoff = generated_at - timedelta(days=current_app.config.get('EXPORT_TOMBSTONE_DAYS', 90))
+    PageTombstone.purge(tombstone_cutoff)
+    
+    if previous_manifest is not None:
+        mode = 'manifest'
+        previous_pages = {slug: entry.get('sha256') for slug, entry in previous_manifest.get('pages', {}).items()}
+        previous_files = {path: entry.get('sha256') for path, entry in previous_manifest.get('files', {}).items()}
+    elif since is not None and since >= tombstone_cutoff:
+        mode = 'since'
+    else:
+        mode = 'full'
+        since = None
+    
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'mode': mode,
+        'since': since.isoformat() if since else None,
+        'generated_at': generated_at.isoformat(),
+        'pages': {},
+        'files': {},
+        'deleted': [],
+        'deleted_files': []
+    }
+    written_pages = set()
+    file_count = 0
+    
+    with zipfile.ZipFile(result_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zip_file:
+        pages = Page.query.filter_by(is_published=True, is_archived=False).options(
+            *Page.serialization_options(include_content=True)
+        ).order_by(Page.id).yield_per(batch_size)
+        
+        for page in pages:
+            content = page.to_markdown().encode('utf-8')
+            digest = hashlib.sha256(content).hexdigest()
+            manifest['pages'][page.slug] = {
+                'id': page.id,
+                'sha256': digest,
+                'updated_at': page.updated_at.isoformat() if page.updated_at else None
+            }
+            
+            if mode == 'manifest':
+                changed = previous_pages.get(page.slug) != digest
+            elif mode == 'since':
+                changed = page.updated_at is None or page.updated_at > since
+            else:
+                changed = True
+            
+            if changed:
+                zip_file.writestr(f"{page.slug}.md", content)
+                written_pages.add(page.id)
+        
+        if include_files:
+            for path, file in iter_page_files(batch_size):
+                digest = file.file_hash or file_service.hash_file(file.get_absolute_path())
+                manifest['files'][path] = {'id': file.id, 'sha256': digest, 'size': file.file_size}
+                
+                if mode == 'manifest':
+                    changed = previous_files.get(path) != digest
+                elif mode == 'since':
+                    changed = file.page_id in written_pages or file.created_at > since
+                else:
+                    changed = True
+                
+                if changed:
+                    write_file_entry(zip_file, path, file)
+                    file_count += 1
+        
+        if mode == 'manifest':
+            manifest['deleted'] = sorted(set(previous_pages) - set(manifest['pages']))
+            manifest['deleted_files'] = sorted(set(previous_files) - set(manifest['files']))
+        elif mode == 'since':
+            manifest['deleted'] = sorted(removed_page_slugs(since) - set(manifest['pages']))
+        
+        # json.dump writes in chunks, so the manifest is never built as one string
+        with io.TextIOWrapper(zip_file.open('manifest.json', 'w', force_zip64=True), encoding='utf-8') as target:
+            json.dump(manifest, target)
+    
+    return {
+        'mode': mode,
+        'generated_at': manifest['generated_at'],
+        'total_pages': len(manifest['pages']),
+        'page_count': len(written_pages),
+        'file_count': file_count,
+        'deleted_count': len(manifest['deleted']),
+        'size': os.path.getsize(result_path),
+        'duration': round(time.perf_counter() - started, 3)
+    }
+
+def removed_page_slugs(since):
+    """Get slugs deleted, renamed, unpublished or archived after a watermark."""
+    slugs = {
+        slug for (slug,) in db.session.query(PageTombstone.slug).filter(PageTombstone.deleted_at > since)
+    }
+    slugs.update(
+        slug for (slug,) in db.session.query(Page.slug).filter(
+            Page.updated_at > since,
+            db.or_(Page.is_published == False, Page.is_archived == True)
+        )
+    )
+    return slugs
+
+def iter_page_files(batch_size):
+    """Yield (archive path, file) for files attached to published pages."""
+    files = File.query.join(File.page).filter(
+        File.is_archived == False,
+        Page.is_published == True,
+        Page.is_archived == False
+    ).options(joinedload(File.page)).order_by(File.id).yield_per(batch_size)
+    
+    for file in files:
+        if file.file_exists():
+            yield f"files/{file.page.slug}/{file.id}-{file.original_filename}", file
+
+def write_file_entry(zip_file, path, file):
+    """Stream a file blob from disk into an open archive."""
+    info = zipfile.ZipInfo(path, date_time=file.created_at.timetuple()[:6])
+    if file.file_type in PRECOMPRESSED_FILE_TYPES:
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    
+    with open(file.get_absolute_path(), 'rb') as source, \
+            zip_file.open(info, 'w', force_zip64=True) as target:
+        shutil.copyfileobj(source, target, EXPORT_CHUNK_SIZE)
@@ -1 +1,891 @@
-# Search service
+"""
+Search service for HomelabWiki.
+Maintains a full-text index of wiki pages behind a pluggable backend:
+Elasticsearch when ELASTICSEARCH_URL is set, a tsvector column on PostgreSQL,
+or a local Whoosh index otherwise. Also keeps an in-memory typeahead index
+of page titles and tag names.
+"""
+
+import os
+import atexit
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import event, func, cast, inspect, literal, literal_column, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.engine import make_url
+from whoosh import index as whoosh_index
+from whoosh.analysis import StemmingAnalyzer
+from whoosh.fields import Schema, ID, TEXT, KEYWORD
+from whoosh.qparser import MultifieldParser, QueryParser
+from whoosh.scoring import BM25F
+from whoosh.writing import AsyncWriter
+
+logger = logging.getLogger(__name__)
+
+# Index schema - titles are boosted above body text for ranking
+PAGE_SCHEMA = Schema(
+    id=ID(stored=True, unique=True),
+    title=TEXT(analyzer=StemmingAnalyzer(), field_boost=2.0),
+    content=TEXT(analyzer=StemmingAnalyzer()),
+    tags=KEYWORD(commas=True, lowercase=True, scorable=True)
+)
+
+# Field boosts shared by all backends
+FIELD_BOOSTS = {'title': 2.0, 'content': 1.0, 'tags': 1.0}
+
+# Session.info key used to carry index changes from flush to commit
+PENDING_KEY = 'search_index_pending'
+
+def page_document(page):
+    """Build an index document from a page, or None if it is not searchable."""
+    if not page.is_published or page.is_archived:
+        return None
+    
+    return {
+        'id': str(page.id),
+        'title': page.title or '',
+        'content': page.content or '',
+        'tags': ','.join(page.get_tags_list())
+    }
+
+class SearchBackend:
+    """Interface implemented by search index backends."""
+    
+    name = None
+    
+    # Backends whose index is maintained by the database need no change feed
+    self_maintained = False
+    
+    # Cleared when the index can't be queried; callers fall back to substring matching
+    available = True
+    
+    def apply_changes(self, documents, deleted_ids):
+        """Upsert documents and delete ids in one batch."""
+        raise NotImplementedError
+    
+    def refresh(self):
+        """Make previously applied changes visible to searches."""
+    
+    def rebuild(self, pages, chunk_size=500):
+        """Recreate the index from an iterable of pages and return the count indexed."""
+        raise NotImplementedError
+    
+    def is_built(self):
+        """Whether the index has been populated; a freshly created index starts empty."""
+        return True
+    
+    def mark_built(self):
+        """Record that the index holds every page."""
+    
+    def document_count(self):
+        """Number of documents in the index, or None when it can't be counted."""
+        return None
+    
+    def search(self, query_string, limit=20, fields=None):
+        """Return matching page ids ordered by relevance."""
+        raise NotImplementedError
+
+class WhooshBackend(SearchBackend):
+    """Local on-disk inverted index with BM25 ranking."""
+    
+    name = 'whoosh'
+    
+    # Written by rebuild() once every page has been indexed
+    BUILT_MARKER = '.built'
+    
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._index = None
+        self._searcher = None
+        self._lock = threading.Lock()
+    
+    def _get_index(self):
+        """Open the index, creating it if it does not exist yet."""
+        if self._index is None:
+            if not os.path.exists(self.index_dir):
+                os.makedirs(self.index_dir, exist_ok=True)
+            
+            if whoosh_index.exists_in(self.index_dir):
+                self._index = whoosh_index.open_dir(self.index_dir)
+            else:
+                self._index = whoosh_index.create_in(self.index_dir, PAGE_SCHEMA)
+        return self._index
+    
+    def _get_searcher(self):
+        """Get a searcher that reflects the latest committed index state."""
+        if self._searcher is None:
+            self._searcher = self._get_index().searcher(weighting=BM25F(B=0.75, K1=1.2))
+        else:
+            self._searcher = self._searcher.refresh()
+        return self._searcher
+    
+    def apply_changes(self, documents, deleted_ids):
+        writer = AsyncWriter(self._get_index())
+        for page_id in deleted_ids:
+            writer.delete_by_term('id', str(page_id))
+        for document in documents:
+            writer.update_document(**document)
+        writer.commit()
+    
+    def rebuild(self, pages, chunk_size=500):
+        if not os.path.exists(self.index_dir):
+            os.makedirs(self.index_dir, exist_ok=True)
+        
+        with self._lock:
+            self._searcher = None
+            self._index = whoosh_index.create_in(self.index_dir, PAGE_SCHEMA)
+        
+        count = 0
+        writer = self._index.writer(limitmb=128)
+        for page in pages:
+            document = page_document(page)
+            if document:
+                writer.add_document(**document)
+                count += 1
+        writer.commit()
+        self.mark_built()
+        
+        return count
+    
+    def is_built(self):
+        return os.path.exists(os.path.join(self.index_dir, self.BUILT_MARKER))
+    
+    def mark_built(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, self.BUILT_MARKER), 'w'):
+            pass
+    
+    def document_count(self):
+        with self._lock:
+            return self._get_index().doc_count()
+    
+    def search(self, query_string, limit=20, fields=None):
+        fields = fields or list(FIELD_BOOSTS)
+        
+        if len(fields) == 1:
+            parser = QueryParser(fields[0], PAGE_SCHEMA)
+        else:
+            parser = MultifieldParser(fields, PAGE_SCHEMA)
+        query = parser.parse(query_string)
+        
+        with self._lock:
+            searcher = self._get_searcher()
+            results = searcher.search(query, limit=limit)
+            return [int(hit['id']) for hit in results]
+
+class ElasticsearchBackend(SearchBackend):
+    """Elasticsearch index written through the _bulk API."""
+    
+    name = 'elasticsearch'
+    
+    # Elasticsearch's default result window; larger requests are rejected
+    MAX_RESULTS = 10000
+    
+    def __init__(self, url, index_name, client=None, timeout=10):
+        """
+        Args:
+            url (str): Elasticsearch base URL
+            index_name (str): Name of the pages index
+            client: Pre-built client, e.g. one using a stand-in transport for testing
+            timeout (int): Request timeout in seconds
+        """
+        if client is None:
+            from elasticsearch import Elasticsearch
+            client = Elasticsearch(url, request_timeout=timeout)
+        
+        self.client = client
+        self.index_name = index_name
+        self._index_ready = False
+    
+    def _ensure_index(self):
+        """Create the pages index with its mapping if it does not exist."""
+        if self._index_ready:
+            return
+        
+        if not self.client.indices.exists(index=self.index_name):
+            self._create_index()
+        self._index_ready = True
+    
+    def _create_index(self):
+        self.client.indices.create(
+            index=self.index_name,
+            settings={'analysis': {'analyzer': {'default': {'type': 'english'}}}},
+            mappings={
+                'properties': {
+                    'title': {'type': 'text'},
+                    'content': {'type': 'text'},
+                    'tags': {'type': 'text'}
+                }
+            }
+        )
+    
+    def _bulk(self, actions, chunk_size=500):
+        """Send actions through the _bulk API and return the number that succeeded."""
+        from elasticsearch import helpers
+        
+        success, errors = helpers.bulk(
+            self.client,
+            actions,
+            chunk_size=chunk_size,
+            refresh=False,
+            raise_on_error=False
+        )
+        for error in errors:
+            logger.error(f"Elasticsearch bulk item failed: {error}")
+        return success
+    
+    def _index_action(self, document):
+        return {
+            '_op_type': 'index',
+            '_index': self.index_name,
+            '_id': document['id'],
+            '_source': {
+                'title': document['title'],
+                'content': document['content'],
+                'tags': document['tags'].split(',') if document['tags'] else []
+            }
+        }
+    
+    def apply_changes(self, documents, deleted_ids):
+        self._ensure_index()
+        
+        actions = [self._index_action(document) for document in documents]
+        actions.extend(
+            {'_op_type': 'delete', '_index': self.index_name, '_id': str(page_id)}
+            for page_id in deleted_ids
+        )
+        self._bulk(actions)
+    
+    def refresh(self):
+        self.client.indices.refresh(index=self.index_name)
+    
+    def rebuild(self, pages, chunk_size=500):
+        self.client.indices.delete(index=self.index_name, ignore_unavailable=True)
+        self._create_index()
+        self._index_ready = True
+        
+        # Disable periodic refresh while bulk loading, then refresh once
+        self.client.indices.put_settings(
+            index=self.index_name,
+            settings={'index': {'refresh_interval': '-1'}}
+        )
+        try:
+            actions = (
+                self._index_action(document)
+                for document in (page_document(page) for page in pages)
+                if document
+            )
+            count = self._bulk(actions, chunk_size=chunk_size)
+        finally:
+            self.client.indices.put_settings(
+                index=self.index_name,
+                settings={'index': {'refresh_interval': None}}
+            )
+            self.refresh()
+        self.mark_built()
+        
+        return count
+    
+    def is_built(self):
+        if not self.client.indices.exists(index=self.index_name):
+            return False
+        mappings = self.client.indices.get_mapping(index=self.index_name)
+        meta = mappings.get(self.index_name, {}).get('mappings', {}).get('_meta', {})
+        return bool(meta.get('built'))
+    
+    def mark_built(self):
+        self._ensure_index()
+        self.client.indices.put_mapping(index=self.index_name, meta={'built': True})
+    
+    def document_count(self):
+        if not self.client.indices.exists(index=self.index_name):
+            return 0
+        return self.client.count(index=self.index_name)['count']
+    
+    def search(self, query_string, limit=20, fields=None):
+        fields = fields or list(FIELD_BOOSTS)
+        
+        response = self.client.search(
+            index=self.index_name,
+            query={
+                'simple_query_string': {
+                    'query': query_string,
+                    'fields': [f"{field}^{FIELD_BOOSTS.get(field, 1.0)}" for field in fields],
+                    'default_operator': 'and'
+                }
+            },
+            size=min(limit, self.MAX_RESULTS) if limit is not None else self.MAX_RESULTS,
+            source=False
+        )
+        return [int(hit['_id']) for hit in response['hits']['hits']]
+
+class PostgresBackend(SearchBackend):
+    """PostgreSQL full-text search over the generated pages.search_vector column."""
+    
+    name = 'postgres'
+    self_maintained = True
+    
+    def check_schema(self):
+        """Disable the backend when the pages table predates the search_vector column."""
+        from app import db
+        
+        inspector = inspect(db.engine)
+        if not inspector.has_table('pages'):
+            # create_all() adds the column along with the table
+            self.available = True
+            return
+        
+        columns = {column['name'] for column in inspector.get_columns('pages')}
+        self.available = 'search_vector' in columns
+        if not self.available:
+            logger.warning(
+                "pages.search_vector is missing; falling back to substring search. "
+                "Run 'flask search rebuild' and restart to enable full-text search."
+            )
+    
+    def _tsquery(self, query_string):
+        from app.models.page import SEARCH_TS_CONFIG
+        return func.websearch_to_tsquery(cast(literal(SEARCH_TS_CONFIG), REGCONFIG), query_string)
+    
+    def match_clause(self, query_string, fields=None):
+        """
+        Build a WHERE clause matching pages against a web-search style query.
+        
+        Args:
+            query_string (str): User search query
+            fields (list): Restrict matching to a single column ('title' or 'content')
+        
+        Returns:
+            tuple: (clause, tsquery) for filtering and ranking
+        """
+        from app.models.page import Page, SEARCH_TS_CONFIG
+        
+        tsquery = self._tsquery(query_string)
+        vector = literal_column('pages.search_vector')
+        clause = vector.op('@@')(tsquery)
+        
+        # The GIN-indexed vector prunes candidates; the per-column vector narrows them
+        if fields and len(fields) == 1 and fields[0] in ('title', 'content'):
+            column = getattr(Page, fields[0])
+            column_vector = func.to_tsvector(
+                cast(literal(SEARCH_TS_CONFIG), REGCONFIG), func.coalesce(column, '')
+            )
+            clause = clause & column_vector.op('@@')(tsquery)
+        
+        return clause, tsquery
+    
+    def apply_changes(self, documents, deleted_ids):
+        """The generated column keeps itself current."""
+    
+    def rebuild(self, pages, chunk_size=500):
+        """Install the search column and GIN indexes on databases created before them."""
+        from app import db
+        from app.models.page import SEARCH_VECTOR_DDL, PAGE_TRIGRAM_DDL, TAG_TRIGRAM_DDL
+        
+        for statement in SEARCH_VECTOR_DDL + PAGE_TRIGRAM_DDL + TAG_TRIGRAM_DDL:
+            db.session.execute(text(statement))
+        db.session.commit()
+        self.available = True
+        
+        return sum(1 for page in pages if page_document(page))
+    
+    def search(self, query_string, limit=20, fields=None):
+        from app import db
+        from app.models.page import Page
+        
+        clause, tsquery = self.match_clause(query_string, fields)
+        rank = func.ts_rank(literal_column('pages.search_vector'), tsquery)
+        
+        query = db.session.query(Page.id).filter(
+            clause,
+            Page.is_published == True,
+            Page.is_archived == False
+        ).order_by(rank.desc(), Page.updated_at.desc())
+        
+        if limit is not None:
+            query = query.limit(limit)
+        
+        # A failed query rolls back to the savepoint, leaving the request's transaction usable
+        with db.session.begin_nested():
+            return [row.id for row in query]
+
+class WriteBehindQueue:
+    """Background writer that batches index changes so page saves never wait on the index."""
+    
+    def __init__(self, backend, max_batch=200):
+        self.backend = backend
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='search-write-behind', daemon=True
+                )
+                self._thread.start()
+    
+    def put(self, documents, deleted_ids):
+        """Queue a batch of changes for the background writer."""
+        self._ensure_started()
+        self._queue.put((documents, deleted_ids))
+    
+    def flush(self):
+        """Block until every queued change has been written."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+    
+    def _drain(self, first):
+        """Coalesce queued changes into one batch, later changes winning."""
+        documents = {}
+        deleted = set()
+        items = [first]
+        
+        while len(items) < self.max_batch:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        for batch_documents, batch_deleted in items:
+            for page_id in batch_deleted:
+                documents.pop(str(page_id), None)
+                deleted.add(str(page_id))
+            for document in batch_documents:
+                deleted.discard(document['id'])
+                documents[document['id']] = document
+        
+        return len(items), list(documents.values()), deleted
+    
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            item_count, documents, deleted = self._drain(first)
+            try:
+                self.backend.apply_changes(documents, deleted)
+                self.backend.refresh()
+            except Exception as e:
+                logger.error(f"Failed to update {self.backend.name} search index: {e}")
+            finally:
+                for _ in range(item_count):
+                    self._queue.task_done()
+
+class SearchIndex:
+    """Full-text page index delegating to the configured search backend."""
+    
+    # Seconds between checks for a rebuild while the index is still unbuilt
+    BUILT_RECHECK_INTERVAL = 30
+    
+    def __init__(self, app=None):
+        self.enabled = False
+        self.backend = None
+        self.writer = None
+        self.max_matches = 1000
+        self._built = False
+        self._built_checked_at = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app, backend=None):
+        """
+        Select and configure the search backend.
+        
+        Args:
+            app (Flask): Application to read configuration from
+            backend (SearchBackend): Explicit backend, overriding configuration
+        """
+        self.enabled = app.config.get('ENABLE_FULL_TEXT_SEARCH', True)
+        self.max_matches = app.config.get('SEARCH_MAX_MATCHES', 1000)
+        
+        if backend is None:
+            backend = self._create_backend(app)
+        
+        if self.writer is not None:
+            self.writer.flush()
+        
+        self.backend = backend
+        self.writer = None
+        self._built = False
+        self._built_checked_at = None
+        if app.config.get('SEARCH_WRITE_BEHIND', True) and not backend.self_maintained:
+            self.writer = WriteBehindQueue(backend)
+        
+        if self.enabled and isinstance(backend, PostgresBackend):
+            with app.app_context():
+                try:
+                    backend.check_schema()
+                except Exception as e:
+                    logger.error(f"Failed to inspect the search_vector column: {e}")
+        
+        if self.enabled:
+            register_session_hooks()
+    
+    @staticmethod
+    def _create_backend(app):
+        """Create the backend named by SEARCH_BACKEND, or pick one from the environment."""
+        backend_name = app.config.get('SEARCH_BACKEND', 'auto')
+        elasticsearch_url = app.config.get('ELASTICSEARCH_URL')
+        
+        if backend_name == 'auto':
+            database_uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+            if elasticsearch_url:
+                backend_name = 'elasticsearch'
+            elif make_url(database_uri).get_backend_name() == 'postgresql':
+                backend_name = 'postgres'
+            else:
+                backend_name = 'whoosh'
+        
+        if backend_name == 'elasticsearch':
+            return ElasticsearchBackend(
+                elasticsearch_url,
+                app.config.get('SEARCH_INDEX_NAME', 'homelab-wiki-pages'),
+                timeout=app.config.get('SEARCH_REQUEST_TIMEOUT', 10)
+            )
+        if backend_name == 'postgres':
+            return PostgresBackend()
+        return WhooshBackend(app.config.get('SEARCH_INDEX_DIR', 'search_index'))
+    
+    def is_ready(self):
+        """
+        Check that searches can be answered from the index.
+        
+        A new index starts empty, and an empty result isn't an error, so until
+        'flask search rebuild' has filled it callers keep using substring
+        matching. The marker is rechecked every BUILT_RECHECK_INTERVAL seconds
+        so a rebuild run from the CLI is picked up without a restart. An index
+        already holding one document per published page - on a new install,
+        where every page was indexed as it was written - is marked built
+        straight away.
+        """
+        from app.models.page import Page
+        
+        if not self.enabled or self.backend is None or not self.backend.available:
+            return False
+        if self._built:
+            return True
+        
+        now = time.monotonic()
+        if self._built_checked_at is not None and now - self._built_checked_at < self.BUILT_RECHECK_INTERVAL:
+            return False
+        self._built_checked_at = now
+        
+        try:
+            if not self.backend.is_built():
+                published = Page.query.filter_by(is_published=True, is_archived=False).count()
+                if published and self.backend.document_count() != published:
+                    logger.warning(
+                        f"The {self.backend.name} search index has not been built; using substring "
+                        "search until 'flask search rebuild' is run"
+                    )
+                    return False
+                self.backend.mark_built()
+        except Exception as e:
+            logger.error(f"Failed to check the {self.backend.name} search index: {e}")
+            return False
+        
+        self._built = True
+        return True
+    
+    def apply_changes(self, documents, deleted_ids):
+        """Apply index changes, in the background when write-behind is enabled."""
+        if not documents and not deleted_ids:
+            return
+        
+        if self.backend.self_maintained:
+            return
+        
+        if self.writer is not None:
+            self.writer.put(documents, deleted_ids)
+            return
+        
+        try:
+            self.backend.apply_changes(documents, deleted_ids)
+            self.backend.refresh()
+        except Exception as e:
+            logger.error(f"Failed to update {self.backend.name} search index: {e}")
+    
+    def flush(self):
+        """Wait for queued index changes to be written."""
+        if self.writer is not None:
+            self.writer.flush()
+    
+    def rebuild(self, pages, chunk_size=500):
+        """Rebuild the index from scratch from an iterable of pages."""
+        self.flush()
+        count = self.backend.rebuild(pages, chunk_size=chunk_size)
+        self._built = True
+        return count
+    
+    def search(self, query_string, limit=20, fields=None):
+        """
+        Search the index and return matching page ids ordered by relevance.
+        
+        Args:
+            query_string (str): User search query
+            limit (int): Maximum number of ids to return, None for all matches
+            fields (list): Fields to search, defaults to title, content and tags
+        
+        Returns:
+            list: Page ids ordered by relevance, or None if the index is unavailable
+        """
+        if not self.is_ready():
+            return None
+        
+        try:
+            return self.backend.search(query_string, limit=limit, fields=fields)
+        except Exception as e:
+            logger.error(f"{self.backend.name} search query failed: {e}")
+            return None
+    
+    def filter_query(self, query, query_string, fields=None):
+        """
+        Restrict a Page query to pages matching a full-text query.
+        
+        External indexes contribute only their SEARCH_MAX_MATCHES best-ranked
+        page ids, which keeps the IN list bounded: a broad query narrows a
+        listing to its most relevant pages rather than to every page that
+        mentions the term. The caller's ordering applies to those pages.
+        PostgreSQL matches in the query itself and has no such cap.
+        
+        Args:
+            query: SQLAlchemy query over Page
+            query_string (str): User search query
+            fields (list): Fields to search, defaults to all indexed fields
+        
+        Returns:
+            Query: Filtered query, or None if the index is unavailable
+        """
+        from app.models.page import Page
+        
+        if not self.is_ready():
+            return None
+        
+        if isinstance(self.backend, PostgresBackend):
+            clause, _ = self.backend.match_clause(query_string, fields)
+            return query.filter(clause)
+        
+        page_ids = self.search(query_string, limit=self.max_matches, fields=fields)
+        if page_ids is None:
+            return None
+        return query.filter(Page.id.in_(page_ids))
+
+class SuggestionIndex:
+    """In-memory n-gram index of page titles and tag names for typeahead suggestions."""
+    
+    def __init__(self, app=None):
+        self.enabled = False
+        self.ttl = 60
+        self._entries = {}
+        self._grams = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Initialize suggestion index configuration."""
+        self.enabled = app.config.get('SEARCH_SUGGESTION_INDEX', True)
+        self.ttl = app.config.get('SEARCH_SUGGESTION_TTL', 60)
+        self._entries = {}
+        self._grams = {}
+        self._loaded_at = None
+        
+        if self.enabled:
+            register_session_hooks()
+    
+    @staticmethod
+    def _ngrams(text, sizes=(2, 3)):
+        """Split lowercased text into the bigrams and trigrams used for lookup."""
+        return {text[i:i + n] for n in sizes for i in range(len(text) - n + 1)}
+    
+    def _add(self, entries, grams, key, entry):
+        entries[key] = entry
+        for gram in self._ngrams(entry['key']):
+            grams.setdefault(gram, set()).add(key)
+    
+    def _remove(self, entries, grams, key):
+        entry = entries.pop(key, None)
+        if entry:
+            for gram in self._ngrams(entry['key']):
+                keys = grams.get(gram)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del grams[gram]
+    
+    @staticmethod
+    def page_entry(title, slug):
+        return {
+            'key': title.lower(),
+            'text': title,
+            'type': 'page',
+            'url': f'/pages/{slug}'
+        }
+    
+    @staticmethod
+    def tag_entry(name):
+        return {
+            'key': name.lower(),
+            'text': name,
+            'type': 'tag',
+            'url': f'/pages?tag={name}'
+        }
+    
+    def load(self):
+        """Load titles and tag names from the database, reading only the needed columns."""
+        from app import db
+        from app.models.page import Page, Tag
+        
+        entries = {}
+        grams = {}
+        
+        pages = db.session.query(Page.id, Page.title, Page.slug).filter(
+            Page.is_published == True,
+            Page.is_archived == False
+        )
+        for page_id, title, slug in pages:
+            if title and slug:
+                self._add(entries, grams, ('page', page_id), self.page_entry(title, slug))
+        
+        for tag_id, name in db.session.query(Tag.id, Tag.name):
+            if name:
+                self._add(entries, grams, ('tag', tag_id), self.tag_entry(name))
+        
+        with self._lock:
+            self._entries = entries
+            self._grams = grams
+            self._loaded_at = time.monotonic()
+    
+    def _ensure_loaded(self):
+        """Reload when empty or older than the TTL, picking up writes from other workers."""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.load()
+    
+    def apply_changes(self, changes):
+        """
+        Apply committed page and tag changes.
+        
+        Args:
+            changes (dict): Maps ('page'|'tag', id) to a new entry, or None to remove it
+        """
+        if self._loaded_at is None:
+            return
+        
+        with self._lock:
+            for key, entry in changes.items():
+                self._remove(self._entries, self._grams, key)
+                if entry:
+                    self._add(self._entries, self._grams, key, entry)
+    
+    def suggest(self, query_string, limit=10):
+        """
+        Get page and tag suggestions containing the query string.
+        
+        Returns:
+            list: Suggestion dicts, or None if the index is disabled
+        """
+        if not self.enabled:
+            return None
+        
+        self._ensure_loaded()
+        
+        needle = query_string.lower()
+        gram_size = 3 if len(needle) >= 3 else 2
+        
+        with self._lock:
+            posting_lists = sorted(
+                (self._grams.get(gram, set()) for gram in self._ngrams(needle, (gram_size,))),
+                key=len
+            )
+            if not posting_lists:
+                return []
+            
+            candidates = set(posting_lists[0])
+            for keys in posting_lists[1:]:
+                candidates &= keys
+            
+            matches = [self._entries[key] for key in candidates if needle in self._entries[key]['key']]
+        
+        # Prefix matches first, then alphabetical
+        matches.sort(key=lambda entry: (not entry['key'].startswith(needle), entry['key']))
+        
+        per_type = max(1, limit // 2)
+        pages = [entry for entry in matches if entry['type'] == 'page'][:per_type]
+        tags = [entry for entry in matches if entry['type'] == 'tag'][:per_type]
+        
+        return [
+            {'text': entry['text'], 'type': entry['type'], 'url': entry['url']}
+            for entry in pages + tags
+        ]
+
+def _collect_page_changes(session, flush_context):
+    """Record page and tag changes made by a flush so they can be indexed on commit."""
+    from app.models.page import Page, Tag
+    
+    if not search_index.enabled and not suggestion_index.enabled:
+        return
+    
+    pending = session.info.setdefault(PENDING_KEY, {
+        'documents': {},
+        'deleted': set(),
+        'suggestions': {}
+    })
+    
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Page) and obj.id is not None:
+            document = page_document(obj)
+            if document:
+                pending['documents'][obj.id] = document
+                pending['deleted'].discard(obj.id)
+                pending['suggestions'][('page', obj.id)] = SuggestionIndex.page_entry(
+                    obj.title, obj.slug
+                )
+            else:
+                pending['documents'].pop(obj.id, None)
+                pending['deleted'].add(obj.id)
+                pending['suggestions'][('page', obj.id)] = None
+        elif isinstance(obj, Tag) and obj.id is not None:
+            pending['suggestions'][('tag', obj.id)] = SuggestionIndex.tag_entry(obj.name)
+    
+    for obj in session.deleted:
+        if isinstance(obj, Page) and obj.id is not None:
+            pending['documents'].pop(obj.id, None)
+            pending['deleted'].add(obj.id)
+            pending['suggestions'][('page', obj.id)] = None
+        elif isinstance(obj, Tag) and obj.id is not None:
+            pending['suggestions'][('tag', obj.id)] = None
+
+def _apply_page_changes(session):
+    """Push recorded page and tag changes to the indexes once the transaction commits."""
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        if search_index.enabled:
+            search_index.apply_changes(list(pending['documents'].values()), pending['deleted'])
+        if suggestion_index.enabled:
+            suggestion_index.apply_changes(pending['suggestions'])
+
+def _discard_page_changes(session):
+    """Forget recorded page changes when the transaction is rolled back."""
+    session.info.pop(PENDING_KEY, None)
+
+def register_session_hooks():
+    """Keep the indexes in sync with committed page and tag changes."""
+    from app import db
+    
+    if event.contains(db.session, 'after_flush', _collect_page_changes):
+        return
+    
+    event.listen(db.session, 'after_flush', _collect_page_changes)
+    event.listen(db.session, 'after_commit', _apply_page_changes)
+    event.listen(db.session, 'after_rollback', _discard_page_changes)
+
+# Global search index instances
+search_index = SearchIndex()
+suggestion_index = SuggestionIndex()
+
+# Write out queued index changes on interpreter shutdown
+atexit.register(search_index.flush)
@@ -0,0 +1,195 @@
+"""
+Session service for HomelabWiki.
+Selects the session store from SESSION_TYPE and provides a SQL-table store
+that shares the application database engine.
+"""
+
+import logging
+import pickle
+import threading
+import time
+from datetime import datetime
+from flask_session import Session
+from flask_session.sessions import ServerSideSession, SessionInterface
+from itsdangerous import BadSignature, want_bytes
+from app import db
+from app.models.session import SessionRecord
+
+logger = logging.getLogger(__name__)
+
+# Session stores selectable with SESSION_TYPE
+SESSION_TYPES = ('filesystem', 'sqlalchemy', 'redis', 'cookie')
+
+class SqlAlchemySessionInterface(SessionInterface):
+    """
+    Server-side sessions stored in the sessions table.
+    
+    Reads and writes go through their own connection so saving a session
+    never commits application changes pending in db.session. Unmodified
+    sessions are only rewritten when less than half their lifetime remains,
+    and expired rows are deleted in batches at most once per purge interval.
+    """
+    
+    serializer = pickle
+    session_class = ServerSideSession
+    
+    def __init__(self, app):
+        self.key_prefix = app.config.get('SESSION_KEY_PREFIX', 'session:')
+        self.use_signer = app.config.get('SESSION_USE_SIGNER', False)
+        self.permanent = app.config.get('SESSION_PERMANENT', True)
+        self.purge_interval = app.config.get('SESSION_PURGE_INTERVAL', 300)
+        self.purge_batch_size = app.config.get('SESSION_PURGE_BATCH_SIZE', 1000)
+        self._last_purge = time.monotonic()
+        self._purge_lock = threading.Lock()
+    
+    def _session_id_from_cookie(self, app, request):
+        sid = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if not sid or not self.use_signer:
+            return sid
+        
+        signer = self._get_signer(app)
+        if signer is None:
+            return None
+        try:
+            return signer.unsign(sid).decode()
+        except BadSignature:
+            return None
+    
+    def _new_session(self):
+        return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+    
+    def open_session(self, app, request):
+        sid = self._session_id_from_cookie(app, request)
+        if not sid:
+            return self._new_session()
+        
+        table = SessionRecord.__table__
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                db.select(table.c.data, table.c.expiry).where(
+                    table.c.session_id == self.key_prefix + sid,
+                    table.c.expiry > datetime.utcnow()
+                )
+            ).first()
+        
+        if row is None:
+            return self._new_session()
+        
+        try:
+            session = self.session_class(self.serializer.loads(want_bytes(row.data)), sid=sid)
+        except Exception:
+            return self._new_session()
+        
+        session.stored_expiry = row.expiry
+        return session
+    
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        table = SessionRecord.__table__
+        store_id = self.key_prefix + session.sid
+        
+        if not session:
+            if session.modified:
+                with db.engine.begin() as connection:
+                    connection.execute(table.delete().where(table.c.session_id == store_id))
+                response.delete_cookie(app.config['SESSION_COOKIE_NAME'], domain=domain, path=path)
+            return
+        
+        # Rows always expire so purges can remove them, even for browser-session cookies
+        lifetime = app.permanent_session_lifetime
+        expiry = datetime.utcnow() + lifetime
+        stored_expiry = getattr(session, 'stored_expiry', None)
+        needs_refresh = stored_expiry is None or stored_expiry - datetime.utcnow() < lifetime / 2
+        
+        if session.modified or needs_refresh:
+            values = {'data': self.serializer.dumps(dict(session)), 'expiry': expiry}
+            with db.engine.begin() as connection:
+                updated = connection.execute(
+                    table.update().where(table.c.session_id == store_id).values(**values)
+                ).rowcount
+                if not updated:
+                    connection.execute(table.insert().values(session_id=store_id, **values))
+            
+            session_id = session.sid
+            if self.use_signer:
+                session_id = self._get_signer(app).sign(want_bytes(session.sid)).decode()
+            
+            response.set_cookie(
+                app.config['SESSION_COOKIE_NAME'],
+                session_id,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+        
+        self._maybe_purge()
+    
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge < self.purge_interval:
+            return
+        if not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = time.monotonic()
+            purge_expired_sessions(self.purge_batch_size)
+        except Exception as e:
+            logger.warning(f'Session purge failed: {e}')
+        finally:
+            self._purge_lock.release()
+
+def purge_expired_sessions(batch_size=1000):
+    """
+    Delete expired rows from the sessions table in batches.
+    
+    Args:
+        batch_size (int): Rows deleted per statement
+    
+    Returns:
+        int: Number of sessions deleted
+    """
+    table = SessionRecord.__table__
+    deleted = 0
+    
+    while True:
+        expired = db.select(table.c.session_id).where(
+            table.c.expiry <= datetime.utcnow()
+        ).limit(batch_size).scalar_subquery()
+        
+        with db.engine.begin() as connection:
+            count = connection.execute(
+                table.delete().where(table.c.session_id.in_(expired))
+            ).rowcount
+        
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+def init_app(app):
+    """
+    Configure the session store selected by SESSION_TYPE.
+    
+    'cookie' keeps Flask's built-in signed-cookie sessions, which need no
+    server-side storage. 'sqlalchemy' uses SqlAlchemySessionInterface. Other
+    types are handled by Flask-Session, with 'redis' connecting to
+    SESSION_REDIS_URL.
+    """
+    session_type = app.config.get('SESSION_TYPE', 'filesystem')
+    if session_type not in SESSION_TYPES:
+        raise ValueError(f'Unknown SESSION_TYPE: {session_type}')
+    
+    if session_type == 'cookie':
+        return
+    
+    if session_type == 'sqlalchemy':
+        app.session_interface = SqlAlchemySessionInterface(app)
+        return
+    
+    if session_type == 'redis' and not app.config.get('SESSION_REDIS'):
+        import redis
+        app.config['SESSION_REDIS'] = redis.from_url(app.config['SESSION_REDIS_URL'])
+    
+    Session(app)
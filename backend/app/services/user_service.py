@@ -0,0 +1,48 @@
+"""
+User service for HomelabWiki.
+Per-process cache of user snapshots for the Flask-Login user loader.
+"""
+
+from sqlalchemy import event
+from app import db
+from app.models.user import User
+from app.services.cache_service import TTLCache
+
+# User snapshots keyed by user ID, dropped whenever the user row changes
+user_cache = TTLCache(ttl=30, maxsize=4096)
+
+def init_app(app):
+    """Configure the user cache from application settings."""
+    user_cache.configure(
+        ttl=app.config.get('USER_CACHE_TTL', 30),
+        maxsize=app.config.get('USER_CACHE_SIZE', 4096)
+    )
+
+def load_user(user_id):
+    """
+    Get an immutable snapshot of a user, querying the database only on a cache miss.
+    
+    Args:
+        user_id (int): ID of the user to load
+    
+    Returns:
+        UserSnapshot: Cached user, or None if no such user exists
+    """
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = user.snapshot()
+        user_cache.set(user_id, snapshot)
+    return snapshot
+
+def invalidate_user(user_id):
+    """Drop a cached user so the next request reloads it."""
+    user_cache.invalidate(user_id)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    """Drop the cached snapshot when a user is changed, e.g. by update_from_ldap or update_last_login."""
+    invalidate_user(target.id)
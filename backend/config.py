@@ -23,6 +23,16 @@ class Config:
     LDAP_PORT = int(os.environ.get('LDAP_PORT') or '389')
     LDAP_USE_SSL = os.environ.get('LDAP_USE_SSL', 'false').lower() == 'true'
     LDAP_USE_TLS = os.environ.get('LDAP_USE_TLS', 'true').lower() == 'true'
+    LDAP_BACKEND = os.environ.get('LDAP_BACKEND') or 'ldap3'  # ldap3, python-ldap
+    LDAP_CONNECT_TIMEOUT = int(os.environ.get('LDAP_CONNECT_TIMEOUT') or '5')  # Seconds
+    LDAP_OPERATION_TIMEOUT = int(os.environ.get('LDAP_OPERATION_TIMEOUT') or '10')  # Seconds
+    LDAP_POOL_SIZE = int(os.environ.get('LDAP_POOL_SIZE') or '4')  # Service-account connections per worker
+    LDAP_POOL_MAX_IDLE = int(os.environ.get('LDAP_POOL_MAX_IDLE') or '300')  # Seconds before an idle connection is dropped
+    LDAP_POOL_PROBE_AFTER = int(os.environ.get('LDAP_POOL_PROBE_AFTER') or '30')  # Seconds idle before reuse is checked with the server
+    LDAP_POOL_TIMEOUT = int(os.environ.get('LDAP_POOL_TIMEOUT') or '10')  # Seconds to wait for a free connection
+    LDAP_CACHE_TTL = int(os.environ.get('LDAP_CACHE_TTL') or '300')  # Seconds user and group lookups are cached
+    LDAP_CACHE_SIZE = int(os.environ.get('LDAP_CACHE_SIZE') or '1024')  # Cached users per worker
+    LDAP_NESTED_GROUPS = os.environ.get('LDAP_NESTED_GROUPS', 'false').lower() == 'true'  # Resolve nested AD groups
     
     # LDAP Bind Configuration
     LDAP_BASE_DN = os.environ.get('LDAP_BASE_DN') or 'DC=yourdomain,DC=local'
@@ -45,10 +55,34 @@ class Config:
     # File Upload Configuration
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or '/app/uploads'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or str(16 * 1024 * 1024))  # 16MB default
+    FILE_STATS_CACHE_TTL = int(os.environ.get('FILE_STATS_CACHE_TTL') or '60')  # Seconds
+    THUMBNAIL_CACHE_DIR = os.environ.get('THUMBNAIL_CACHE_DIR') or '/app/data/thumbnails'
+    THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES') or str(256 * 1024 * 1024))  # 256MB default
+    THUMBNAIL_SIZES = (64, 128, 200, 400, 800)  # Requested sizes round up to the next bucket
+    THUMBNAIL_MAX_AGE = int(os.environ.get('THUMBNAIL_MAX_AGE') or str(7 * 24 * 3600))  # Seconds
+    
+    # Server-side Markdown Rendering
+    RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR') or '/app/data/rendered'
+    RENDER_CACHE_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MAX_BYTES') or str(64 * 1024 * 1024))  # 64MB default
+    RENDER_MARKDOWN_EXTENSIONS = [
+        'extra', 'toc', 'sane_lists',
+        'pymdownx.tasklist', 'pymdownx.tilde', 'pymdownx.magiclink',
+        'mdx_math'
+    ]
+    RENDER_MARKDOWN_EXTENSION_CONFIGS = {
+        'mdx_math': {'enable_dollar_delimiter': True}
+    }
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'zip', 'tar', 'gz', 'md'}
     
+    # User Cache Configuration
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or '30')  # Seconds a loaded user is reused
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or '4096')
+    
     # Session Configuration
-    SESSION_TYPE = 'filesystem'
+    SESSION_TYPE = os.environ.get('SESSION_TYPE') or 'filesystem'  # filesystem, sqlalchemy, redis, cookie
+    SESSION_REDIS_URL = os.environ.get('SESSION_REDIS_URL') or 'redis://localhost:6379/0'
+    SESSION_PURGE_INTERVAL = int(os.environ.get('SESSION_PURGE_INTERVAL') or '300')  # Seconds between expired-session purges
+    SESSION_PURGE_BATCH_SIZE = int(os.environ.get('SESSION_PURGE_BATCH_SIZE') or '1000')
     SESSION_PERMANENT = False
     PERMANENT_SESSION_LIFETIME = timedelta(hours=8)
     
@@ -60,15 +94,42 @@ class Config:
     WIKI_TITLE = os.environ.get('WIKI_TITLE') or 'HomelabWiki'
     WIKI_DESCRIPTION = os.environ.get('WIKI_DESCRIPTION') or 'Knowledge Base for Homelab Environment'
     PAGINATION_PER_PAGE = int(os.environ.get('PAGINATION_PER_PAGE') or '20')
+    PAGINATION_MAX_PER_PAGE = int(os.environ.get('PAGINATION_MAX_PER_PAGE') or '100')
+    
+    # Per-request SQL query budget; 0 disables counting
+    QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET') or '0')
     
     # Search Configuration
     ELASTICSEARCH_URL = os.environ.get('ELASTICSEARCH_URL')
     ENABLE_FULL_TEXT_SEARCH = os.environ.get('ENABLE_FULL_TEXT_SEARCH', 'true').lower() == 'true'
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'  # auto, whoosh, elasticsearch, postgres
+    SEARCH_INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR') or '/app/data/search_index'
+    SEARCH_INDEX_NAME = os.environ.get('SEARCH_INDEX_NAME') or 'homelab-wiki-pages'
+    SEARCH_REQUEST_TIMEOUT = int(os.environ.get('SEARCH_REQUEST_TIMEOUT') or '10')
+    SEARCH_BULK_CHUNK_SIZE = int(os.environ.get('SEARCH_BULK_CHUNK_SIZE') or '500')
+    SEARCH_WRITE_BEHIND = os.environ.get('SEARCH_WRITE_BEHIND', 'true').lower() == 'true'
+    SEARCH_MAX_MATCHES = int(os.environ.get('SEARCH_MAX_MATCHES') or '1000')  # Best-ranked pages a search filter keeps
+    SEARCH_SUGGESTION_INDEX = os.environ.get('SEARCH_SUGGESTION_INDEX', 'true').lower() == 'true'
+    SEARCH_SUGGESTION_TTL = int(os.environ.get('SEARCH_SUGGESTION_TTL') or '60')  # Seconds before reloading
+    
+    # Background Job Configuration
+    JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR') or 'process'  # process, thread, inline
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or '2')  # Pool size per server worker
+    JOB_DIR = os.environ.get('JOB_DIR') or '/app/data/jobs'
+    JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL') or '3600')  # Seconds results are kept
+    JOB_RUN_TIMEOUT = int(os.environ.get('JOB_RUN_TIMEOUT') or '30')  # Seconds a request waits on a thumbnail or PDF
+    
+    # Export Configuration
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or '500')  # Pages fetched per query
+    EXPORT_TOMBSTONE_DAYS = int(os.environ.get('EXPORT_TOMBSTONE_DAYS') or '90')  # Oldest usable ?since= watermark
+    EXPORT_WAIT_TIMEOUT = int(os.environ.get('EXPORT_WAIT_TIMEOUT') or '60')  # Seconds GET waits before answering 202
     
     # Backup Configuration
     BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER') or '/app/backups'
     AUTO_BACKUP_ENABLED = os.environ.get('AUTO_BACKUP_ENABLED', 'true').lower() == 'true'
     BACKUP_RETENTION_DAYS = int(os.environ.get('BACKUP_RETENTION_DAYS') or '30')
+    BACKUP_TIME = os.environ.get('BACKUP_TIME') or '02:00'  # Daily automatic backup time (HH:MM, server local time)
+    BACKUP_COMPRESS_LEVEL = int(os.environ.get('BACKUP_COMPRESS_LEVEL') or '6')  # Gzip level 1-9
 
 class DevelopmentConfig(Config):
     """Development configuration with debug enabled."""
@@ -83,9 +144,16 @@ class DevelopmentConfig(Config):
     # Development database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///dev_homelab_wiki.db'
     
+    # Flag requests with N+1 query patterns
+    QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET') or '15')
+    
     # Development file paths
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or './uploads'
     BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER') or './backups'
+    SEARCH_INDEX_DIR = os.environ.get('SEARCH_INDEX_DIR') or './search_index'
+    THUMBNAIL_CACHE_DIR = os.environ.get('THUMBNAIL_CACHE_DIR') or './thumbnails'
+    RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR') or './rendered'
+    JOB_DIR = os.environ.get('JOB_DIR') or './jobs'
 
 class ProductionConfig(Config):
     """Production configuration with security hardening."""
@@ -130,6 +198,18 @@ class TestingConfig(Config):
     # Disable CSRF for testing
     WTF_CSRF_ENABLED = False
     
+    # Index page changes synchronously so tests see them immediately
+    SEARCH_WRITE_BEHIND = False
+    
+    # Run jobs in the calling thread; pool processes can't see the in-memory database
+    JOB_EXECUTOR = 'inline'
+    
+    # Never schedule backups from tests
+    AUTO_BACKUP_ENABLED = False
+    
+    # Report X-Query-Count so tests can assert list endpoints stay constant
+    QUERY_BUDGET = 15
+    
     # Disable LDAP for testing
     LDAP_SERVER = 'localhost'
     LDAP_PORT = 389
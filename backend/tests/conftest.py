@@ -0,0 +1,62 @@
+"""
+Shared pytest fixtures for the HomelabWiki backend.
+"""
+
+import os
+import tempfile
+import pytest
+
+# Configuration classes read the environment at import time, so point every
+# data directory at a scratch location before the app package is imported
+_data_dir = tempfile.mkdtemp(prefix='homelab-wiki-tests-')
+for _name, _subdir in [
+    ('UPLOAD_FOLDER', 'uploads'),
+    ('BACKUP_FOLDER', 'backups'),
+    ('SEARCH_INDEX_DIR', 'search_index'),
+    ('THUMBNAIL_CACHE_DIR', 'thumbnails'),
+    ('RENDER_CACHE_DIR', 'rendered'),
+    ('JOB_DIR', 'jobs')
+]:
+    os.environ.setdefault(_name, os.path.join(_data_dir, _subdir))
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('SESSION_TYPE', 'cookie')
+
+from app import create_app, db
+from app.models.user import User
+
+@pytest.fixture
+def app():
+    """Application with a fresh in-memory database."""
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def admin(app):
+    """Administrator account."""
+    user = User(username='admin', email='admin@example.com', is_admin=True, can_delete=True)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def admin_client(client, admin):
+    """Test client logged in as the administrator."""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    return client
+
+@pytest.fixture
+def make_page(admin):
+    """Factory creating published pages authored by the administrator."""
+    from app.models.page import Page
+    
+    def make_page(title, content='', **fields):
+        page = Page(title=title, content=content or f'Notes about {title}.', author_id=admin.id, **fields)
+        db.session.add(page)
+        db.session.commit()
+        return page
+    
+    return make_page
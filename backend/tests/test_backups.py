@@ -0,0 +1,148 @@
+"""
+Tests for database and upload backups and their retention.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from app import create_app, db
+from app.services import backup_service
+from app.services.backup_service import SNAPSHOT_NAME_FORMAT, create_backup, list_snapshots, prune_backups
+from config import TestingConfig
+
+def use_folders(app, tmp_path):
+    """Give the app its own upload and backup folders."""
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app.config['BACKUP_FOLDER'] = str(tmp_path / 'backups')
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+    return app.config['UPLOAD_FOLDER'], app.config['BACKUP_FOLDER']
+
+@pytest.fixture
+def folders(app, tmp_path):
+    return use_folders(app, tmp_path)
+
+@pytest.fixture
+def file_app(tmp_path, monkeypatch):
+    """Application on an SQLite file, which unlike :memory: can be backed up."""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'wiki.db'}")
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+def write_upload(upload_dir, relative, content):
+    path = os.path.join(upload_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def write_snapshot(backup_folder, age_days, contents):
+    """Write a completed snapshot of the given age referencing objects for contents."""
+    name = (datetime.utcnow() - timedelta(days=age_days)).strftime(SNAPSHOT_NAME_FORMAT)
+    files = {}
+    for i, content in enumerate(contents):
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = backup_service._object_path(backup_folder, digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        with gzip.open(object_path, 'wb') as f:
+            f.write(content)
+        files[f'file-{i}'] = {'sha256': digest, 'size': len(content), 'mtime_ns': 0}
+    
+    directory = os.path.join(backup_folder, 'snapshots', name)
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump({'name': name, 'uploads': {'files': files}}, f)
+    return name
+
+def stored_objects(backup_folder):
+    return sorted(
+        name.split('.')[0]
+        for _, _, names in os.walk(os.path.join(backup_folder, 'objects')) for name in names
+    )
+
+def test_backup_copies_database_and_deduplicates_uploads(file_app, tmp_path):
+    upload_dir, backup_folder = use_folders(file_app, tmp_path)
+    write_upload(upload_dir, 'ab/cd/first', b'router config')
+    write_upload(upload_dir, 'ef/01/second', b'router config')
+    write_upload(upload_dir, 'ef/02/third', b'switch config')
+    
+    first = create_backup()
+    
+    assert first['uploads'] == {
+        'file_count': 3, 'bytes': 39, 'new_objects': 2, 'new_bytes': 26,
+        'compressed_bytes': first['uploads']['compressed_bytes']
+    }
+    assert stored_objects(backup_folder) == sorted(
+        hashlib.sha256(content).hexdigest() for content in (b'router config', b'switch config')
+    )
+    
+    # The database copy opens as a standalone SQLite database
+    snapshot_dir = os.path.join(backup_folder, 'snapshots', first['name'])
+    restored = tmp_path / 'restored.db'
+    with gzip.open(os.path.join(snapshot_dir, 'database.sqlite3.gz')) as source:
+        restored.write_bytes(source.read())
+    connection = sqlite3.connect(restored)
+    try:
+        tables = {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        connection.close()
+    assert {'pages', 'files', 'users'} <= tables
+    
+    # Unchanged uploads are neither copied nor rehashed; the suffix keeps a
+    # second backup within the same second from reusing the snapshot name
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(backup_service, 'hash_file', lambda path: pytest.fail(f'{path} rehashed'))
+        patch.setattr(backup_service, 'SNAPSHOT_NAME_FORMAT', SNAPSHOT_NAME_FORMAT + '-2')
+        second = create_backup()
+    assert second['uploads']['new_objects'] == 0
+    assert [snapshot['name'] for snapshot in list_snapshots(backup_folder)] == [second['name'], first['name']]
+
+def test_in_memory_database_is_refused(app, folders):
+    with pytest.raises(ValueError, match='In-memory'):
+        create_backup()
+    
+    # The failed run leaves no partial snapshot behind
+    assert os.listdir(os.path.join(folders[1], 'snapshots')) == []
+
+def test_prune_removes_expired_backups_and_their_objects(app, folders):
+    backup_folder = folders[1]
+    newest = write_snapshot(backup_folder, 1, [b'current'])
+    recent = write_snapshot(backup_folder, 10, [b'current', b'recent'])
+    write_snapshot(backup_folder, 40, [b'expired'])
+    write_snapshot(backup_folder, 50, [b'recent', b'older'])
+    os.makedirs(os.path.join(backup_folder, 'snapshots', 'interrupted.partial'))
+    
+    assert prune_backups(retention_days=30) == {'snapshots': 2, 'objects': 2}
+    
+    assert sorted(os.listdir(os.path.join(backup_folder, 'snapshots'))) == sorted([newest, recent])
+    assert stored_objects(backup_folder) == sorted(
+        hashlib.sha256(content).hexdigest() for content in (b'current', b'recent')
+    )
+
+def test_prune_always_keeps_the_newest_backup(app, folders):
+    backup_folder = folders[1]
+    newest = write_snapshot(backup_folder, 60, [b'last'])
+    write_snapshot(backup_folder, 90, [b'first'])
+    
+    result = app.test_cli_runner().invoke(args=['backup', 'prune', '--retention-days', '30'])
+    
+    assert result.exit_code == 0, result.output
+    assert 'Removed 1 backups and 1 upload objects' in result.output
+    assert [snapshot['name'] for snapshot in list_snapshots(backup_folder)] == [newest]
+    assert stored_objects(backup_folder) == [hashlib.sha256(b'last').hexdigest()]
+
+def test_prune_waits_for_a_running_backup(app, folders):
+    backup_folder = folders[1]
+    write_snapshot(backup_folder, 1, [])
+    write_snapshot(backup_folder, 90, [b'old'])
+    
+    with backup_service._backup_lock(backup_folder) as locked:
+        assert locked
+        assert prune_backups(retention_days=30) is None
+    
+    assert len(list_snapshots(backup_folder)) == 2
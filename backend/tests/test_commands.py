@@ -0,0 +1,32 @@
+"""
+Tests for the maintenance CLI commands.
+"""
+
+from datetime import datetime
+from app import db
+from app.models.page import Page
+
+def test_page_backfill_keeps_updated_at(app, make_page):
+    edited = datetime(2024, 3, 1, 12, 30)
+    pages = [make_page(f'Page {i}', f'# Heading {i}\n\n' + 'word ' * 450) for i in range(3)]
+    page_ids = [page.id for page in pages]
+    
+    # Clear the derived fields as on a database that predates them
+    db.session.execute(
+        Page.__table__.update().values(
+            word_count=None, reading_time=None, summary=None, headings=None, updated_at=edited
+        )
+    )
+    db.session.commit()
+    
+    result = app.test_cli_runner().invoke(args=['pages', 'backfill', '--batch-size', '2'])
+    
+    assert result.exit_code == 0, result.output
+    assert 'Backfilled 3 pages' in result.output
+    db.session.expire_all()
+    for page in Page.query.filter(Page.id.in_(page_ids)).order_by(Page.id):
+        assert page.updated_at == edited
+        assert page.word_count == 452
+        assert page.reading_time == 2
+        assert page.headings[0]['text'].startswith('Heading')
+        assert page.summary
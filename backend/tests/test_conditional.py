@@ -0,0 +1,109 @@
+"""
+Tests for ETag revalidation of listing endpoints.
+"""
+
+import io
+from app import db
+from app.models.page import Tag
+
+def revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag}).status_code
+
+def test_page_listing_etag_follows_tags_and_authors(admin, admin_client, make_page):
+    page = make_page('Docker networking')
+    page.add_tag('docker')
+    page.add_tag('network')
+    db.session.commit()
+    
+    response = admin_client.get('/api/pages')
+    etag = response.headers['ETag']
+    assert response.get_json()['pages'][0]['tags'] == ['docker', 'network']
+    assert revalidate(admin_client, '/api/pages', etag) == 304
+    
+    # Deleting a tag changes every page that carried it without touching the pages
+    tag = Tag.query.filter_by(name='network').one()
+    assert admin_client.delete(f'/api/tags/{tag.id}').status_code == 200
+    assert revalidate(admin_client, '/api/pages', etag) == 200
+    
+    etag = admin_client.get('/api/pages').headers['ETag']
+    admin.first_name = 'Ada'
+    db.session.commit()
+    assert revalidate(admin_client, '/api/pages', etag) == 200
+
+def test_file_listing_etag_follows_attached_page(admin_client, make_page):
+    page = make_page('Router config')
+    response = admin_client.post(
+        '/api/files',
+        data={'file': (io.BytesIO(b'interface eth0'), 'router.txt'), 'page_id': str(page.id)},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201
+    
+    etag = admin_client.get('/api/files').headers['ETag']
+    assert revalidate(admin_client, '/api/files', etag) == 304
+    
+    page.title = 'Core router config'
+    db.session.commit()
+    
+    response = admin_client.get('/api/files', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['files'][0]['page']['title'] == 'Core router config'
+
+def test_page_listing_etag_follows_moved_and_renamed_tags(admin_client, make_page):
+    first = make_page('Docker networking')
+    second = make_page('Backup schedule')
+    first.add_tag('docker')
+    second.add_tag('backups')
+    db.session.commit()
+    
+    etag = admin_client.get('/api/pages').headers['ETag']
+    
+    # Swapping tags keeps the number of links and the set of tag ids
+    docker, backups = Tag.query.filter_by(name='docker').one(), Tag.query.filter_by(name='backups').one()
+    first.tags = [backups]
+    second.tags = [docker]
+    db.session.commit()
+    assert revalidate(admin_client, '/api/pages', etag) == 200
+    
+    etag = admin_client.get('/api/pages').headers['ETag']
+    docker.name = 'containers'
+    db.session.commit()
+    response = admin_client.get('/api/pages', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert {page['title']: page['tags'] for page in response.get_json()['pages']}['Backup schedule'] == ['containers']
+
+def test_page_etag_follows_author_and_tags(admin, admin_client, make_page):
+    page = make_page('Docker networking')
+    page.add_tag('docker')
+    db.session.commit()
+    url = f'/api/pages/{page.id}'
+    
+    etag = admin_client.get(url).headers['ETag']
+    assert revalidate(admin_client, url, etag) == 304
+    
+    admin.first_name = 'Ada'
+    db.session.commit()
+    response = admin_client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    
+    etag = response.headers['ETag']
+    Tag.query.filter_by(name='docker').one().name = 'containers'
+    db.session.commit()
+    response = admin_client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['page']['tags'] == ['containers']
+
+def test_file_etag_follows_uploader(admin, admin_client):
+    response = admin_client.post(
+        '/api/files',
+        data={'file': (io.BytesIO(b'interface eth0'), 'router.txt')},
+        content_type='multipart/form-data'
+    )
+    url = f"/api/files/{response.get_json()['file']['id']}"
+    
+    etag = admin_client.get(url).headers['ETag']
+    assert revalidate(admin_client, url, etag) == 304
+    
+    admin.last_name = 'Lovelace'
+    db.session.commit()
+    assert revalidate(admin_client, url, etag) == 200
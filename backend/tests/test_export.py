@@ -0,0 +1,111 @@
+"""
+Tests for the all-pages ZIP export endpoints.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+import pytest
+from app.services import page_service
+from app.services.job_service import job_queue
+
+@pytest.fixture
+def threaded_jobs(app):
+    """Run jobs in a thread pool so a request can stop waiting on one."""
+    job_queue.shutdown()
+    job_queue.executor_type = 'thread'
+    yield job_queue
+    job_queue.shutdown()
+
+def test_export_returns_archive(admin_client, make_page):
+    make_page('Docker networking')
+    
+    response = admin_client.get('/api/pages/export/all')
+    
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert 'manifest.json' in archive.namelist()
+
+def test_slow_export_hands_over_to_polling(app, admin_client, threaded_jobs, monkeypatch):
+    release = threading.Event()
+    
+    def slow_export(include_files, since, manifest, result_path):
+        release.wait(10)
+        with open(result_path, 'wb') as f:
+            f.write(b'archive')
+    
+    monkeypatch.setattr(page_service, 'export_pages_zip', slow_export)
+    app.config['EXPORT_WAIT_TIMEOUT'] = 0
+    
+    response = admin_client.get('/api/pages/export/all')
+    
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data['job']['status'] == 'pending'
+    assert data['status_url'] == f"/api/jobs/{data['job']['id']}"
+    
+    release.set()
+    assert job_queue.wait(data['job']['id'], timeout=10)['status'] == 'finished'
+    assert admin_client.get(data['status_url']).get_json()['job']['status'] == 'finished'
+
+def upload(client, content, filename, page_id):
+    response = client.post(
+        '/api/files',
+        data={'file': (io.BytesIO(content), filename), 'page_id': str(page_id)},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201
+    return response.get_json()['file']['id']
+
+def export_archive(client, query=''):
+    response = client.get(f'/api/pages/export/all{query}')
+    assert response.status_code == 200
+    return zipfile.ZipFile(io.BytesIO(response.data))
+
+def test_export_writes_every_page_across_batches(app, admin_client, make_page):
+    app.config['EXPORT_BATCH_SIZE'] = 2
+    pages = [make_page(f'Page {i}', f'Body of page {i}.') for i in range(5)]
+    make_page('Draft', is_published=False)
+    
+    with export_archive(admin_client) as archive:
+        assert sorted(archive.namelist()) == sorted([f'{page.slug}.md' for page in pages] + ['manifest.json'])
+        assert archive.read(f'{pages[3].slug}.md').decode('utf-8') == pages[3].to_markdown()
+        manifest = json.loads(archive.read('manifest.json'))
+    
+    assert manifest['mode'] == 'full'
+    assert sorted(manifest['pages']) == sorted(page.slug for page in pages)
+    assert manifest['files'] == {}
+
+def test_export_includes_attached_files(app, admin_client, make_page):
+    app.config['EXPORT_BATCH_SIZE'] = 1
+    page = make_page('Rack layout')
+    draft = make_page('Draft', is_published=False)
+    photo = os.urandom(4096)
+    notes_id = upload(admin_client, b'U1 switch\n' * 100, 'notes.txt', page.id)
+    photo_id = upload(admin_client, photo, 'rack.png', page.id)
+    upload(admin_client, b'hidden', 'hidden.txt', draft.id)
+    
+    with export_archive(admin_client) as archive:
+        assert not any(name.startswith('files/') for name in archive.namelist())
+    
+    with export_archive(admin_client, '?include_files=true') as archive:
+        notes_path = f'files/{page.slug}/{notes_id}-notes.txt'
+        photo_path = f'files/{page.slug}/{photo_id}-rack.png'
+        assert sorted(name for name in archive.namelist() if name.startswith('files/')) == [notes_path, photo_path]
+        assert archive.read(photo_path) == photo
+        assert archive.read(notes_path) == b'U1 switch\n' * 100
+        
+        # Already-compressed formats are stored rather than deflated again
+        assert archive.getinfo(photo_path).compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo(notes_path).compress_type == zipfile.ZIP_DEFLATED
+        
+        manifest = json.loads(archive.read('manifest.json'))
+    
+    assert manifest['files'][photo_path] == {
+        'id': photo_id,
+        'sha256': hashlib.sha256(photo).hexdigest(),
+        'size': len(photo)
+    }
@@ -0,0 +1,192 @@
+"""
+Tests for file uploads, deletion and the shared blob store.
+"""
+
+import hashlib
+import io
+import os
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from app import db
+from app.models.file import File
+from app.services import file_service
+
+def upload(client, content, filename='notes.txt', page_id=None):
+    data = {'file': (io.BytesIO(content), filename)}
+    if page_id:
+        data['page_id'] = str(page_id)
+    response = client.post('/api/files', data=data, content_type='multipart/form-data')
+    assert response.status_code == 201, response.get_json()
+    return db.session.get(File, response.get_json()['file']['id'])
+
+def test_deleting_page_removes_blob_shared_by_its_own_files(admin_client, make_page):
+    page = make_page('Router config')
+    first = upload(admin_client, b'interface eth0', page_id=page.id)
+    second = upload(admin_client, b'interface eth0', 'copy.txt', page_id=page.id)
+    assert first.file_path == second.file_path
+    blob = first.get_absolute_path()
+    
+    response = admin_client.delete(f'/api/pages/{page.id}')
+    
+    assert response.status_code == 200
+    assert File.query.count() == 0
+    assert not os.path.exists(blob)
+
+def test_deleting_file_keeps_blob_referenced_elsewhere(admin_client, make_page):
+    page = make_page('Router config')
+    first = upload(admin_client, b'interface eth1', page_id=page.id)
+    second = upload(admin_client, b'interface eth1', 'copy.txt')
+    blob = first.get_absolute_path()
+    
+    assert admin_client.delete(f'/api/files/{first.id}').status_code == 200
+    assert os.path.exists(blob)
+    
+    assert admin_client.delete(f'/api/files/{second.id}').status_code == 200
+    assert not os.path.exists(blob)
+
+def test_rolled_back_delete_keeps_blob(app, admin_client):
+    file = upload(admin_client, b'interface eth2')
+    blob = file.get_absolute_path()
+    
+    db.session.delete(file)
+    db.session.flush()
+    db.session.rollback()
+    
+    assert os.path.exists(blob)
+    assert File.query.count() == 1
+
+def test_thumbnail_is_privately_cacheable(app, admin_client):
+    from PIL import Image
+    
+    image = io.BytesIO()
+    Image.new('RGB', (400, 300), 'navy').save(image, 'PNG')
+    file = upload(admin_client, image.getvalue(), 'rack.png')
+    app.config['THUMBNAIL_MAX_AGE'] = 604800
+    
+    response = admin_client.get(f'/api/files/{file.id}/thumbnail?size=150')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    cache_control = {part.strip() for part in response.headers['Cache-Control'].split(',')}
+    assert cache_control == {'private', 'max-age=604800'}
+    
+    revalidated = admin_client.get(
+        f'/api/files/{file.id}/thumbnail?size=150',
+        headers={'If-None-Match': response.headers['ETag']}
+    )
+    assert revalidated.status_code == 304
+
+def listed_names(client, query):
+    response = client.get(f'/api/files?{query}')
+    assert response.status_code == 200
+    data = response.get_json()
+    return sorted(file['original_filename'] for file in data['files']), data['pagination']['total']
+
+def test_file_type_is_stored_at_upload(admin_client):
+    names = ['diagram.png', 'manual.pdf', 'budget.xlsx', 'notes.md', 'backup.tar', 'report.docx']
+    files = [upload(admin_client, name.encode(), name) for name in names]
+    
+    assert [file.file_type for file in files] == ['image', 'pdf', 'spreadsheet', 'text', 'archive', 'document']
+
+def test_type_and_search_filters_apply_before_pagination(admin_client):
+    for name in ['diagram.png', 'rack-photo.jpg', 'manual.pdf', 'rack-budget.xlsx', 'notes.md', 'rack.tar']:
+        upload(admin_client, name.encode(), name)
+    
+    assert listed_names(admin_client, 'type=image') == (['diagram.png', 'rack-photo.jpg'], 2)
+    assert listed_names(admin_client, 'type=document') == (['manual.pdf', 'notes.md', 'rack-budget.xlsx'], 3)
+    assert listed_names(admin_client, 'search=rack') == (['rack-budget.xlsx', 'rack-photo.jpg', 'rack.tar'], 3)
+    assert listed_names(admin_client, 'type=document&search=rack') == (['rack-budget.xlsx'], 1)
+    
+    # The total counts matching files, not just the page returned
+    names, total = listed_names(admin_client, 'type=document&per_page=1')
+    assert len(names) == 1 and total == 3
+
+def test_filters_are_not_an_id_list(admin_client):
+    upload(admin_client, b'png', 'diagram.png')
+    statements = []
+    
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', record_statement)
+    try:
+        response = admin_client.get('/api/files?type=image&search=diagram')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record_statement)
+    
+    assert response.status_code == 200
+    listing = [statement for statement in statements if 'files.file_type IN' in statement]
+    assert listing and all('lower(files.original_filename) LIKE' in statement for statement in listing)
+    assert not any('files.id IN' in statement for statement in statements)
+
+def test_file_backfill_sets_type_and_keeps_updated_at(app, admin_client):
+    uploaded = datetime(2024, 3, 1, 12, 30)
+    file_ids = [upload(admin_client, name.encode(), name).id for name in ['diagram.png', 'manual.pdf']]
+    db.session.execute(File.__table__.update().values(file_type=None, updated_at=uploaded))
+    db.session.commit()
+    
+    result = app.test_cli_runner().invoke(args=['files', 'backfill', '--batch-size', '1'])
+    
+    assert result.exit_code == 0, result.output
+    db.session.expire_all()
+    files = File.query.filter(File.id.in_(file_ids)).order_by(File.id).all()
+    assert [file.file_type for file in files] == ['image', 'pdf']
+    assert [file.updated_at for file in files] == [uploaded, uploaded]
+
+def spool_files(app):
+    upload_dir = app.config['UPLOAD_FOLDER']
+    return [
+        os.path.join(root, name)
+        for root, _, names in os.walk(upload_dir) for name in names if name.endswith('.part')
+    ]
+
+def test_upload_is_hashed_and_stored_in_one_pass(app, admin_client):
+    content = os.urandom(3 * 65536 + 17)
+    
+    file = upload(admin_client, content, 'disk.img.gz')
+    
+    digest = hashlib.sha256(content).hexdigest()
+    assert file.file_hash == digest
+    assert file.file_size == len(content)
+    assert file.file_path == file_service.blob_path(app.config['UPLOAD_FOLDER'], digest)
+    with open(file.file_path, 'rb') as f:
+        assert f.read() == content
+    assert spool_files(app) == []
+
+def test_oversized_upload_is_rejected_without_leftovers(app, admin_client):
+    app.config['MAX_CONTENT_LENGTH'] = 4096
+    
+    response = admin_client.post(
+        '/api/files',
+        data={'file': (io.BytesIO(b'x' * 8192), 'big.txt')},
+        content_type='multipart/form-data'
+    )
+    
+    assert response.status_code == 413
+    assert File.query.count() == 0
+    assert spool_files(app) == []
+
+def test_spool_enforces_the_limit_while_streaming(app):
+    # Chunked uploads carry no Content-Length, so the limit is enforced as bytes arrive
+    app.config['MAX_CONTENT_LENGTH'] = 100000
+    stream = FileStorage(io.BytesIO(b'x' * 200000), 'big.txt')
+    
+    with pytest.raises(RequestEntityTooLarge):
+        file_service.store_upload(stream, app.config['UPLOAD_FOLDER'])
+    
+    assert spool_files(app) == []
+
+def test_spool_discards_uncommitted_data(app):
+    spool = file_service.UploadSpool(app.config['UPLOAD_FOLDER'], max_size=10)
+    spool.write(b'0123456789')
+    
+    with pytest.raises(RequestEntityTooLarge):
+        spool.write(b'!')
+    
+    assert spool.size == 11
+    assert spool.hexdigest == hashlib.sha256(b'0123456789').hexdigest()
+    spool.discard()
+    assert not os.path.exists(spool.name)
@@ -0,0 +1,87 @@
+"""
+Tests for the job pool: request timeouts and worker processes that die.
+"""
+
+import io
+import os
+import threading
+import pytest
+from app.services import file_service, page_service
+from app.services.job_service import job_queue
+
+def exit_worker(*args):
+    """Job that kills its pool process, as the OOM killer would."""
+    os._exit(1)
+
+def write_result(result_path):
+    with open(result_path, 'w') as f:
+        f.write('done')
+    return 'done'
+
+@pytest.fixture
+def pool(app):
+    """Switch the job queue to a pool of the given type for one test."""
+    def use(executor_type):
+        job_queue.shutdown()
+        job_queue.executor_type = executor_type
+        return job_queue
+    
+    yield use
+    job_queue.shutdown()
+    job_queue.executor_type = app.config['JOB_EXECUTOR']
+    job_queue.run_timeout = app.config['JOB_RUN_TIMEOUT']
+
+@pytest.fixture
+def stalled():
+    """Event that stalled job functions wait on; set on teardown so the pool can stop."""
+    release = threading.Event()
+    yield release
+    release.set()
+
+def test_slow_pdf_export_times_out(admin_client, make_page, pool, stalled, monkeypatch):
+    pool('thread').run_timeout = 0.1
+    monkeypatch.setattr(page_service, 'render_page_pdf', lambda page_id: stalled.wait(10))
+    page = make_page('Docker networking')
+    
+    response = admin_client.get(f'/api/pages/{page.id}/export/pdf')
+    
+    assert response.status_code == 504
+    assert response.get_json() == {'error': 'PDF export timed out'}
+
+def test_slow_thumbnail_times_out(admin_client, pool, stalled, monkeypatch):
+    pool('thread').run_timeout = 0.1
+    monkeypatch.setattr(file_service, 'render_thumbnail', lambda *args: stalled.wait(10))
+    response = admin_client.post(
+        '/api/files',
+        data={'file': (io.BytesIO(b'not really a png'), 'rack.png')},
+        content_type='multipart/form-data'
+    )
+    
+    response = admin_client.get(f"/api/files/{response.get_json()['file']['id']}/thumbnail")
+    
+    assert response.status_code == 504
+    assert response.get_json() == {'error': 'Thumbnail generation timed out'}
+
+def test_dead_worker_fails_the_job_and_the_pool_recovers(pool):
+    queue = pool('process')
+    
+    job = queue.submit('crash', exit_worker)
+    
+    job = queue.wait(job['id'], timeout=60, interval=0.05)
+    assert job['status'] == 'failed'
+    assert job['error'] == 'The worker process running the job exited unexpectedly'
+    
+    # The broken pool is replaced on the next submission
+    job = queue.wait(queue.submit('retry', write_result)['id'], timeout=60, interval=0.05)
+    assert job['status'] == 'finished'
+    assert job['result'] == 'done'
+
+def test_dead_worker_answers_pdf_export_with_503(admin_client, make_page, pool, monkeypatch):
+    pool('process').run_timeout = 60
+    monkeypatch.setattr(page_service, 'render_page_pdf', exit_worker)
+    page = make_page('Docker networking')
+    
+    response = admin_client.get(f'/api/pages/{page.id}/export/pdf')
+    
+    assert response.status_code == 503
+    assert response.get_json() == {'error': 'PDF export is temporarily unavailable'}
@@ -0,0 +1,206 @@
+"""
+Tests for the pooled ldap3 authenticator against an in-memory mock directory.
+"""
+
+import threading
+import time
+import ldap3
+import pytest
+from ldap3.core.exceptions import LDAPSessionTerminatedByServerError
+from app.auth.ldap_auth import Ldap3Authenticator
+
+BASE_DN = 'DC=homelab,DC=local'
+BIND_DN = f'CN=wikisvc,CN=Users,{BASE_DN}'
+BIND_PASSWORD = 'service-secret'
+USER_COUNT = 8
+
+def user_dn(i):
+    return f'CN=User {i},CN=Users,{BASE_DN}'
+
+DIRECTORY = {
+    BIND_DN: {'objectClass': 'user', 'sAMAccountName': 'wikisvc', 'userPassword': BIND_PASSWORD},
+    **{
+        user_dn(i): {
+            'objectClass': 'user',
+            'sAMAccountName': f'user{i}',
+            'givenName': 'User',
+            'sn': str(i),
+            'mail': f'user{i}@homelab.local',
+            'memberOf': [f'CN=Wiki Editors,CN=Groups,{BASE_DN}'],
+            'userPassword': f'password{i}'
+        }
+        for i in range(USER_COUNT)
+    }
+}
+
+class MockDirectoryAuthenticator(Ldap3Authenticator):
+    """Ldap3Authenticator whose connections talk to ldap3's MOCK_SYNC strategy."""
+    
+    def init_app(self, app):
+        super().init_app(app)
+        self.ldap_server = ldap3.Server('mock-dc')
+        self.opened = []
+    
+    def _get_ldap_connection(self):
+        connection = ldap3.Connection(
+            self.ldap_server,
+            client_strategy=ldap3.MOCK_SYNC,
+            raise_exceptions=True
+        )
+        for dn, attributes in DIRECTORY.items():
+            connection.strategy.add_entry(dn, attributes)
+        connection.open()
+        self.opened.append(connection)
+        return connection
+    
+    def _bind_user(self, connection, user_dn, password):
+        # Hold the connection briefly so concurrent logins overlap
+        time.sleep(0.002)
+        return super()._bind_user(connection, user_dn, password)
+
+class HandoutTracker:
+    """Wraps a pool to record which connections are checked out at once."""
+    
+    def __init__(self, pool):
+        self.in_use = set()
+        self.max_in_use = 0
+        self.double_handouts = 0
+        self._lock = threading.Lock()
+        
+        acquire, release, discard = pool.acquire, pool.release, pool.discard
+        
+        def tracked_acquire():
+            connection = acquire()
+            with self._lock:
+                if id(connection) in self.in_use:
+                    self.double_handouts += 1
+                self.in_use.add(id(connection))
+                self.max_in_use = max(self.max_in_use, len(self.in_use))
+            return connection
+        
+        def checked_in(original):
+            def check_in(connection):
+                with self._lock:
+                    self.in_use.discard(id(connection))
+                original(connection)
+            return check_in
+        
+        pool.acquire = tracked_acquire
+        pool.release = checked_in(release)
+        pool.discard = checked_in(discard)
+
+@pytest.fixture
+def authenticator(app):
+    app.config.update(
+        LDAP_BIND_DN=BIND_DN,
+        LDAP_BIND_PASSWORD=BIND_PASSWORD,
+        LDAP_BASE_DN=BASE_DN,
+        LDAP_USER_SEARCH_BASE=f'CN=Users,{BASE_DN}',
+        LDAP_GROUP_SEARCH_BASE=f'CN=Groups,{BASE_DN}',
+        LDAP_POOL_SIZE=3,
+        LDAP_POOL_TIMEOUT=10
+    )
+    return MockDirectoryAuthenticator(app)
+
+@pytest.fixture
+def anonymous_authenticator(app, authenticator):
+    app.config.update(LDAP_BIND_DN=None, LDAP_BIND_PASSWORD=None)
+    return MockDirectoryAuthenticator(app)
+
+def test_anonymous_mode_returns_connection_to_anonymous_bind(anonymous_authenticator):
+    authenticator = anonymous_authenticator
+    
+    assert authenticator.authenticate('user1', 'password1')['username'] == 'user1'
+    connection = authenticator.opened[0]
+    assert connection.bound
+    assert connection.user is None and connection.password is None
+    
+    # A failed login restores the anonymous bind too, so the connection is kept
+    assert authenticator.authenticate('user2', 'wrong') is None
+    assert connection.user is None and connection.password is None
+    assert authenticator.authenticate('user3', 'password3')['username'] == 'user3'
+    
+    stats = authenticator.pool.stats()
+    assert len(authenticator.opened) == 1
+    assert stats['discarded'] == 0
+    assert stats['hits'] == 2
+
+def test_authenticate_against_mock_directory(authenticator):
+    user = authenticator.authenticate('user1', 'password1')
+    
+    assert user['username'] == 'user1'
+    assert user['email'] == 'user1@homelab.local'
+    assert user['groups'] == ['Wiki Editors']
+    assert authenticator.authenticate('user1', 'wrong') is None
+
+def test_concurrent_logins_share_a_bounded_pool(authenticator):
+    tracker = HandoutTracker(authenticator.pool)
+    results = []
+    errors = []
+    start = threading.Barrier(24)
+    
+    def login(worker):
+        start.wait()
+        for attempt in range(5):
+            i = (worker + attempt) % USER_COUNT
+            password = f'password{i}' if attempt != 4 else 'wrong'
+            try:
+                user = authenticator.authenticate(f'user{i}', password)
+                results.append((attempt != 4, user is not None and user['username'] == f'user{i}'))
+            except Exception as e:
+                errors.append(e)
+    
+    threads = [threading.Thread(target=login, args=(worker,)) for worker in range(24)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    assert len(results) == 24 * 5
+    assert all(expected == authenticated for expected, authenticated in results)
+    
+    assert tracker.double_handouts == 0
+    assert 1 < tracker.max_in_use <= 3
+    assert len(authenticator.opened) <= 3
+    
+    stats = authenticator.pool.stats()
+    assert stats['hits'] + stats['misses'] == 24 * 5
+    assert stats['idle'] == len(authenticator.opened)
+
+def drop_connection(connection):
+    """Make a connection fail like one the server closed while it sat idle."""
+    def terminated(*args, **kwargs):
+        raise LDAPSessionTerminatedByServerError('session terminated by server')
+    
+    connection.search = terminated
+    connection.rebind = terminated
+
+def test_idle_connection_is_probed_before_reuse(app, authenticator):
+    authenticator.pool.probe_after = 0
+    assert authenticator.authenticate('user1', 'password1')
+    assert authenticator.authenticate('user2', 'password2')
+    assert len(authenticator.opened) == 1
+    
+    # Still bound and open as far as the client can tell
+    stale = authenticator.opened[0]
+    drop_connection(stale)
+    assert stale.bound and not stale.closed
+    
+    assert authenticator.authenticate('user3', 'password3')['username'] == 'user3'
+    
+    stats = authenticator.pool.stats()
+    assert len(authenticator.opened) == 2
+    assert stats['discarded'] == 1
+    assert stats['reconnects'] == 0
+
+def test_dropped_connection_is_replaced_and_retried(authenticator):
+    assert authenticator.authenticate('user1', 'password1')
+    drop_connection(authenticator.opened[0])
+    
+    # Reused without a probe, fails mid-login and is retried on a new connection
+    assert authenticator.authenticate('user2', 'password2')['username'] == 'user2'
+    
+    stats = authenticator.pool.stats()
+    assert len(authenticator.opened) == 2
+    assert stats['reconnects'] == 1
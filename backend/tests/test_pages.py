@@ -0,0 +1,90 @@
+"""
+Tests for derived page fields and the columns page listings load.
+"""
+
+import re
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models.page import Page
+
+CONTENT = '# Setup\n\nInstall the **agent** on every node.\n\n## Firewall\n\nOpen port 9100.'
+
+def stored_fields(page_id):
+    table = Page.__table__
+    row = db.session.execute(
+        db.select(table.c.word_count, table.c.reading_time, table.c.summary, table.c.headings)
+        .where(table.c.id == page_id)
+    ).one()
+    return row._asdict()
+
+def test_derived_fields_are_stored_on_insert(admin_client):
+    response = admin_client.post('/api/pages', json={'title': 'Node exporter', 'content': CONTENT})
+    assert response.status_code == 201
+    
+    assert stored_fields(response.get_json()['page']['id']) == {
+        'word_count': 11,
+        'reading_time': 1,
+        'summary': 'Setup Install the agent on every node.  Firewall Open port 9100.',
+        'headings': [
+            {'level': 1, 'text': 'Setup', 'id': 'setup'},
+            {'level': 2, 'text': 'Firewall', 'id': 'firewall'}
+        ]
+    }
+
+def test_derived_fields_follow_content_edits(admin_client, make_page):
+    page = make_page('Node exporter', CONTENT)
+    
+    response = admin_client.put(f'/api/pages/{page.id}', json={'content': '# Removed\n\n' + 'word ' * 400})
+    assert response.status_code == 200
+    
+    fields = stored_fields(page.id)
+    assert fields['word_count'] == 401
+    assert fields['reading_time'] == 2
+    assert fields['summary'].startswith('Removed word word')
+    assert fields['headings'] == [{'level': 1, 'text': 'Removed', 'id': 'removed'}]
+
+def test_title_edits_keep_derived_fields(admin_client, make_page, monkeypatch):
+    page = make_page('Node exporter', CONTENT)
+    monkeypatch.setattr(Page, 'get_headings', lambda self: pytest.fail('headings recomputed'))
+    
+    response = admin_client.put(f'/api/pages/{page.id}', json={'title': 'Prometheus node exporter'})
+    
+    assert response.status_code == 200
+    assert stored_fields(page.id)['word_count'] == 11
+
+def test_serialization_reads_stored_fields(admin_client, make_page, monkeypatch):
+    make_page('Node exporter', CONTENT)
+    for method in ('calculate_word_count', 'extract_summary', 'get_headings'):
+        monkeypatch.setattr(Page, method, lambda self, *args, method=method: pytest.fail(f'{method} called'))
+    
+    response = admin_client.get('/api/pages')
+    
+    assert response.status_code == 200
+    page, = response.get_json()['pages']
+    assert page['word_count'] == 11
+    assert page['summary'] == 'Setup Install the agent on every node.  Firewall Open port 9100.'
+
+@pytest.mark.parametrize('method, url, body', [
+    ('get', '/api/pages', None),
+    ('get', '/api/search/pages?q=node', None),
+    ('get', '/api/search?q=node', None),
+    ('post', '/api/search/advanced', {'title': 'node'})
+])
+def test_listings_do_not_select_content(admin_client, make_page, method, url, body):
+    make_page('Node exporter', CONTENT)
+    selects = []
+    
+    def record_select(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('SELECT'):
+            selects.append(re.split(r'\sFROM\s', statement, 1)[0])
+    
+    event.listen(db.engine, 'before_cursor_execute', record_select)
+    try:
+        response = getattr(admin_client, method)(url, json=body)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record_select)
+    
+    assert response.status_code == 200
+    assert any('pages.title' in columns for columns in selects)
+    assert not any('pages.content' in columns for columns in selects)
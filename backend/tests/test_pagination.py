@@ -0,0 +1,94 @@
+"""
+Tests for keyset (cursor) pagination of page and file listings.
+"""
+
+import io
+from datetime import datetime, timedelta
+import pytest
+
+BASE_TIME = datetime(2026, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def pages(make_page):
+    """Seven pages, three of them sharing one timestamp to exercise the id tie-breaker."""
+    offsets = [0, 1, 2, 2, 2, 3, 4]
+    return [
+        make_page(f'Page {i}', updated_at=BASE_TIME + timedelta(minutes=offset))
+        for i, offset in enumerate(offsets)
+    ]
+
+def walk(client, url):
+    """Follow next_cursor from the first page, returning the ids of every page fetched."""
+    pages, cursor = [], ''
+    while cursor is not None:
+        response = client.get(f'{url}&cursor={cursor}')
+        assert response.status_code == 200
+        data = response.get_json()
+        pages.append([item['id'] for item in data['pages']])
+        cursor = data['pagination']['next_cursor']
+    return pages
+
+def test_cursor_walk_returns_every_page_once(admin_client, pages):
+    expected = [page.id for page in sorted(pages, key=lambda page: (page.updated_at, page.id), reverse=True)]
+    
+    batches = walk(admin_client, '/api/pages?per_page=2')
+    
+    assert [len(batch) for batch in batches] == [2, 2, 2, 1]
+    assert [page_id for batch in batches for page_id in batch] == expected
+
+def test_cursor_matches_offset_order(admin_client, pages):
+    offset_ids = admin_client.get('/api/pages?per_page=10').get_json()['pages']
+    
+    cursor_ids = walk(admin_client, '/api/pages?per_page=10')
+    
+    assert cursor_ids == [[page['id'] for page in offset_ids]]
+
+def test_new_pages_do_not_shift_a_cursor_walk(admin_client, pages, make_page):
+    first = admin_client.get('/api/pages?per_page=3&cursor=').get_json()
+    make_page('Newest page', updated_at=BASE_TIME + timedelta(hours=1))
+    
+    second = admin_client.get(f"/api/pages?per_page=3&cursor={first['pagination']['next_cursor']}").get_json()
+    
+    seen = [page['id'] for page in first['pages'] + second['pages']]
+    assert len(set(seen)) == 6
+    assert 'Newest page' not in [page['title'] for page in second['pages']]
+
+def test_cursor_response_shape(admin_client, pages):
+    data = admin_client.get('/api/pages?per_page=5&cursor=&include_total=false').get_json()
+    
+    assert data['pagination'] == {
+        'per_page': 5,
+        'total': None,
+        'cursor': '',
+        'next_cursor': data['pagination']['next_cursor'],
+        'has_next': True
+    }
+    
+    last = admin_client.get(f"/api/pages?per_page=5&cursor={data['pagination']['next_cursor']}").get_json()
+    assert last['pagination']['total'] == 7
+    assert last['pagination']['has_next'] is False
+    assert last['pagination']['next_cursor'] is None
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'WzEsMl0', 'WyJub3QgYSBkYXRlIiwgMV0'])
+def test_invalid_cursor_is_rejected(admin_client, cursor):
+    for url in ('/api/pages', '/api/files'):
+        response = admin_client.get(f'{url}?cursor={cursor}')
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'Invalid cursor'}
+
+def test_file_listing_cursor_walk(admin_client):
+    for i in range(5):
+        response = admin_client.post(
+            '/api/files',
+            data={'file': (io.BytesIO(f'file {i}'.encode()), f'file-{i}.txt')},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 201
+    
+    ids, cursor = [], ''
+    while cursor is not None:
+        data = admin_client.get(f'/api/files?per_page=2&cursor={cursor}').get_json()
+        ids.extend(item['id'] for item in data['files'])
+        cursor = data['pagination']['next_cursor']
+    
+    assert ids == [5, 4, 3, 2, 1]
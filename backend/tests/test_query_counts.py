@@ -0,0 +1,57 @@
+"""
+Tests that listing endpoints issue a constant number of queries.
+
+Each listing is fetched with N and then 2N rows; a per-row (N+1) query shows
+up as a higher X-Query-Count on the larger listing.
+"""
+
+import pytest
+from app import db
+from app.models.file import File
+from app.models.page import Page, Tag
+from app.models.user import User
+
+def seed(count, start):
+    """Add pages with their own author, two tags and an attached file."""
+    for i in range(start, start + count):
+        author = User(username=f'author{i}', email=f'author{i}@example.com', first_name=f'Author {i}')
+        page = Page(title=f'Page {i}', content=f'# Page {i}\n\nSome notes.', author=author)
+        page.tags = [Tag(name=f'topic-{i}'), Tag(name=f'area-{i}')]
+        db.session.add(page)
+        db.session.add(File(
+            filename=f'file{i}.txt',
+            original_filename=f'file{i}.txt',
+            file_path=f'file{i}.txt',
+            file_size=10,
+            mime_type='text/plain',
+            file_type='text',
+            uploader=author,
+            page=page
+        ))
+    db.session.commit()
+
+def query_count(client, url, rows_key, expected_rows):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert len(response.get_json()[rows_key]) == expected_rows
+    return int(response.headers['X-Query-Count'])
+
+@pytest.mark.parametrize('url, rows_key, rows_per_seed', [
+    ('/api/pages?per_page=50', 'pages', 1),
+    ('/api/files?per_page=50', 'files', 1),
+    ('/api/tags', 'tags', 2)
+])
+def test_listing_query_count_is_constant(app, admin_client, url, rows_key, rows_per_seed):
+    budget = app.config['QUERY_BUDGET']
+    rows = 5
+    
+    seed(rows, start=0)
+    # The first request also loads the logged-in user into the user cache
+    admin_client.get(url)
+    small = query_count(admin_client, url, rows_key, rows * rows_per_seed)
+    
+    seed(rows, start=rows)
+    large = query_count(admin_client, url, rows_key, 2 * rows * rows_per_seed)
+    
+    assert small == large
+    assert large <= budget
@@ -0,0 +1,184 @@
+"""
+Tests for the Elasticsearch backend and the write-behind queue, run against a
+stand-in transport node that records every request.
+"""
+
+import json
+import threading
+import time
+import pytest
+from elastic_transport import ApiResponseMeta, BaseNode, HttpHeaders
+from elastic_transport._node import NodeApiResponse
+from elasticsearch import Elasticsearch
+from app.services.search_service import ElasticsearchBackend, WriteBehindQueue
+
+INDEX = 'test-pages'
+
+class FakeNode(BaseNode):
+    """Transport node that answers like Elasticsearch and records requests."""
+    
+    requests = []
+    failing_ids = set()
+    bulk_gate = None
+    
+    def perform_request(self, method, target, body=None, headers=None, request_timeout=None):
+        path = target.split('?')[0]
+        FakeNode.requests.append((method, path, body))
+        
+        if path == '/_bulk':
+            if FakeNode.bulk_gate is not None:
+                gate, FakeNode.bulk_gate = FakeNode.bulk_gate, None
+                gate.wait(5)
+            return self._respond(200, self._bulk_response(body))
+        if path.endswith('/_search'):
+            return self._respond(200, {'hits': {'total': {'value': 0}, 'hits': []}})
+        if method == 'HEAD':
+            return self._respond(200, None)
+        return self._respond(200, {'acknowledged': True})
+    
+    def _bulk_response(self, body):
+        items = []
+        for line in body.decode('utf-8').splitlines():
+            action = json.loads(line)
+            if len(action) != 1 or next(iter(action)) not in ('index', 'delete'):
+                continue  # Source line following an index action
+            op_type, meta = next(iter(action.items()))
+            if meta['_id'] in FakeNode.failing_ids:
+                result = {'_id': meta['_id'], 'status': 400, 'error': {'type': 'mapper_parsing_exception'}}
+            else:
+                result = {'_id': meta['_id'], 'status': 200, 'result': 'updated'}
+            items.append({op_type: result})
+        return {'took': 1, 'errors': any('error' in next(iter(i.values())) for i in items), 'items': items}
+    
+    def _respond(self, status, payload):
+        meta = ApiResponseMeta(
+            status=status,
+            http_version='1.1',
+            headers=HttpHeaders({'X-Elastic-Product': 'Elasticsearch', 'Content-Type': 'application/json'}),
+            duration=0.0,
+            node=self.config
+        )
+        return NodeApiResponse(meta, json.dumps(payload).encode('utf-8') if payload is not None else b'')
+
+class FakePage:
+    """Minimal page for page_document()."""
+    
+    def __init__(self, page_id, title, content='', tags=()):
+        self.id = page_id
+        self.title = title
+        self.content = content
+        self.tags = list(tags)
+        self.is_published = True
+        self.is_archived = False
+    
+    def get_tags_list(self):
+        return self.tags
+
+@pytest.fixture
+def backend():
+    FakeNode.requests = []
+    FakeNode.failing_ids = set()
+    FakeNode.bulk_gate = None
+    client = Elasticsearch('http://search.test:9200', node_class=FakeNode)
+    return ElasticsearchBackend('http://search.test:9200', INDEX, client=client)
+
+def bulk_payloads():
+    """Decoded NDJSON lines of every recorded _bulk request."""
+    payloads = []
+    for method, path, body in FakeNode.requests:
+        if path == '/_bulk':
+            assert method == 'PUT' or method == 'POST'
+            text = body.decode('utf-8')
+            assert text.endswith('\n'), 'bulk bodies must end with a newline'
+            payloads.append([json.loads(line) for line in text.splitlines()])
+    return payloads
+
+def document(page_id, title, content='', tags=''):
+    return {'id': str(page_id), 'title': title, 'content': content, 'tags': tags}
+
+def test_bulk_payload_framing(backend):
+    backend.apply_changes(
+        [document(1, 'Docker', 'compose files', 'docker,containers'), document(2, 'Backups')],
+        [7]
+    )
+    
+    assert bulk_payloads() == [[
+        {'index': {'_index': INDEX, '_id': '1'}},
+        {'title': 'Docker', 'content': 'compose files', 'tags': ['docker', 'containers']},
+        {'index': {'_index': INDEX, '_id': '2'}},
+        {'title': 'Backups', 'content': '', 'tags': []},
+        {'delete': {'_index': INDEX, '_id': '7'}}
+    ]]
+
+def test_rebuild_sends_chunks(backend):
+    pages = [FakePage(i, f'Page {i}') for i in range(1, 6)]
+    
+    count = backend.rebuild(pages, chunk_size=2)
+    
+    assert count == 5
+    payloads = bulk_payloads()
+    assert [len(payload) for payload in payloads] == [4, 4, 2]
+    assert [payload[0]['index']['_id'] for payload in payloads] == ['1', '3', '5']
+
+def test_rebuild_marks_index_built(backend):
+    backend.rebuild([FakePage(1, 'Page 1')])
+    
+    mapping_updates = [
+        json.loads(body) for method, path, body in FakeNode.requests
+        if method == 'PUT' and path == f'/{INDEX}/_mapping'
+    ]
+    assert mapping_updates == [{'_meta': {'built': True}}]
+
+def test_bulk_item_errors_are_counted_not_raised(backend):
+    FakeNode.failing_ids = {'2'}
+    backend._ensure_index()
+    
+    success = backend._bulk([
+        backend._index_action(document(1, 'Good')),
+        backend._index_action(document(2, 'Bad'))
+    ])
+    
+    assert success == 1
+
+def test_write_behind_coalesces_queued_changes(backend):
+    writer = WriteBehindQueue(backend)
+    gate = threading.Event()
+    FakeNode.bulk_gate = gate
+    
+    # The first batch is written immediately and held at the transport
+    writer.put([document(1, 'First')], [])
+    while not any(path == '/_bulk' for _, path, _ in FakeNode.requests):
+        time.sleep(0.01)
+    
+    # Changes queued meanwhile are merged into one batch, later ones winning
+    writer.put([document(2, 'Draft')], [])
+    writer.put([document(1, 'First, edited')], [])
+    writer.put([], [2])
+    writer.put([document(3, 'Third')], [4])
+    
+    gate.set()
+    writer.flush()
+    
+    first, second = bulk_payloads()
+    assert first == [
+        {'index': {'_index': INDEX, '_id': '1'}},
+        {'title': 'First', 'content': '', 'tags': []}
+    ]
+    assert second[:4] == [
+        {'index': {'_index': INDEX, '_id': '1'}},
+        {'title': 'First, edited', 'content': '', 'tags': []},
+        {'index': {'_index': INDEX, '_id': '3'}},
+        {'title': 'Third', 'content': '', 'tags': []}
+    ]
+    assert sorted(line['delete']['_id'] for line in second[4:]) == ['2', '4']
+    
+    # Each written batch is followed by a refresh
+    paths = [path for _, path, _ in FakeNode.requests if path != f'/{INDEX}']
+    assert paths == ['/_bulk', f'/{INDEX}/_refresh', '/_bulk', f'/{INDEX}/_refresh']
+
+def test_search_size_stays_within_the_result_window(backend):
+    backend.search('docker', limit=50000)
+    backend.search('docker', limit=20)
+    
+    sizes = [json.loads(body)['size'] for method, path, body in FakeNode.requests if path.endswith('/_search')]
+    assert sizes == [ElasticsearchBackend.MAX_RESULTS, 20]
@@ -0,0 +1,119 @@
+"""
+Tests for the PostgreSQL search backend. No PostgreSQL server runs under test,
+so statements are compiled for its dialect and checked rather than executed.
+"""
+
+from sqlalchemy import create_mock_engine, event, text
+from sqlalchemy.dialects import postgresql
+from app import db
+from app.models.page import Page
+from app.services.search_service import PostgresBackend, search_index
+
+def compile_postgresql(statement):
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+def add_search_vector_column():
+    """Stand in for the generated column so the schema check finds it."""
+    db.session.execute(text('ALTER TABLE pages ADD COLUMN search_vector TEXT'))
+    db.session.commit()
+
+def test_missing_search_vector_disables_backend(app):
+    # The SQLite test schema has no search_vector column, like a database created before it
+    backend = PostgresBackend()
+    search_index.init_app(app, backend=backend)
+    
+    assert backend.available is False
+    assert search_index.search('docker') is None
+    assert search_index.filter_query(Page.query, 'docker') is None
+
+def test_page_listing_falls_back_to_substring_search(app, admin_client, make_page):
+    make_page('Docker networking')
+    make_page('Backup schedule')
+    search_index.init_app(app, backend=PostgresBackend())
+    
+    response = admin_client.get('/api/pages?search=docker')
+    
+    assert response.status_code == 200
+    assert [page['title'] for page in response.get_json()['pages']] == ['Docker networking']
+
+def test_failed_search_rolls_back_to_savepoint(app, make_page):
+    make_page('Docker networking')
+    backend = PostgresBackend()
+    search_index.init_app(app, backend=backend)
+    backend.available = True
+    
+    # PostgreSQL aborts the whole transaction on a failed statement, so the
+    # backend must confine the failure to a savepoint
+    savepoints = []
+    
+    def record_rollback(conn, name, context):
+        savepoints.append(name)
+    
+    event.listen(db.engine, 'rollback_savepoint', record_rollback)
+    try:
+        # The query fails on SQLite, as it would against a missing column
+        assert search_index.search('docker') is None
+    finally:
+        event.remove(db.engine, 'rollback_savepoint', record_rollback)
+    
+    assert len(savepoints) == 1
+    assert db.session.query(Page.title).scalar() == 'Docker networking'
+
+def test_create_all_installs_search_vector_on_postgresql(app):
+    statements = []
+    engine = create_mock_engine(
+        'postgresql://',
+        lambda sql, *args, **kwargs: statements.append(str(sql.compile(dialect=engine.dialect)))
+    )
+    
+    db.metadata.create_all(engine, checkfirst=False)
+    
+    create_pages = next(i for i, sql in enumerate(statements) if sql.strip().startswith('CREATE TABLE pages'))
+    following = ' '.join(' '.join(sql.split()) for sql in statements[create_pages + 1:])
+    assert 'ALTER TABLE pages ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (' in following
+    assert "setweight(to_tsvector('english', coalesce(title, '')), 'A')" in following
+    assert "setweight(to_tsvector('english', coalesce(content, '')), 'B')" in following
+    assert 'CREATE INDEX IF NOT EXISTS ix_pages_search_vector ON pages USING GIN (search_vector)' in following
+
+def test_existing_search_vector_enables_backend(app):
+    add_search_vector_column()
+    backend = PostgresBackend()
+    search_index.init_app(app, backend=backend)
+    
+    assert backend.available is True
+    
+    sql = compile_postgresql(search_index.filter_query(Page.query, 'docker compose').statement)
+    assert "pages.search_vector @@ websearch_to_tsquery(CAST('english' AS REGCONFIG), 'docker compose')" in sql
+    assert 'to_tsvector(' not in sql
+
+def test_single_field_match_narrows_to_that_column(app):
+    clause, tsquery = PostgresBackend().match_clause('docker', fields=['title'])
+    
+    assert compile_postgresql(clause) == (
+        "(pages.search_vector @@ websearch_to_tsquery(CAST('english' AS REGCONFIG), 'docker')) AND "
+        "(to_tsvector(CAST('english' AS REGCONFIG), coalesce(pages.title, '')) @@ "
+        "websearch_to_tsquery(CAST('english' AS REGCONFIG), 'docker'))"
+    )
+
+def test_search_orders_by_rank(app, make_page):
+    make_page('Docker networking')
+    add_search_vector_column()
+    search_index.init_app(app, backend=PostgresBackend())
+    
+    statements = []
+    
+    def record_statement(conn, statement, multiparams, params, execution_options):
+        statements.append(statement)
+    
+    event.listen(db.engine, 'before_execute', record_statement)
+    try:
+        # SQLite can't run the query, so it is captured and compiled for PostgreSQL
+        assert search_index.search('docker', limit=5) is None
+    finally:
+        event.remove(db.engine, 'before_execute', record_statement)
+    
+    select = next(statement for statement in statements if hasattr(statement, 'selected_columns'))
+    sql = ' '.join(compile_postgresql(select).split())
+    tsquery = "websearch_to_tsquery(CAST('english' AS REGCONFIG), 'docker')"
+    assert f'WHERE (pages.search_vector @@ {tsquery}) AND pages.is_published' in sql
+    assert sql.endswith(f'ORDER BY ts_rank(pages.search_vector, {tsquery}) DESC, pages.updated_at DESC LIMIT 5')
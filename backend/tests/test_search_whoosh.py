@@ -0,0 +1,102 @@
+"""
+Tests for the Whoosh search backend and the index lifecycle.
+"""
+
+import pytest
+from app import db
+from app.models.page import Page
+from app.services.search_service import SearchIndex, WhooshBackend, search_index
+
+@pytest.fixture
+def whoosh_index(app, tmp_path):
+    """Point the global search index at a fresh Whoosh index."""
+    backend = WhooshBackend(str(tmp_path / 'search_index'))
+    search_index.init_app(app, backend=backend)
+    return backend
+
+def search_titles(client, query):
+    response = client.get(f'/api/search/pages?q={query}')
+    assert response.status_code == 200
+    return [page['title'] for page in response.get_json()['pages']]
+
+def test_unbuilt_index_falls_back_until_rebuilt(app, admin_client, make_page, tmp_path):
+    # An existing wiki: pages were written before the index existed
+    search_index.enabled = False
+    make_page('Docker networking')
+    make_page('Backup schedule', 'Nightly docker volume backups.')
+    backend = WhooshBackend(str(tmp_path / 'search_index'))
+    search_index.init_app(app, backend=backend)
+    
+    assert not backend.is_built()
+    assert search_index.search('docker') is None
+    assert sorted(search_titles(admin_client, 'docker')) == ['Backup schedule', 'Docker networking']
+    
+    result = app.test_cli_runner().invoke(args=['search', 'rebuild'])
+    assert result.exit_code == 0, result.output
+    assert backend.is_built()
+    assert sorted(search_titles(admin_client, 'docker')) == ['Backup schedule', 'Docker networking']
+    assert len(search_index.search('docker')) == 2
+
+def test_rebuild_from_another_process_is_picked_up(app, make_page, tmp_path):
+    search_index.enabled = False
+    make_page('Docker networking')
+    backend = WhooshBackend(str(tmp_path / 'search_index'))
+    search_index.init_app(app, backend=backend)
+    assert search_index.search('docker') is None
+    
+    # Rebuild through a separate backend instance, as the CLI does in its own process
+    WhooshBackend(backend.index_dir).rebuild(Page.query.all())
+    
+    assert search_index.search('docker') is None  # Still within the recheck interval
+    search_index._built_checked_at -= SearchIndex.BUILT_RECHECK_INTERVAL
+    assert search_index.search('docker') is not None
+
+def test_index_without_pages_is_usable_immediately(app, whoosh_index, make_page):
+    assert search_index.search('docker') == []
+    assert whoosh_index.is_built()
+    
+    page = make_page('Docker networking')
+    assert search_index.search('docker') == [page.id]
+
+def test_index_follows_page_changes(admin_client, whoosh_index):
+    response = admin_client.post('/api/pages', json={'title': 'Proxmox cluster', 'content': 'Three nodes.'})
+    assert response.status_code == 201
+    page_id = response.get_json()['page']['id']
+    assert search_titles(admin_client, 'proxmox') == ['Proxmox cluster']
+    
+    response = admin_client.put(f'/api/pages/{page_id}', json={'title': 'Kubernetes cluster'})
+    assert response.status_code == 200
+    assert search_titles(admin_client, 'proxmox') == []
+    assert search_titles(admin_client, 'kubernetes') == ['Kubernetes cluster']
+    
+    response = admin_client.delete(f'/api/pages/{page_id}')
+    assert response.status_code == 200
+    assert search_titles(admin_client, 'kubernetes') == []
+    assert search_index.search('cluster') == []
+
+def test_unpublished_pages_leave_the_index(whoosh_index, make_page):
+    page = make_page('Grafana dashboards')
+    assert search_index.search('grafana') == [page.id]
+    
+    page.is_published = False
+    db.session.commit()
+    assert search_index.search('grafana') == []
+
+def test_title_matches_rank_above_content_matches(admin_client, whoosh_index, make_page):
+    make_page('Firewall rules', 'Allow traffic from the wireguard subnet.')
+    make_page('Wireguard setup', 'Peers and keys.')
+    
+    assert search_titles(admin_client, 'wireguard') == ['Wireguard setup', 'Firewall rules']
+
+def test_search_filter_keeps_the_best_ranked_matches(admin_client, whoosh_index, make_page):
+    titled = [make_page(f'Wireguard {name}', 'Peers and keys.') for name in ('setup', 'peers', 'keys')]
+    for name in ('Firewall rules', 'Router config', 'VLAN plan'):
+        make_page(name, 'Allow traffic from the wireguard subnet.')
+    search_index.max_matches = 3
+    
+    response = admin_client.get('/api/pages?search=wireguard')
+    
+    assert response.status_code == 200
+    pages = response.get_json()['pages']
+    assert sorted(page['id'] for page in pages) == sorted(page.id for page in titled)
+    assert response.get_json()['pagination']['total'] == 3
@@ -0,0 +1,117 @@
+"""
+Tests for the server-side session stores.
+"""
+
+from datetime import datetime, timedelta
+import fakeredis
+import pytest
+from app import db
+from app.models.session import SessionRecord
+from app.services import session_service
+from app.services.session_service import SqlAlchemySessionInterface
+
+@pytest.fixture
+def sql_sessions(app):
+    """Store sessions in the sessions table, as SESSION_TYPE='sqlalchemy' does."""
+    app.config['SESSION_TYPE'] = 'sqlalchemy'
+    session_service.init_app(app)
+    assert isinstance(app.session_interface, SqlAlchemySessionInterface)
+    return app.session_interface
+
+def stored_sessions():
+    db.session.expire_all()
+    return SessionRecord.query.all()
+
+def test_login_session_is_stored_in_the_table(sql_sessions, admin_client, admin):
+    record, = stored_sessions()
+    assert record.session_id.startswith('session:')
+    assert sql_sessions.serializer.loads(record.data)['_user_id'] == str(admin.id)
+    
+    # The cookie only carries the session id; the user is loaded from the row
+    cookie = admin_client.get_cookie('session')
+    assert 'session:' + cookie.value == record.session_id
+    assert admin_client.get('/api/pages').status_code == 200
+
+def test_unmodified_session_is_rewritten_only_when_half_expired(app, sql_sessions, admin_client):
+    # The first request adds Flask-Login's session identifier
+    assert admin_client.get('/api/pages').status_code == 200
+    record, = stored_sessions()
+    expiry = record.expiry
+    
+    assert admin_client.get('/api/pages').status_code == 200
+    assert stored_sessions()[0].expiry == expiry
+    
+    # Past half its lifetime, the next request extends the row
+    nearly_expired = datetime.utcnow() + app.permanent_session_lifetime / 4
+    db.session.execute(SessionRecord.__table__.update().values(expiry=nearly_expired))
+    db.session.commit()
+    
+    assert admin_client.get('/api/pages').status_code == 200
+    assert stored_sessions()[0].expiry > nearly_expired + app.permanent_session_lifetime / 2
+
+def test_expired_session_is_not_loaded(sql_sessions, admin_client):
+    db.session.execute(SessionRecord.__table__.update().values(expiry=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    
+    with admin_client.session_transaction() as session:
+        assert '_user_id' not in session
+
+def test_saving_a_session_leaves_pending_changes_alone(sql_sessions, admin_client, make_page):
+    page = make_page('Draft')
+    page.title = 'Unsaved title'
+    
+    with admin_client.session_transaction() as session:
+        session['theme'] = 'dark'
+    
+    db.session.rollback()
+    assert db.session.get(type(page), page.id).title == 'Draft'
+    assert sql_sessions.serializer.loads(stored_sessions()[0].data)['theme'] == 'dark'
+
+def test_purge_deletes_only_expired_sessions(app, sql_sessions):
+    now = datetime.utcnow()
+    table = SessionRecord.__table__
+    db.session.execute(table.insert(), [
+        {'session_id': f'session:old-{i}', 'data': b'', 'expiry': now - timedelta(minutes=i + 1)}
+        for i in range(5)
+    ] + [{'session_id': 'session:live', 'data': b'', 'expiry': now + timedelta(hours=1)}])
+    db.session.commit()
+    
+    result = app.test_cli_runner().invoke(args=['sessions', 'purge', '--batch-size', '2'])
+    
+    assert result.exit_code == 0, result.output
+    assert 'Purged 5 expired sessions' in result.output
+    assert [record.session_id for record in stored_sessions()] == ['session:live']
+
+def test_requests_purge_after_the_interval(app, sql_sessions, admin_client):
+    db.session.execute(SessionRecord.__table__.insert().values(
+        session_id='session:old', data=b'', expiry=datetime.utcnow() - timedelta(minutes=1)
+    ))
+    db.session.commit()
+    
+    admin_client.get('/api/pages')
+    assert len(stored_sessions()) == 2
+    
+    sql_sessions._last_purge -= sql_sessions.purge_interval
+    with admin_client.session_transaction() as session:
+        session['theme'] = 'dark'
+    assert len(stored_sessions()) == 1
+
+def test_redis_session_store(app, admin):
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis = fakeredis.FakeRedis()
+    session_service.init_app(app)
+    client = app.test_client()
+    
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    
+    key, = redis.keys('session:*')
+    assert 0 < redis.ttl(key) <= app.permanent_session_lifetime.total_seconds()
+    assert client.get('/api/pages').status_code == 200
+
+def test_unknown_session_type_is_rejected(app):
+    app.config['SESSION_TYPE'] = 'memcached'
+    
+    with pytest.raises(ValueError, match='Unknown SESSION_TYPE'):
+        session_service.init_app(app)